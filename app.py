@@ -4,36 +4,88 @@
 # 新機能: クローラー ・ 全文検索 ・ 一括クロール
 # ===================================================
 import streamlit as st
-import json
 from pathlib import Path
+import os
 from datetime import date
-from search_fulltext import search_fulltext
+from search_engine import DEFAULT_ENGINE, ENGINES, open_engine
+from page_store import PageStore, migrate_json
+from corpus import column
+from facets import FIELDS, FacetIndex
 from crawler import crawl_url
+from bulk_crawler import crawl_urls
+from frontier import crawl_site, normalize_url
+from recrawl import find_stale, refresh_stale
+from live_index import LiveIndex
+from result_cache import ResultCache
+from semantic import HybridEngine
+from term_dict import suggest_queries
+from tokenizer import count_words
+import tracing
 
 st.set_page_config(page_title="Tech0 Search v0.2", page_icon="🔍", layout="wide")
 
-DATA_PATH = Path("data/pages.json")
+DATA_PATH = Path("data/pages.json")   # 旧形式（初回起動時に pages.db へ移行。エクスポート先）
+STORE_PATH = Path("data/pages.db")
+BINARY_INDEX_PATH = Path("data/index.bin")   # python build_index.py で事前に作っておける
+LSA_PATH = Path("data/lsa.npz")               # python build_index.py --lsa で事前に作っておける
+PAGE_SIZE = 10   # 検索結果の1ページあたりの件数
 
-#共通：ID採番関数を追加
-def next_id(pages: list) -> int:
-    return (max([p.get("id", 0) for p in pages]) + 1) if pages else 1
 
-def has_url(pages: list, url: str) -> bool:
-    return any(p.get("url") == url for p in pages)
+@st.cache_resource
+def open_store() -> PageStore:
+    if not STORE_PATH.exists() and DATA_PATH.exists():
+        return migrate_json(DATA_PATH, STORE_PATH)
+    return PageStore(STORE_PATH)
 
 
-@st.cache_data
-def load_pages() -> list:
-    if DATA_PATH.exists():
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+store = open_store()
 
 
-def save_pages(pages: list):
-    DATA_PATH.parent.mkdir(exist_ok=True)
-    with open(DATA_PATH, "w", encoding="utf-8") as f:
-        json.dump(pages, f, ensure_ascii=False, indent=2)
+def has_url(url: str) -> bool:
+    # 正規化したURLで索引を引く（末尾の # やクエリ順の違いも同一扱い）
+    return store.exists_url(url)
+
+
+@st.cache_resource
+def load_live() -> LiveIndex:
+    # ページ集合（列指向の Corpus）と転置インデックスを全セッションで共有し、
+    # 登録・更新があれば変わったページの分だけ反映する
+    return LiveIndex(store)
+
+
+# 以下のキャッシュは store の番号をキーにしているので、登録・更新があれば自動で作り直す
+# （古い版のエンジンは件数の上限で追い出す。sharded はそのときシャードのプロセスも止まる）
+@st.cache_resource(max_entries=len(ENGINES))
+def load_engine(name: str, _pages: list, version: int):
+    # 選ばれたエンジンだけを作る（fts は SQLite 側で同期されるので版に関係なく使い回せる）
+    with tracing.span("load"):
+        return open_engine(name, _pages, store=store, index_path=BINARY_INDEX_PATH, version=version,
+                           lsa_path=LSA_PATH)
+
+
+@st.cache_resource(max_entries=1)
+def load_facets(_pages, revision: int) -> FacetIndex:
+    # 絞り込み用のビットマップ。ページ集合が読み直されたら（revision が変わったら）作り直し、古い版は捨てる
+    return FacetIndex(_pages)
+
+
+@st.cache_resource
+def load_result_cache() -> ResultCache:
+    # 全セッションで共有する。store.version が変わると中身は自動で捨てられる
+    return ResultCache()
+
+
+def show_duplicates(near: list):
+    # 本文がほぼ同じで登録を見送ったページを一覧にする
+    if near:
+        with st.expander(f"🧬 ほぼ同じ内容のため {len(near)}件をスキップしました"):
+            for page, original, score in near:
+                st.markdown(f"- {page['url']} ≒ 「{original['title']}」（類似度 {score:.0%}）")
+
+
+def set_query(text: str):
+    # ウィジェットの値は作成後に書き換えられないので、ボタンのコールバックで差し替える
+    st.session_state.query = text
 
 
 st.title("🔍 Tech0 Search v0.2")
@@ -43,40 +95,122 @@ tab_search, tab_crawl, tab_register, tab_list = st.tabs(
     ["🔍 検索", "🤖 クローラー", "📝 手動登録", "📋 一覧"]
 )
 
-pages = load_pages()
+# 版を先に読むので、結果キャッシュのキーの版は live の中身より古いことはあっても新しくはならない
+version = store.version()
+live = load_live().sync()
+pages = live.pages
 
 
 # ━━━ 検索タブ ━━━
 with tab_search:
-    query = st.text_input("🔍 キーワードを入力", placeholder="例: DX, IoT, 製造業")
+    query = st.text_input(
+        "🔍 キーワードを入力", placeholder="例: DX 製造業, \"DX推進\" OR IoT, title:DX -採用",
+        help="転置インデックスでは、空白区切りは AND、OR / NOT（語頭の -）、\"フレーズ\"、"
+             "title: / body: / keywords: / category: / author: の絞り込みが使えます",
+        key="query",
+    )
+    # 入力候補はどのエンジンを選んでいても転置インデックスの語彙から出す
+    suggestions = suggest_queries(query, live.index.term_dict) if query else []
+    if suggestions:
+        cols = st.columns(len(suggestions) + 1)
+        cols[0].caption("💡 候補")
+        for col, text in zip(cols[1:], suggestions):
+            col.button(text, key=f"suggest_{text}", on_click=set_query, args=(text,))
+    engine_names = list(ENGINES)
+    engine_name = st.selectbox(
+        "検索エンジン", engine_names,
+        index=engine_names.index(DEFAULT_ENGINE) if DEFAULT_ENGINE in ENGINES else 0,
+        format_func=ENGINES.get,
+    )
+
+    # ── 絞り込み（カテゴリ・作成者・取得方法・作成月・作成日の範囲）──
+    facets = load_facets(pages, live.revision)
+    with st.expander("🧮 絞り込み"):
+        cols = st.columns(len(FIELDS))
+        filters = {
+            field: col.multiselect(label, facets.values[field], key=f"facet_{field}",
+                                   format_func=lambda v: v or "（なし）")
+            for col, (field, label) in zip(cols, FIELDS.items())
+        }
+        first, last = facets.date_range
+        dates = st.date_input(
+            "作成日の範囲", value=(), key="facet_dates",
+            min_value=date.fromisoformat(first) if first else None,
+            max_value=date.fromisoformat(last) if last else None,
+        )
+    date_from = str(dates[0]) if len(dates) > 0 else None
+    date_to = str(dates[1]) if len(dates) > 1 else None
+    where = facets.select(filters, date_from, date_to)
 
     if query:
-        results = search_fulltext(query, pages)
-
-        st.markdown(f"**📊 検索結果: {len(results)}件**（マッチ数順）")
-        st.divider()
-
-        for page in results:
-            with st.container():
-                c_title, c_score = st.columns([4, 1])
-                c_title.markdown(f"### 📄 {page['title']}")
-                c_score.metric("マッチ", f"{page['match_count']}回")
-
-                st.markdown(f"*{page.get('preview', page.get('description', ''))}*")
-
-                if page.get("keywords"):
-                    st.markdown("🏷️ " + " ".join(f"`{kw}`" for kw in page["keywords"][:5]))
-
-                c1, c2, c3 = st.columns(3)
-                c1.caption(f"👤 {page.get('author', '不明')}")
-                c2.caption(f"📊 {page.get('word_count', 0)}語")
-                c3.caption(f"📅 {page.get('created_at', '')[:10]}")
-
-                st.markdown(f"🔗 [{page['url']}]({page['url']})")
+        # クエリ・エンジン・絞り込み条件が変わったら1ページ目に戻す
+        if st.session_state.get("last_search") != (query, engine_name, where.key):
+            st.session_state.last_search = (query, engine_name, where.key)
+            st.session_state.page_no = 0
+
+        if engine_name == "index":
+            engine = live.index
+        elif engine_name == "hybrid":
+            # BM25 と LSA は単独で選んだときのものを使い回す
+            engine = HybridEngine(load_engine("bm25", pages, version), load_engine("semantic", pages, version))
+        else:
+            engine = load_engine(engine_name, pages, 0 if engine_name == "fts" else version)
+        result_cache = load_result_cache()
+        # 検索から表示までを1件として計り、遅ければ段階ごとの内訳を残す（サイドバーの計測パネル）
+        with tracing.trace("query", query=query, engine=engine_name, page=st.session_state.page_no + 1):
+            found = result_cache.search(engine, engine_name, query, PAGE_SIZE,
+                                        st.session_state.page_no * PAGE_SIZE, version, where=where)
+            results = found["results"]
+            n_pages = max(1, (found["total"] + PAGE_SIZE - 1) // PAGE_SIZE)
+
+            with tracing.span("render"):
+                st.markdown(f"**📊 検索結果: {found['total']}件**（{ENGINES[engine_name]}）")
+                # ヒットしたページの項目ごとの件数（ビットマップの popcount で数える）
+                for field, counts in facets.counts(facets.from_ids(found.get("ids", []))).items():
+                    if counts:
+                        st.caption(f"{FIELDS[field]}: "
+                                   + " · ".join(f"{v or '（なし）'} ({n})" for v, n in counts[:8]))
+                for word, alternatives in found.get("expanded", {}).items():
+                    st.caption(f"🔤 「{word}」は見つからなかったため {' / '.join(alternatives)} で検索しました")
                 st.divider()
 
-        if not results:
-            st.info("該当するページが見つかりませんでした")
+                for page in results:
+                    with st.container():
+                        c_title, c_score = st.columns([4, 1])
+                        c_title.markdown(f"### 📄 {page['title']}")
+                        if "score" in page:
+                            c_score.metric("スコア", f"{page['score']:.2f}")
+                        else:
+                            c_score.metric("マッチ", f"{page['match_count']}回")
+
+                        st.markdown(f"*{page.get('preview', page.get('description', ''))}*")
+
+                        if page.get("keywords"):
+                            st.markdown("🏷️ " + " ".join(f"`{kw}`" for kw in page["keywords"][:5]))
+
+                        c1, c2, c3 = st.columns(3)
+                        c1.caption(f"👤 {page.get('author', '不明')}")
+                        c2.caption(f"📊 {page.get('word_count', 0)}語")
+                        c3.caption(f"📅 {page.get('created_at', '')[:10]}")
+
+                        st.markdown(f"🔗 [{page['url']}]({page['url']})")
+                        st.divider()
+
+                if not results:
+                    st.info("該当するページが見つかりませんでした")
+                elif n_pages > 1:
+                    c_prev, c_info, c_next = st.columns([1, 2, 1])
+                    if c_prev.button("◀ 前へ", disabled=st.session_state.page_no == 0):
+                        st.session_state.page_no -= 1
+                        st.rerun()
+                    c_info.caption(f"{st.session_state.page_no + 1} / {n_pages} ページ")
+                    if c_next.button("次へ ▶", disabled=st.session_state.page_no >= n_pages - 1):
+                        st.session_state.page_no += 1
+                        st.rerun()
+
+        stats = result_cache.stats()
+        st.caption(f"⚡ 結果キャッシュ: ヒット率 {stats['hit_rate']:.0%}"
+                   f"（{stats['hits']}/{stats['hits'] + stats['misses']}回・{stats['entries']}件保持）")
 
 
 # ━━━ クローラータブ ━━━
@@ -117,18 +251,20 @@ with tab_crawl:
         st.write(ft[:500] + ("..." if len(ft) > 500 else ""))
 
         if st.button("💾 インデックスに登録", key="btn_register_single"):
-            if has_url(pages, result["url"]):
+            # 本文がほぼ同じページ（テンプレートを流用したページなど）も重複として扱う
+            _, near = live.filter_duplicates([result])
+            if has_url(result["url"]):
                 st.warning("同じURLが既に登録されています（スキップしました）")
+            elif near:
+                _, original, score = near[0]
+                st.warning(f"「{original['title']}」とほぼ同じ内容です（類似度 {score:.0%}・スキップしました）")
             else:
                 r = result.copy()
-                r["id"] = next_id(pages)
                 r["author"] = "クローラー"
                 r["category"] = "自動取得"
                 r["created_at"] = r["crawled_at"][:10]
-                pages.append(r)
-                save_pages(pages)
+                store.put(r)
                 st.success(f"✅ 「{r['title']}」を登録しました！")
-                st.cache_data.clear()
                 st.session_state.crawl_result = None
                 st.rerun()
 
@@ -183,21 +319,32 @@ with tab_crawl:
         urls = [u.strip() for u in urls_text.splitlines() if u.strip()]
         if urls:
             bar = st.progress(0)
-            ok = 0
-            for i, u in enumerate(urls):
-                if has_url(pages, u):
-                    bar.progress((i + 1) / len(urls))
-                    continue
-
-                r = crawl_url(u, verify_ssl=not skip_ssl)
+            # 登録済み・重複URLを除いてから並列にクロールする（重複の判定は正規化したURLで、取得は入力どおりのURLで）
+            given = {}
+            for u in urls:
+                given.setdefault(normalize_url(u), u)
+            todo = [u for u in given.values() if not has_url(u)]
+            crawled = crawl_urls(todo, verify_ssl=not skip_ssl,
+                                 progress=lambda done, total: bar.progress(done / total))
+            new_pages = []
+            for r in crawled:
                 if r.get("crawl_status") == "success":
-                    r["id"] = next_id(pages)
                     r["author"] = "クローラー"
                     r["category"] = "自動取得"
                     r["created_at"] = r["crawled_at"][:10]
-                    pages.append(r)
-                    ok += 1
-                bar.progress((i + 1) / len(urls))
+                    new_pages.append(r)
+            new_pages, near = live.filter_duplicates(new_pages)
+            store.put_many(new_pages)
+            bar.progress(1.0)
+
+            # for i, u in enumerate(urls):
+            #     if has_url(pages, u):
+            #         bar.progress((i + 1) / len(urls))
+            #         continue
+            #
+            #     r = crawl_url(u, verify_ssl=not skip_ssl)
+            #     ...
+            #     bar.progress((i + 1) / len(urls))
 
             # for i, u in enumerate(urls):
             #     r = crawl_url(u)
@@ -210,9 +357,67 @@ with tab_crawl:
             #         ok += 1
             #     bar.progress((i + 1) / len(urls))
 
-            save_pages(pages)
-            st.cache_data.clear()
-            st.success(f"✅ {ok}/{len(urls)}件 クロール完了！")
+            # 本文がほぼ同じで登録しなかったページは数えない
+            st.success(f"✅ {len(new_pages)}/{len(urls)}件 クロール完了！")
+            show_duplicates(near)
+
+
+    # ── サイト巡回 ──
+    st.divider()
+    st.subheader("🕸️ サイト巡回（リンクをたどってクロール）")
+
+    seeds_text = st.text_area("起点URL（1行に1URL）", height=100, key="seeds",
+                              placeholder="https://example.com")
+    c1, c2, c3 = st.columns(3)
+    max_depth = c1.number_input("最大階層", min_value=0, max_value=5, value=1)
+    max_total = c2.number_input("最大取得ページ数", min_value=1, max_value=500, value=30)
+    per_domain = c3.number_input("1サイトあたりの上限", min_value=1, max_value=500, value=20)
+    same_site = st.checkbox("起点と同じサイトのリンクだけたどる", value=True)
+
+    if st.button("🕸️ 巡回クロール実行"):
+        seeds = [u.strip() for u in seeds_text.splitlines() if u.strip()]
+        if seeds:
+            bar = st.progress(0)
+            crawled = crawl_site(seeds, max_depth=int(max_depth), max_pages=int(max_total),
+                                 per_domain=int(per_domain), same_site=same_site,
+                                 known={normalize_url(url) for url in column(pages, "url") if url},
+                                 verify_ssl=not skip_ssl,
+                                 progress=lambda done, total: bar.progress(min(done / total, 1.0)))
+            for r in crawled:
+                r["author"] = "クローラー"
+                r["category"] = "自動取得"
+                r["created_at"] = r["crawled_at"][:10]
+            crawled, near = live.filter_duplicates(crawled)
+            store.put_many(crawled)
+            bar.progress(1.0)
+            st.success(f"✅ {len(crawled)}件 登録しました！")
+            show_duplicates(near)
+
+
+    # ── 再クロール ──
+    st.divider()
+    st.subheader("🔄 再クロール（更新チェック）")
+    st.caption("ETag / Last-Modified と内容ハッシュで変更を確認し、変わったページだけ解析し直します")
+
+    stale_days = st.number_input("最終クロールから何日以上たったページを対象にするか",
+                                 min_value=0, max_value=365, value=7)
+    stale = find_stale(pages, int(stale_days))
+
+    if st.button(f"🔄 {len(stale)}件を再クロール", disabled=not stale):
+        bar = st.progress(0)
+        # 共有の pages は書き換えず、対象ページの dict を取り出して渡す
+        targets = [pages[i] for i in stale]
+        summary = refresh_stale(targets, days=int(stale_days), verify_ssl=not skip_ssl,
+                                progress=lambda done, total: bar.progress(done / total))
+        by_id = {p["id"]: p for p in targets}
+        # 内容が変わったページだけ put（version が上がり、インデックスには差分で反映される）。
+        # 変わっていないページはクロール日時だけ書き換える
+        store.put_many([by_id[i] for i in summary["updated_ids"]])
+        store.touch([by_id[i] for i in summary["checked_ids"]])
+        st.success(
+            f"✅ 更新 {summary['updated']}件 / 未更新(304) {summary['not_modified']}件 / "
+            f"内容同一 {summary['unchanged']}件 / 失敗 {summary['failed']}件"
+        )
 
 
 # ━━━ 手動登録タブ ━━━
@@ -228,13 +433,12 @@ with tab_register:
         go    = st.form_submit_button("📝 登録", type="primary")
 
     if go and url and title and desc:
-        pages.append({
-            "id": next_id(pages),
+        store.put({
             "url": url,
             "title": title,
             "description": desc,
             "full_text": desc,
-            "word_count": len(desc.split()),
+            "word_count": count_words(desc),
             "keywords": [k.strip() for k in kws.split(",") if k.strip()],
             "author": auth,
             "created_at": str(date.today()),
@@ -249,20 +453,54 @@ with tab_register:
         #     "keywords": [k.strip() for k in kws.split(",") if k.strip()],
         #     "author": auth, "created_at": str(date.today()), "category": cat,
         # })
-        save_pages(pages)
         st.success(f"✅ 「{title}」を登録しました！")
-        st.cache_data.clear()
 
 
 # ━━━ 一覧タブ ━━━
 with tab_list:
     st.subheader(f"📋 登録済みページ（{len(pages)}件）")
-    for p in pages:
-        with st.expander(f"📄 {p['title']}"):
-            st.write(f"**URL:** {p['url']}")
-            st.write(f"**文字数:** {p.get('word_count', 0)}語")
-            st.write(f"**ステータス:** {p.get('crawl_status', '手動登録')}")
+    if st.button("💾 pages.json に書き出す"):
+        store.export_json(DATA_PATH)
+        st.success(f"✅ {DATA_PATH} に書き出しました")
+    for i in range(len(pages)):
+        with st.expander(f"📄 {pages.get(i, 'title')}"):
+            st.write(f"**URL:** {pages.get(i, 'url')}")
+            st.write(f"**文字数:** {pages.get(i, 'word_count', 0)}語")
+            st.write(f"**ステータス:** {pages.get(i, 'crawl_status', '手動登録')}")
 
 
 st.divider()
-st.caption("© 2025 PROJECT ZERO ─ Tech0 Search v0.2")
\ No newline at end of file
+st.caption("© 2025 PROJECT ZERO ─ Tech0 Search v0.2")
+
+
+# ━━━ 計測パネル（管理者向け。TECH0_ADMIN=1 のときだけ表示）━━━
+# 計測の有効・無効と記録はプロセス全体で共有する（全セッションの検索が集計される）
+if os.environ.get("TECH0_ADMIN", "") not in ("", "0"):
+    with st.sidebar:
+        st.subheader("🛠️ 計測")
+        st.toggle("処理段階ごとの時間を計測する", value=tracing.is_enabled(), key="trace_on",
+                  on_change=lambda: tracing.enable(st.session_state.trace_on))
+        st.number_input("遅いクエリとみなす時間 (ms)", min_value=0.0, value=float(tracing.SLOW_MS), step=10.0,
+                        key="trace_slow_ms", on_change=lambda: tracing.set_slow_ms(st.session_state.trace_slow_ms))
+
+        stage_stats = tracing.stats()
+        if stage_stats:
+            st.caption("段階ごとの時間（search はプレビュー作成 preview を含む。query は検索から表示まで全体）")
+            st.dataframe([
+                {"段階": name, "回数": s["count"], "平均(ms)": round(s["mean_ms"], 2),
+                 "p50(ms)": round(s["p50_ms"], 2), "p99(ms)": round(s["p99_ms"], 2), "最大(ms)": round(s["max_ms"], 2)}
+                for name, s in stage_stats.items()
+            ], hide_index=True)
+        slow = tracing.slow_queries()
+        st.caption(f"🐢 遅いクエリ: {len(slow)}件（新しい順）")
+        if slow:
+            st.dataframe([
+                {"時刻": q["at"][11:], "クエリ": q.get("query"), "エンジン": q.get("engine"),
+                 "合計(ms)": round(q["total_ms"], 1), **{k: round(v, 1) for k, v in q["stages"].items()}}
+                for q in slow
+            ], hide_index=True)
+        if st.checkbox("Prometheus 形式で表示", key="trace_prometheus"):
+            st.code(tracing.prometheus_text(), language="text")
+        if st.button("記録を消去", key="trace_reset"):
+            tracing.reset()
+            st.rerun()
@@ -0,0 +1,4 @@
+# ===================================================
+# benchmarks - 性能計測スクリプト集
+# 実行例: python -m benchmarks.bench_index
+# ===================================================
@@ -0,0 +1,63 @@
+# ===================================================
+# bench_coldstart.py - インデックスを開いて最初の検索を返すまでの時間（JSON 保存 vs mmap バイナリ）
+# 実行例: python -m benchmarks.bench_coldstart --sizes 1000 10000 100000
+# ===================================================
+import argparse
+import gc
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_pages
+from binary_index import BinaryIndex, write_index
+from inverted_index import InvertedIndex
+
+QUERIES = ["dx", "製造業", "digital transformation", "kakaka0"]
+
+
+def _first_query(open_index) -> tuple:
+    gc.collect()
+    start = time.perf_counter()
+    index = open_index()
+    opened = time.perf_counter() - start
+    index.search_page(QUERIES[0], limit=10)
+    first = time.perf_counter() - start
+    for q in QUERIES[1:]:
+        index.search_page(q, limit=10)
+    return opened, first, index
+
+
+def run(sizes: list):
+    print(f"{'pages':>8} {'format':>7} {'size(MB)':>9} {'open(ms)':>9} {'1st query(ms)':>14}")
+    for n in sizes:
+        pages = make_pages(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path, data_path, bin_path = Path(tmp) / "index.json", Path(tmp) / "pages.json", Path(tmp) / "index.bin"
+            data_path.write_text(json.dumps(pages, ensure_ascii=False), encoding="utf-8")
+            InvertedIndex.build(pages).save(json_path, 1)
+            write_index(pages, bin_path, 1)
+            del pages
+
+            # 従来の起動: pages.json と保存済みインデックスをどちらも読み込む
+            def load_json():
+                loaded = json.loads(data_path.read_text(encoding="utf-8"))
+                return InvertedIndex.load(json_path, loaded, 1)
+
+            for name, path, open_index in [
+                ("json", json_path, load_json),
+                ("mmap", bin_path, lambda: BinaryIndex.open(bin_path, 1)),
+            ]:
+                opened, first, index = _first_query(open_index)
+                size = path.stat().st_size / 1e6
+                print(f"{n:>8} {name:>7} {size:>9.1f} {opened * 1000:>9.1f} {first * 1000:>14.1f}")
+                if name == "mmap":
+                    index.close()
+                del index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    run(args.sizes)
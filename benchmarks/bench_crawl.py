@@ -0,0 +1,43 @@
+# ===================================================
+# bench_crawl.py - 逐次クロール vs 並列クロールの比較（pages/sec）
+# 実行例: python -m benchmarks.bench_crawl --pages 100 --hosts 4
+# ===================================================
+import argparse
+import time
+from contextlib import ExitStack
+
+from benchmarks.fixture_server import FixtureServer
+from bulk_crawler import crawl_urls
+from crawler import crawl_url
+
+
+def run(n_pages: int, n_hosts: int, latency: float, workers: int, per_host: int):
+    with ExitStack() as stack:
+        servers = [stack.enter_context(FixtureServer(n_pages // n_hosts, latency)) for _ in range(n_hosts)]
+        # ホストをまたいで交互に並べる
+        urls = [u for group in zip(*(s.urls() for s in servers)) for u in group]
+
+        start = time.perf_counter()
+        seq = [crawl_url(u) for u in urls]
+        seq_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        par = crawl_urls(urls, max_workers=workers, per_host=per_host, delay=0)
+        par_s = time.perf_counter() - start
+
+    ok_seq = sum(r["crawl_status"] == "success" for r in seq)
+    ok_par = sum(r["crawl_status"] == "success" for r in par)
+    print(f"pages={len(urls)} hosts={n_hosts} latency={latency * 1000:.0f}ms")
+    print(f"sequential: {len(urls) / seq_s:7.1f} pages/sec ({ok_seq} ok)")
+    print(f"bulk:       {len(urls) / par_s:7.1f} pages/sec ({ok_par} ok, workers={workers}, per_host={per_host})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--per-host", type=int, default=2)
+    args = parser.parse_args()
+    run(args.pages, args.hosts, args.latency, args.workers, args.per_host)
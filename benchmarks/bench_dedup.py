@@ -0,0 +1,74 @@
+# ===================================================
+# bench_dedup.py - ほぼ同じページの検出（全件と比較 vs MinHash + LSH）
+# 実行例: python -m benchmarks.bench_dedup --sizes 1000 10000 100000
+# ===================================================
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_pages
+from dedup import DuplicateIndex, page_minhash, similarity
+
+
+def _clone(page: dict, rng: random.Random, ratio: float) -> dict:
+    # テンプレート流用ページを真似て、本文の単語を ratio の割合だけ差し替える
+    words = page["full_text"].split()
+    for i in rng.sample(range(len(words)), max(1, int(len(words) * ratio))):
+        words[i] = f"name{rng.randrange(10 ** 6)}"
+    return dict(page, full_text=" ".join(words))
+
+
+def run(sizes: list, n_queries: int = 500, ratio: float = 0.05):
+    print(f"{'pages':>8} {'build(ms)':>10} {'signature(ms)':>14} {'scan(ms)':>9} {'lsh(ms)':>8} "
+          f"{'recall':>7} {'false+':>7}")
+    rng = random.Random(0)
+    for n in sizes:
+        pages = make_pages(n)
+        start = time.perf_counter()
+        index = DuplicateIndex.build(pages, range(n))
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # 半分は既存ページの複製（見つかるべき）、半分は新しいページ（見つかってはいけない）
+        originals = rng.sample(range(n), n_queries // 2)
+        queries = [(_clone(pages[i], rng, ratio), i) for i in originals]
+        queries += [(page, None) for page in make_pages(n_queries - len(queries), seed=1)]
+
+        start = time.perf_counter()
+        signatures = [page_minhash(page) for page, _ in queries]
+        signature_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        # 全件と比較: 全ページの MinHash を1つの配列にして、1件ごとに全行と比べる
+        matrix = np.stack([index._signatures[i] for i in range(n)])
+        scan, lsh = [], []
+        found_scan, found_lsh = [], []
+        for signature in signatures:
+            start = time.perf_counter()
+            scores = np.count_nonzero(matrix == signature, axis=1) / len(signature)
+            found_scan.append(set(np.flatnonzero(scores >= index.threshold).tolist()))
+            scan.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            found_lsh.append({key for key, _ in index.find(signature)})
+            lsh.append((time.perf_counter() - start) * 1000)
+
+        recall = statistics.mean(original in found for (_, original), found in zip(queries, found_lsh)
+                                 if original is not None)
+        false_positive = statistics.mean(bool(found) for (_, original), found in zip(queries, found_lsh)
+                                         if original is None)
+        # LSH で見つかるのは全件と比較して見つかるものの一部（取りこぼしはあっても誤検出は増えない）
+        assert all(f <= s for f, s in zip(found_lsh, found_scan))
+        print(f"{n:>8} {build_ms:>10.1f} {signature_ms:>14.3f} {statistics.median(scan):>9.3f} "
+              f"{statistics.median(lsh):>8.3f} {recall:>7.1%} {false_positive:>7.1%}")
+    print(f"（複製は本文の単語を {ratio:.0%} 差し替えたもの。ms は1件あたりの中央値）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--ratio", type=float, default=0.05)
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.ratio)
@@ -0,0 +1,51 @@
+# ===================================================
+# bench_engines.py - 検索エンジンの比較（A/B 用の共通ベンチマーク）
+# 実行例: python -m benchmarks.bench_engines --pages 10000 --engines index bm25 fts scan
+# ===================================================
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_pages
+from page_store import PageStore
+from search_engine import ENGINES, open_engine
+
+QUERIES = ["dx", "製造業", "digital transformation", "kakaka0", "kariro0", "dedede7", "データ分析"]
+
+
+def run(n_pages: int, engines: list, repeat: int = 5, limit: int = 10):
+    pages = make_pages(n_pages)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PageStore(Path(tmp) / "pages.db")
+        start = time.perf_counter()
+        store.put_many(pages)
+        print(f"pages={n_pages}  store load: {time.perf_counter() - start:.2f}s")
+        print(f"{'engine':>8} {'open(s)':>8} {'p50(ms)':>8} {'p95(ms)':>8} {'max(ms)':>8}")
+
+        for name in engines:
+            start = time.perf_counter()
+            # mmap はファイルに書き出してから開くまでを含める
+            index_path = Path(tmp) / "index.bin" if name == "mmap" else None
+            engine = open_engine(name, pages, store=store, index_path=index_path)
+            open_s = time.perf_counter() - start
+
+            times = []
+            for _ in range(repeat):
+                for q in QUERIES:
+                    t = time.perf_counter()
+                    engine.search_page(q, limit, 0)
+                    times.append((time.perf_counter() - t) * 1000)
+            times.sort()
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+            print(f"{name:>8} {open_s:>8.2f} {statistics.median(times):>8.2f} {p95:>8.2f} {times[-1]:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.pages, args.engines, args.repeat)
@@ -0,0 +1,74 @@
+# ===================================================
+# bench_facets.py - 絞り込みと件数集計（ページの dict を1件ずつ見る vs ビットマップ）
+# 実行例: python -m benchmarks.bench_facets --sizes 10000 100000 300000
+# ===================================================
+import argparse
+import random
+import statistics
+import time
+from collections import Counter
+
+import numpy as np
+
+from benchmarks.synthetic import make_pages
+from corpus import Corpus
+from facets import FIELDS, FacetIndex
+
+
+def _loop(pages, hits: list, categories: set, date_from: str, date_to: str) -> tuple:
+    # 従来どおり、ヒットしたページの dict を1件ずつ見て絞り込み・集計する
+    kept = [i for i in hits
+            if pages[i].get("category") in categories and date_from <= (pages[i].get("created_at") or "") <= date_to]
+    counts = {}
+    for field in FIELDS:
+        key = "created_at" if field == "month" else field
+        counts[field] = Counter(((pages[i].get(key) or "")[:7] if field == "month" else pages[i].get(key) or "")
+                                for i in kept).most_common()
+    return kept, counts
+
+
+def _bitmap(facets: FacetIndex, hits, categories: list, date_from: str, date_to: str) -> tuple:
+    where = facets.select({"category": categories}, date_from, date_to)
+    kept = hits[where.keep(hits)]
+    return kept, facets.counts(facets.from_positions(kept))
+
+
+def _median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def run(sizes: list, hit_ratio: float = 0.2, repeat: int = 5):
+    print(f"{'pages':>8} {'hits':>8} {'build(ms)':>10} {'loop(ms)':>9} {'bitmap(ms)':>11} {'speedup':>8}")
+    for n in sizes:
+        pages = Corpus(make_pages(n))
+        rng = random.Random(0)
+        hits = np.array(sorted(rng.sample(range(n), int(n * hit_ratio))))
+
+        start = time.perf_counter()
+        facets = FacetIndex(pages)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        categories = facets.values["category"][:2]
+        args = (set(categories), "2024-04-01", "2025-06-30")
+        loop_kept, loop_counts = _loop(pages, hits.tolist(), *args)
+        bitmap_kept, bitmap_counts = _bitmap(facets, hits, categories, *args[1:])
+        assert loop_kept == bitmap_kept.tolist()
+        assert all(dict(loop_counts[f]) == dict(bitmap_counts[f]) for f in FIELDS)
+
+        loop_ms = _median_ms(lambda: _loop(pages, hits.tolist(), *args), repeat)
+        bitmap_ms = _median_ms(lambda: _bitmap(facets, hits, categories, *args[1:]), repeat)
+        print(f"{n:>8} {len(hits):>8} {build_ms:>10.1f} {loop_ms:>9.2f} {bitmap_ms:>11.2f} {loop_ms / bitmap_ms:>7.1f}x")
+    print(f"（ヒットはページの {hit_ratio:.0%}。カテゴリ2つ + 作成日の範囲で絞り込み、4項目の件数を数える）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--hits", type=float, default=0.2)
+    args = parser.parse_args()
+    run(args.sizes, args.hits)
@@ -0,0 +1,89 @@
+# ===================================================
+# bench_fetch.py - 大きなページ・HTML以外のファイルを取得するときの時間とメモリ（全体読み込み vs ストリーミング）
+# 実行例: python -m benchmarks.bench_fetch --size-mb 5
+# ===================================================
+import argparse
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from crawler import HEADERS, fetch_conditional
+
+
+def _server(size: int) -> ThreadingHTTPServer:
+    # charset 指定の無い大きな Shift_JIS のページ（文字コードの推定が必要）と、大きな PDF
+    html = ("<html><title>big</title><body>" + "<p>日本語の本文です。</p>" * (size // 30) + "</body></html>").encode("shift_jis")
+    pdf = b"%PDF-1.4\n" + b"\x00" * size
+    routes = {"/big.html": ("text/html", html), "/file.pdf": ("application/pdf", pdf)}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            content_type, body = routes[self.path]
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass   # 途中で読むのをやめられた
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        def handle_error(self, request, client_address):
+            pass   # 途中で切断されたときのエラーは表示しない
+
+    httpd = Server(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def fetch_whole(url: str):
+    """以前の取得方法（本文を全部読んでから、全体で文字コードを推定する）。"""
+    resp = requests.get(url, headers=HEADERS, timeout=30)
+    resp.encoding = resp.apparent_encoding
+    return resp.text
+
+
+def _measure(fn, url: str) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(url)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run(size_mb: float, max_bytes: int):
+    httpd = _server(int(size_mb * 1024 * 1024))
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    print(f"size={size_mb}MB max_bytes={max_bytes / 1024 / 1024:.1f}MB")
+    print(f"{'':<12} {'method':<10} {'time(s)':>8} {'peak(MB)':>9}")
+    try:
+        for path in ["/big.html", "/file.pdf"]:
+            for name, fn in [
+                ("whole", fetch_whole),
+                ("streaming", lambda url: fetch_conditional(url, max_bytes=max_bytes)),
+            ]:
+                elapsed, peak = _measure(fn, base + path)
+                print(f"{path:<12} {name:<10} {elapsed:>8.2f} {peak / 1e6:>9.1f}")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--max-bytes", type=int, default=2 * 1024 * 1024)
+    args = parser.parse_args()
+    run(args.size_mb, args.max_bytes)
@@ -0,0 +1,43 @@
+# ===================================================
+# bench_index.py - 全件走査 vs 転置インデックスの比較
+# 実行例: python -m benchmarks.bench_index --sizes 1000 10000 100000
+# ===================================================
+import argparse
+import time
+
+from benchmarks.synthetic import make_pages
+from inverted_index import InvertedIndex
+from search_fulltext import search_fulltext
+
+QUERIES = ["dx", "製造業", "digital transformation", "kakaka0", "kariro0", "dedede7"]
+
+
+def _avg_ms(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(sizes: list, repeat: int = 3):
+    print(f"{'pages':>8} {'build(s)':>9} {'scan(ms)':>10} {'index(ms)':>10} {'top10(ms)':>10} {'speedup':>8}")
+    for n in sizes:
+        pages = make_pages(n)
+
+        start = time.perf_counter()
+        index = InvertedIndex.build(pages)
+        build_s = time.perf_counter() - start
+
+        scan_ms = sum(_avg_ms(lambda q=q: search_fulltext(q, pages), repeat) for q in QUERIES) / len(QUERIES)
+        index_ms = sum(_avg_ms(lambda q=q: index.search(q), repeat) for q in QUERIES) / len(QUERIES)
+        # 1ページ目（10件）だけ取り出す場合
+        top10_ms = sum(_avg_ms(lambda q=q: index.search(q, limit=10), repeat) for q in QUERIES) / len(QUERIES)
+        print(f"{n:>8} {build_s:>9.2f} {scan_ms:>10.2f} {index_ms:>10.2f} {top10_ms:>10.2f} {scan_ms / top10_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
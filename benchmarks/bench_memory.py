@@ -0,0 +1,63 @@
+# ===================================================
+# bench_memory.py - ページ集合のメモリ使用量と全件走査の速度（list of dict vs Corpus）
+# 実行例: python -m benchmarks.bench_memory --pages 100000
+# ===================================================
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from benchmarks.synthetic import make_pages
+from corpus import Corpus
+from search_fulltext import search_page
+
+QUERIES = ["dx", "製造業", "kakaka0", "digital transformation"]
+
+
+def _measure(load) -> tuple:
+    # tracemalloc を有効にすると遅くなるので、時間は別に測る
+    start = time.perf_counter()
+    load()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    pages = load()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return pages, size, elapsed
+
+
+def _scan_ms(pages, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for q in QUERIES:
+            search_page(q, pages, limit=10)
+    return (time.perf_counter() - start) / (repeat * len(QUERIES)) * 1000
+
+
+def run(n_pages: int, repeat: int = 3):
+    # PageStore / pages.json から読み込むときと同じく、JSON 文字列から作る
+    raw = json.dumps(make_pages(n_pages), ensure_ascii=False)
+
+    pages, list_bytes, list_s = _measure(lambda: json.loads(raw))
+    list_ms = _scan_ms(pages, repeat)
+    del pages
+
+    corpus, corpus_bytes, corpus_s = _measure(lambda: Corpus(json.loads(raw)))
+    corpus_ms = _scan_ms(corpus, repeat)
+
+    print(f"pages={n_pages}")
+    print(f"{'':<14} {'memory(MB)':>11} {'load(s)':>8} {'scan(ms)':>9}")
+    print(f"{'list of dict':<14} {list_bytes / 1e6:>11.1f} {list_s:>8.2f} {list_ms:>9.1f}")
+    print(f"{'Corpus':<14} {corpus_bytes / 1e6:>11.1f} {corpus_s:>8.2f} {corpus_ms:>9.1f}")
+    print(f"memory {corpus_bytes / list_bytes:.0%} / scan {list_ms / corpus_ms:.1f}x faster")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.pages, args.repeat)
@@ -0,0 +1,63 @@
+# ===================================================
+# bench_parse.py - HTML解析の速度（BeautifulSoup vs 1回走査 vs プロセスプール・pages/sec）
+# 実行例: python -m benchmarks.bench_parse --corpus data/html_corpus --pages 2000 --workers 4
+# ===================================================
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from benchmarks.fixture_server import page_html
+from benchmarks.synthetic import make_pages
+from crawler import parse_html, parse_html_bs4
+
+
+def load_corpus(corpus: Path, n_pages: int) -> list:
+    """保存済みのHTML（*.html）を読む。無ければ合成ページから n_pages 件作って保存する。"""
+    files = sorted(corpus.glob("*.html"))
+    if not files:
+        corpus.mkdir(parents=True, exist_ok=True)
+        for i, page in enumerate(make_pages(n_pages)):
+            links = [f"/page/{(i * k + 1) % n_pages}" for k in (2, 3, 7)]
+            (corpus / f"{i:06d}.html").write_text(page_html(page, links), encoding="utf-8")
+        files = sorted(corpus.glob("*.html"))
+    return [(f"https://example.com/{f.stem}", f.read_text(encoding="utf-8")) for f in files]
+
+
+def _parse(item: tuple) -> dict:
+    url, html = item
+    return parse_html(html, url)
+
+
+def _pages_per_sec(fn, docs: list) -> float:
+    start = time.perf_counter()
+    fn(docs)
+    return len(docs) / (time.perf_counter() - start)
+
+
+def run(corpus: Path, n_pages: int, workers: int):
+    docs = load_corpus(corpus, n_pages)
+    size = sum(len(html) for _, html in docs)
+    print(f"corpus={corpus} pages={len(docs)} avg={size / len(docs) / 1000:.1f}KB")
+
+    bs4 = _pages_per_sec(lambda d: [parse_html_bs4(html, url) for url, html in d], docs)
+    single = _pages_per_sec(lambda d: [parse_html(html, url) for url, html in d], docs)
+
+    def pooled(d):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_parse, d, chunksize=16))
+
+    pool = _pages_per_sec(pooled, docs)
+    print(f"{'bs4 (sequential)':<26} {bs4:>9.1f} pages/sec")
+    print(f"{'single-pass (sequential)':<26} {single:>9.1f} pages/sec ({single / bs4:.1f}x)")
+    print(f"{f'single-pass ({workers} processes)':<26} {pool:>9.1f} pages/sec ({pool / bs4:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", type=Path, default=Path("data/html_corpus"))
+    parser.add_argument("--pages", type=int, default=2000, help="corpus が空のときに作るページ数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    run(args.corpus, args.pages, args.workers)
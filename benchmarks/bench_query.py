@@ -0,0 +1,65 @@
+# ===================================================
+# bench_query.py - 複数語クエリ（AND / OR / NOT）の計測
+# 実行例: python -m benchmarks.bench_query --sizes 10000 100000
+# ===================================================
+import argparse
+import time
+
+from benchmarks.synthetic import make_pages
+from inverted_index import InvertedIndex
+from query_parser import parse_query
+
+# 珍しい語 × よく出る語の AND、フレーズ、OR / NOT、フィールド指定
+QUERIES = [
+    "kakaka0 dx",
+    "kariro0 製造業 data",
+    '"digital transformation"',
+    "dedede7 OR kariro0",
+    "製造業 -dx",
+    "title:data category:事例",
+]
+
+
+def _avg_ms(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def _each_then_intersect(index: InvertedIndex, query: str) -> set:
+    # 比較用: AND の各語を全件分それぞれ求めてから集合演算する
+    node = parse_query(query)
+    children = node[1] if node[0] == "and" else [node]
+    result = None
+    for child in children:
+        if child[0] == "not":
+            continue
+        found = set(index._eval(child, None, {}))
+        result = found if result is None else result & found
+    for child in children:
+        if child[0] == "not":
+            result -= set(index._eval(child[1], None, {}))
+    return result
+
+
+def run(sizes: list, repeat: int = 5):
+    for n in sizes:
+        pages = make_pages(n)
+        index = InvertedIndex.build(pages)
+        print(f"pages={n}")
+        print(f"  {'query':<28} {'hits':>6} {'naive(ms)':>10} {'gallop(ms)':>11}")
+        for q in QUERIES:
+            hits = len(index._match(q)[0])
+            assert hits == len(_each_then_intersect(index, q))
+            naive = _avg_ms(lambda: _each_then_intersect(index, q), repeat)
+            gallop = _avg_ms(lambda: index._match(q), repeat)
+            print(f"  {q:<28} {hits:>6} {naive:>10.2f} {gallop:>11.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,57 @@
+# ===================================================
+# bench_segments.py - 1件登録したときの反映時間（全体の作り直し vs セグメントへの差分追加）
+# 実行例: python -m benchmarks.bench_segments --sizes 1000 10000 100000
+# ===================================================
+import argparse
+import statistics
+import time
+
+from benchmarks.synthetic import make_pages
+from inverted_index import InvertedIndex
+from segment_index import SegmentedIndex
+
+QUERIES = ["dx", "製造業", "digital transformation", "kakaka0"]
+
+
+def _query_ms(index, repeat: int = 3) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for q in QUERIES:
+            index.search_page(q, limit=10)
+    return (time.perf_counter() - start) / (repeat * len(QUERIES)) * 1000
+
+
+def run(sizes: list, n_adds: int = 2000):
+    print(f"{'pages':>8} {'rebuild(ms)':>12} {'upsert p50(ms)':>15} {'upsert max(ms)':>15} "
+          f"{'merges':>7} {'query(ms)':>10} {'merged query(ms)':>17}")
+    for n in sizes:
+        pages = make_pages(n + n_adds)
+        base, adds = pages[:n], pages[n:]
+
+        start = time.perf_counter()
+        InvertedIndex.build(base)
+        rebuild_ms = (time.perf_counter() - start) * 1000
+
+        index = SegmentedIndex.build(base)
+        times = []
+        for i, page in enumerate(adds):
+            start = time.perf_counter()
+            index.upsert(n + i, page)
+            times.append((time.perf_counter() - start) * 1000)
+        index.wait()
+        # upsert の max にはページ数が多いときの GC（世代2）の停止時間が含まれることがある
+        # 小さいセグメントが残った状態と、1つにまとめた後の検索時間
+        query_ms = _query_ms(index)
+        merges = index.merges
+        index.merge()
+        merged_ms = _query_ms(index)
+        print(f"{n:>8} {rebuild_ms:>12.1f} {statistics.median(times):>15.3f} {max(times):>15.3f} "
+              f"{merges:>7} {query_ms:>10.2f} {merged_ms:>17.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--adds", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.sizes, args.adds)
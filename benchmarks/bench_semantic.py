@@ -0,0 +1,64 @@
+# ===================================================
+# bench_semantic.py - LSA の作成時間と検索時間（全件の行列積 vs クラスタで絞る近似検索）
+# 実行例: python -m benchmarks.bench_semantic --sizes 10000 100000
+# ===================================================
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_pages
+from semantic import SemanticIndex
+
+
+def _exact(index: SemanticIndex) -> SemanticIndex:
+    # 同じページベクトルをページ番号順に戻し、クラスタを使わない版を作る
+    order = np.argsort(index.doc_ids)
+    arrays = {
+        "terms": index.terms, "idf": index.idf, "components": index.components,
+        "vectors": np.ascontiguousarray(index.vectors[order]), "doc_ids": np.arange(len(order)),
+        "centroids": index.centroids[:0], "bounds": np.zeros(1, dtype=np.int64),
+    }
+    return SemanticIndex(index.pages, _arrays=arrays)
+
+
+def _top(index: SemanticIndex, query: str, k: int = 10) -> tuple:
+    start = time.perf_counter()
+    doc_ids, scores = index.similarities(query)
+    top = doc_ids[np.argsort(-scores, kind="stable")[:k]]
+    return (time.perf_counter() - start) * 1000, set(top.tolist())
+
+
+def run(sizes: list, n_queries: int = 200, n_probe: int = 32):
+    print(f"{'pages':>8} {'fit(s)':>8} {'lists':>6} {'exact(ms)':>10} {'ann(ms)':>8} {'recall@10':>10} {'matrix(MB)':>11}")
+    queries = [page["title"] for page in make_pages(n_queries, seed=1)]
+    for n in sizes:
+        pages = make_pages(n)
+        start = time.perf_counter()
+        ann = SemanticIndex(pages, n_lists=int(np.sqrt(n)), n_probe=n_probe)
+        fit_s = time.perf_counter() - start
+        exact = _exact(ann)
+
+        exact_ms, ann_ms, recall = [], [], []
+        for query in queries:
+            ms, expected = _top(exact, query)
+            exact_ms.append(ms)
+            ms, found = _top(ann, query)
+            ann_ms.append(ms)
+            if expected:
+                recall.append(len(found & expected) / len(expected))
+        print(f"{n:>8} {fit_s:>8.1f} {len(ann.centroids):>6} {statistics.median(exact_ms):>10.3f} "
+              f"{statistics.median(ann_ms):>8.3f} {statistics.mean(recall):>10.1%} {ann.vectors.nbytes / 1e6:>11.1f}")
+    # 合成ページは単語をランダムに並べたものでクラスタの構造がほとんど無いため、近似検索の recall は
+    # 実際の文章より低めに出る
+    print(f"（近似検索は √ページ数 個のクラスタのうち {n_probe} 個を調べる。ms は1件あたりの中央値）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--probe", type=int, default=32)
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.probe)
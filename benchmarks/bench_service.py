@@ -0,0 +1,139 @@
+# ===================================================
+# bench_service.py - 検索サービス（search_service.py）の負荷試験（p50 / p99・QPS）
+# 実行例: python -m benchmarks.bench_service --pages 10000 --clients 8 --requests 2000
+#         python -m benchmarks.bench_service --url http://127.0.0.1:8000 --clients 16
+# ===================================================
+import argparse
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+from benchmarks.synthetic import EN_WORDS, JA_WORDS, make_pages
+from page_store import PageStore
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def make_queries(n: int, seed: int = 0) -> list:
+    """1〜2語のクエリを n 件作る（同じ seed なら同じ並び）。"""
+    rng = random.Random(seed)
+    words = EN_WORDS + JA_WORDS
+    return [" ".join(rng.sample(words, rng.choice((1, 1, 2)))) for _ in range(n)]
+
+
+@contextmanager
+def local_service(n_pages: int, workers: int, cache_entries: int):
+    """合成ページの pages.db を作り、別プロセスで search_service.py を起動する。"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "pages.db"
+        pages = make_pages(n_pages)
+        for page in pages:
+            page.pop("id")
+        PageStore(db).put_many(pages)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        proc = subprocess.Popen(
+            [sys.executable, "search_service.py", "--db", str(db), "--port", str(port),
+             "--workers", str(workers), "--cache-entries", str(cache_entries)],
+            cwd=ROOT, stdout=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{port}"
+        try:
+            deadline = time.monotonic() + 300
+            while True:
+                try:
+                    requests.get(f"{url}/health", timeout=1)
+                    break
+                except requests.ConnectionError:
+                    if proc.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("search_service.py が起動しませんでした")
+                    time.sleep(0.2)
+            yield url
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def load_test(url: str, queries: list, clients: int, engine: str) -> dict:
+    """
+    clients 本のスレッドから queries を分担して /search に送り、応答時間を集計する。
+
+    Returns:
+        {"requests", "errors", "seconds", "qps", "p50", "p90", "p99", "max"}（時間は ms）
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(part: list):
+        session = requests.Session()   # keep-alive で接続を使い回す
+        mine, failed = [], 0
+        for q in part:
+            start = time.perf_counter()
+            try:
+                r = session.get(f"{url}/search", params={"q": q, "engine": engine, "limit": 10}, timeout=30)
+                failed += r.status_code != 200
+            except requests.RequestException:
+                failed += 1
+            mine.append((time.perf_counter() - start) * 1000)
+        session.close()
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=client, args=(queries[i::clients],)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - start
+    pct = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies), "errors": sum(errors), "seconds": seconds,
+        "qps": len(latencies) / seconds, "p50": pct[49], "p90": pct[89], "p99": pct[98], "max": max(latencies),
+    }
+
+
+def run(url: str, n_pages: int, clients: list, n_requests: int, engine: str, workers: int, cache_entries: int):
+    queries = make_queries(n_requests)
+
+    def report(target: str):
+        # 1回目は各エンジンの作成やキャッシュの準備を含むので、少しだけ流してから計る
+        load_test(target, queries[:50], 1, engine)
+        print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'qps':>8} {'p50(ms)':>8} {'p90(ms)':>8} "
+              f"{'p99(ms)':>8} {'max(ms)':>8}")
+        for n in clients:
+            s = load_test(target, queries, n, engine)
+            print(f"{n:>8} {s['requests']:>9} {s['errors']:>7} {s['qps']:>8.1f} {s['p50']:>8.2f} "
+                  f"{s['p90']:>8.2f} {s['p99']:>8.2f} {s['max']:>8.2f}")
+
+    if url:
+        print(f"対象: {url} / engine={engine}")
+        report(url)
+        return
+    print(f"対象: ローカル（{n_pages}件・workers={workers}・結果キャッシュ {cache_entries}件）/ engine={engine}")
+    with local_service(n_pages, workers, cache_entries) as target:
+        report(target)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="起動済みのサービス（未指定なら合成ページでローカルに起動する）")
+    parser.add_argument("--pages", type=int, default=10000, help="ローカルに起動するときのページ数")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16], help="同時に送るクライアント数")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--engine", default="index")
+    parser.add_argument("--workers", type=int, default=8, help="ローカルのサービスが同時に処理するリクエスト数")
+    parser.add_argument("--cache-entries", type=int, default=0, help="ローカルのサービスの結果キャッシュ（既定は無効）")
+    args = parser.parse_args()
+    run(args.url, args.pages, args.clients, args.requests, args.engine, args.workers, args.cache_entries)
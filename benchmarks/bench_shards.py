@@ -0,0 +1,67 @@
+# ===================================================
+# bench_shards.py - BM25 を1プロセスで検索 vs シャードごとのプロセスで並列に検索
+# 実行例: python -m benchmarks.bench_shards --pages 300000 --shards 1 2 4 8
+# ===================================================
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_pages, make_query_log
+from corpus import Corpus
+from ranking import RankedIndex
+from sharded_index import ShardedIndex
+
+
+def _latencies(engine, queries: list) -> np.ndarray:
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        engine.search_page(q, 10, 0)
+        times.append((time.perf_counter() - start) * 1000)
+    return np.asarray(times)
+
+
+def _ids(found: dict) -> list:
+    return [(r["id"], r["score"]) for r in found["results"]]
+
+
+def run(n_pages: int, shard_counts: list, n_queries: int):
+    pages = Corpus(make_pages(n_pages))
+    queries = [e["q"] for e in make_query_log(n_queries)]
+    print(f"pages={n_pages} queries={len(queries)} cpus={os.cpu_count()}")
+    print(f"{'engine':>10} {'build(s)':>9} {'p50(ms)':>8} {'p99(ms)':>8} {'qps':>8} {'speedup':>8}")
+
+    start = time.perf_counter()
+    single = RankedIndex(pages)
+    build_s = time.perf_counter() - start
+    times = _latencies(single, queries)
+    base_qps = len(times) / times.sum() * 1000
+    print(f"{'single':>10} {build_s:>9.2f} {np.median(times):>8.2f} {np.percentile(times, 99):>8.2f} "
+          f"{base_qps:>8.1f} {1:>7.2f}x")
+
+    for n in shard_counts:
+        start = time.perf_counter()
+        with ShardedIndex(pages, n_shards=n) as sharded:
+            build_s = time.perf_counter() - start
+            # 単一プロセスの BM25 と同じ順位・スコアになること
+            assert all(_ids(single.search_page(q)) == _ids(sharded.search_page(q)) for q in queries[:50])
+            times = _latencies(sharded, queries)
+        qps = len(times) / times.sum() * 1000
+        print(f"{f'{n} shards':>10} {build_s:>9.2f} {np.median(times):>8.2f} {np.percentile(times, 99):>8.2f} "
+              f"{qps:>8.1f} {qps / base_qps:>7.2f}x")
+    # シャードのスコア計算は並列だが、結果のマージ・プレビュー作成とプロセス間のやり取りは親で逐次に行う。
+    # CPU 数よりシャードが多いと、やり取りの分だけ単一プロセスより遅くなる
+    print("（1クエリずつ順に検索したときの応答時間。speedup は single との QPS の比）")
+    if max(shard_counts) > (os.cpu_count() or 1):
+        print(f"⚠️ CPU が {os.cpu_count()} 個なので、それより多いシャードでは並列化の効果は出ません")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100000)
+    parser.add_argument("--shards", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    run(args.pages, args.shards, args.queries)
@@ -0,0 +1,57 @@
+# ===================================================
+# bench_snippet.py - プレビュー生成の計測（本文の長さを変えて比較）
+# 実行例: python -m benchmarks.bench_snippet --words 100 1000 10000
+# ===================================================
+import argparse
+import time
+
+from benchmarks.synthetic import make_pages
+from inverted_index import InvertedIndex
+from search_fulltext import _make_preview
+
+QUERIES = ["search", "検索", "kakaka0", "データ分析"]
+
+
+def _lower_find_preview(text: str, query: str, ctx: int = 80) -> str:
+    # 以前の実装（結果ごとに本文全体を小文字化して探す）
+    pos = text.lower().find(query.lower())
+    if pos == -1:
+        return text[:200]
+    return text[max(0, pos - ctx):pos + len(query) + ctx]
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(words: list, n_pages: int = 200, repeat: int = 3):
+    print(f"{'words':>7} {'lower+find':>11} {'cached re':>10} {'index':>8}  (ms / {n_pages}件×{len(QUERIES)}クエリ)")
+    for body_words in words:
+        pages = make_pages(n_pages, body_words=body_words)
+        index = InvertedIndex.build(pages)
+        hits = {q: index._match(q) for q in QUERIES}
+        texts = [p["full_text"] for p in pages]
+
+        old = _time(lambda: [_lower_find_preview(t, q) for q in QUERIES for t in texts], repeat)
+        new = _time(lambda: [_make_preview(t, q) for q in QUERIES for t in texts], repeat)
+        # インデックスはマッチしたページだけプレビューを作るので、1件あたりに換算する
+        n_hits = sum(len(h[0]) for h in hits.values()) or 1
+        idx = _time(lambda: [
+            index._preview(doc_id, q, leaves)
+            for q, (found, leaves, _) in hits.items() for _, doc_id in found
+        ], repeat) * (n_pages * len(QUERIES)) / n_hits
+        print(f"{body_words:>7} {old * 1000:>11.1f} {new * 1000:>10.1f} {idx * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.words, args.pages, args.repeat)
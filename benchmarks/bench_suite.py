@@ -0,0 +1,211 @@
+# ===================================================
+# bench_suite.py - 検索・クロール・解析のまとめ計測（結果を JSON に保存してコミット間で比較）
+# 実行例: python -m benchmarks.bench_suite --sizes 1000 10000 100000 --out bench/HEAD.json
+#         python -m benchmarks.bench_suite --sizes 10000 --compare bench/base.json
+# ===================================================
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.fixture_server import FixtureServer, page_html
+from benchmarks.synthetic import iter_pages, make_pages, make_query_log
+from bulk_crawler import crawl_urls
+from corpus import Corpus
+from crawler import parse_html
+from page_store import PageStore
+from search_engine import ENGINES, open_engine
+
+DEFAULT_ENGINES = ["index", "mmap", "bm25", "fts"]
+# 悪化とみなす変化の割合（--compare で印をつける）
+THRESHOLD = 0.1
+
+
+def _rss_mb() -> float:
+    # Linux は /proc から今の RSS を読む。他の OS では ru_maxrss（最大値）で代用する
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1e6 if platform.system() == "Darwin" else rss / 1e3
+
+
+def _percentiles(times: list) -> dict:
+    times = np.asarray(times)
+    p50, p90, p99 = np.percentile(times, [50, 90, 99])
+    return {"p50_ms": p50, "p90_ms": p90, "p99_ms": p99, "max_ms": times.max(), "mean_ms": times.mean()}
+
+
+def load_query_log(path: Path, n: int) -> list:
+    """検索ログ（1行1件の JSON）を読む。無ければ n 件生成して保存する（以降は同じログを再生する）。"""
+    if path.exists():
+        return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line]
+    log = make_query_log(n)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in log), encoding="utf-8")
+    return log
+
+
+def bench_search(n_pages: int, engines: list, log: list, tmp: Path) -> dict:
+    """ページ数 n_pages の合成コーパスで、エンジンごとの作成時間・メモリ・検索時間を測る。"""
+    store = PageStore(tmp / f"pages-{n_pages}.db")
+    start = time.perf_counter()
+    pages = iter_pages(n_pages)
+    while chunk := list(islice(pages, 10000)):
+        store.put_many(chunk)
+    store_s = time.perf_counter() - start
+
+    gc.collect()
+    rss = _rss_mb()
+    start = time.perf_counter()
+    corpus = Corpus(store.iter())
+    result = {"store_s": store_s, "load_s": time.perf_counter() - start, "corpus_mb": _rss_mb() - rss}
+
+    for name in engines:
+        # モジュールの import（numpy・scipy など）の分をメモリ・作成時間に含めないよう、先に小さく作っておく
+        open_engine(name, Corpus(make_pages(10)), store=PageStore(tmp / "warmup.db"), index_path=tmp / "warmup.bin")
+        gc.collect()
+        rss = _rss_mb()
+        start = time.perf_counter()
+        index_path = tmp / f"index-{n_pages}.bin" if name == "mmap" else None
+        engine = open_engine(name, corpus, store=store, index_path=index_path)
+        build_s = time.perf_counter() - start
+        memory_mb = _rss_mb() - rss
+
+        times, by_kind = [], {}
+        for entry in log:
+            t = time.perf_counter()
+            engine.search_page(entry["q"], 10, 0)
+            ms = (time.perf_counter() - t) * 1000
+            times.append(ms)
+            by_kind.setdefault(entry["kind"], []).append(ms)
+        result[name] = {
+            "build_s": build_s, "memory_mb": memory_mb, **_percentiles(times),
+            **{f"{kind}_p50_ms": statistics.median(t) for kind, t in sorted(by_kind.items())},
+        }
+        print(f"{n_pages:>8} {name:>8} {build_s:>9.2f} {memory_mb:>8.1f} "
+              f"{result[name]['p50_ms']:>8.2f} {result[name]['p99_ms']:>8.2f}", flush=True)
+        del engine
+    return result
+
+
+def bench_crawl(n_pages: int, latency: float, workers: int) -> dict:
+    """ローカルの FixtureServer をクロールする速さ（取得 + 解析）。"""
+    with FixtureServer(n_pages, latency) as server:
+        start = time.perf_counter()
+        found = crawl_urls(server.urls(), max_workers=workers, per_host=workers, delay=0)
+        seconds = time.perf_counter() - start
+    ok = sum(r["crawl_status"] == "success" for r in found)
+    return {"pages": n_pages, "ok": ok, "pages_per_sec": n_pages / seconds}
+
+
+def bench_parse(n_pages: int) -> dict:
+    """HTML 解析（crawler.parse_html）の速さ。"""
+    docs = [(f"https://example.com/page/{i}", page_html(p)) for i, p in enumerate(make_pages(n_pages, seed=2))]
+    start = time.perf_counter()
+    for url, html in docs:
+        parse_html(html, url)
+    seconds = time.perf_counter() - start
+    size = sum(len(html.encode("utf-8")) for _, html in docs)
+    return {"pages": n_pages, "pages_per_sec": n_pages / seconds, "mb_per_sec": size / 1e6 / seconds}
+
+
+def _flatten(tree: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(old: dict, new: dict, threshold: float = THRESHOLD):
+    """2回分の結果を項目ごとに並べ、threshold より悪くなった項目に印をつける。"""
+    before, after = _flatten(old["results"]), _flatten(new["results"])
+    print(f"\n比較: {old['meta'].get('commit', '?')} → {new['meta'].get('commit', '?')}")
+    print(f"{'metric':<40} {'before':>10} {'after':>10} {'change':>8}")
+    worse = 0
+    for key in sorted(before.keys() & after.keys()):
+        a, b = before[key], after[key]
+        if key.endswith(("pages", ".ok")) or not a:
+            continue
+        change = (b - a) / abs(a)
+        # 速さ（per_sec）は大きいほど良く、それ以外（秒・ms・MB）は小さいほど良い
+        bad = -change if key.endswith("per_sec") else change
+        mark = " ⚠️" if bad > threshold else ""
+        worse += bool(mark)
+        print(f"{key:<40} {a:>10.3f} {b:>10.3f} {change:>+8.1%}{mark}")
+    print(f"{threshold:.0%} 以上悪化: {worse}項目")
+
+
+def _commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(sizes: list, engines: list, n_queries: int, query_log: Path, crawl_pages: int, latency: float,
+        workers: int, parse_pages: int, out: Path = None, baseline: Path = None) -> dict:
+    log = load_query_log(query_log, n_queries)
+    meta = {
+        "commit": _commit(), "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+        "cpus": os.cpu_count(), "sizes": sizes, "engines": engines, "queries": len(log),
+        "query_log": str(query_log),
+    }
+    results = {"search": {}}
+    print(f"{'pages':>8} {'engine':>8} {'build(s)':>9} {'mem(MB)':>8} {'p50(ms)':>8} {'p99(ms)':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            results["search"][str(n)] = bench_search(n, engines, log, Path(tmp))
+            gc.collect()
+    if crawl_pages:
+        results["crawl"] = bench_crawl(crawl_pages, latency, workers)
+        print(f"crawl: {results['crawl']['pages_per_sec']:.1f} pages/sec "
+              f"（{crawl_pages}件・遅延 {latency * 1000:.0f}ms・{workers}並列）")
+    if parse_pages:
+        results["parse"] = bench_parse(parse_pages)
+        print(f"parse: {results['parse']['pages_per_sec']:.1f} pages/sec / {results['parse']['mb_per_sec']:.1f} MB/sec")
+
+    report = {"meta": meta, "results": results}
+    out = out or Path("bench") / f"{meta['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"📄 {out}")
+    if baseline:
+        compare(json.loads(baseline.read_text(encoding="utf-8")), report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="合成コーパスのページ数（100万件まで）")
+    parser.add_argument("--engines", nargs="+", default=DEFAULT_ENGINES, choices=list(ENGINES))
+    parser.add_argument("--queries", type=int, default=1000, help="検索ログを新しく作るときの件数")
+    parser.add_argument("--query-log", type=Path, default=Path("bench/queries.jsonl"),
+                        help="再生する検索ログ（無ければ作って保存する）")
+    parser.add_argument("--crawl-pages", type=int, default=200, help="0 でクロールを測らない")
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--parse-pages", type=int, default=2000, help="0 で解析を測らない")
+    parser.add_argument("--out", type=Path, help="結果の保存先（既定は bench/<コミット>.json）")
+    parser.add_argument("--compare", type=Path, help="比べる以前の結果（JSON）")
+    args = parser.parse_args()
+    run(args.sizes, args.engines, args.queries, args.query_log, args.crawl_pages, args.latency,
+        args.workers, args.parse_pages, args.out, args.compare)
@@ -0,0 +1,79 @@
+# ===================================================
+# bench_terms.py - 語彙辞書の前方一致・タイプミス補正の応答時間
+# 実行例: python -m benchmarks.bench_terms --terms 1000000
+# ===================================================
+import argparse
+import random
+import time
+
+from term_dict import TermDictionary
+
+_LETTERS = "etaoinshrdlcumwfgypbvkjxqz"
+# 英文の文字頻度（%）
+_WEIGHTS = [12.7, 9.1, 8.2, 7.5, 7.0, 6.7, 6.3, 6.1, 6.0, 4.3, 4.0, 2.8, 2.8, 2.4, 2.4,
+            2.2, 2.0, 2.0, 1.9, 1.5, 1.0, 0.8, 0.2, 0.2, 0.1, 0.1]
+
+
+def make_vocab(n: int, seed: int = 0) -> dict:
+    """英単語風のランダムな語を n 語作る（出現ページ数は Zipf 風）。"""
+    rng = random.Random(seed)
+    vocab = {}
+    while len(vocab) < n:
+        # 英文の文字頻度で並べて、実際の語彙のように前方一致の範囲や trigram に偏りを持たせる
+        term = "".join(rng.choices(_LETTERS, _WEIGHTS, k=rng.randint(3, 12)))
+        vocab[term] = max(1, int(10000 / (len(vocab) + 1) ** 0.8))
+    return vocab
+
+
+def _typo(rng: random.Random, term: str) -> str:
+    i = rng.randrange(len(term))
+    op = rng.choice("sdi")
+    if op == "s":
+        return term[:i] + rng.choice(_LETTERS) + term[i + 1:]
+    if op == "d":
+        return term[:i] + term[i + 1:]
+    return term[:i] + rng.choice(_LETTERS) + term[i:]
+
+
+def _percentiles(times: list) -> str:
+    times = sorted(times)
+    p50 = times[len(times) // 2] * 1000
+    p99 = times[int(len(times) * 0.99)] * 1000
+    return f"p50={p50:.2f}ms p99={p99:.2f}ms"
+
+
+def run(n_terms: int, n_queries: int = 300):
+    vocab = make_vocab(n_terms)
+    start = time.perf_counter()
+    terms = TermDictionary(vocab)
+    print(f"terms={len(terms)} build={time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    terms._gram_index()
+    print(f"trigram index build={time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(1)
+    sample = rng.sample(terms.terms, n_queries)
+    prefixes = [t[:rng.randint(1, 4)] for t in sample]
+    typos = [(t, _typo(rng, t)) for t in sample if len(t) >= 5]
+    for name, queries, fn in [
+        ("complete", prefixes, terms.complete),
+        ("correct", [typo for _, typo in typos], terms.correct),
+    ]:
+        times = []
+        for q in queries:
+            start = time.perf_counter()
+            fn(q)
+            times.append(time.perf_counter() - start)
+        print(f"{name:<9} n={len(queries)} {_percentiles(times)}")
+
+    # 元の語が補正候補（上位10件）に入った割合
+    found = sum(any(t == c for c, _ in terms.correct(typo)) for t, typo in typos)
+    print(f"correct recall@10={found / len(typos):.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--terms", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+    run(args.terms, args.queries)
@@ -0,0 +1,33 @@
+# ===================================================
+# bench_tokenizer.py - トークナイザのスループット計測（MB/s）
+# 実行例: python -m benchmarks.bench_tokenizer --pages 10000
+# ===================================================
+import argparse
+import time
+
+from benchmarks.synthetic import make_pages
+from tokenizer import tokenize
+
+
+def run(n_pages: int, repeat: int = 3):
+    texts = [p["full_text"] for p in make_pages(n_pages)]
+    n_bytes = sum(len(t.encode("utf-8")) for t in texts)
+
+    best = float("inf")
+    n_tokens = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        n_tokens = sum(len(tokenize(t)) for t in texts)
+        best = min(best, time.perf_counter() - start)
+
+    mb = n_bytes / 1_000_000
+    print(f"pages={n_pages} size={mb:.1f}MB tokens={n_tokens}")
+    print(f"time={best:.2f}s throughput={mb / best:.1f}MB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.pages, args.repeat)
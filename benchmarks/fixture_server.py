@@ -0,0 +1,87 @@
+# ===================================================
+# fixture_server.py - クローラー計測用のローカルHTTPサーバー
+# ===================================================
+import hashlib
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import make_pages
+
+
+def page_html(page: dict, internal_links: list = ()) -> str:
+    """合成ページを crawler.parse_html で読める HTML にする（internal_links は相対リンク）。"""
+    hrefs = list(internal_links) + page["links"]
+    links = "".join(f'<li><a href="{escape(u)}">{escape(u)}</a></li>' for u in hrefs)
+    paragraphs = "".join(f"<p>{escape(s)}</p>" for s in page["full_text"].split("。") if s)
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{escape(page['title'])}</title>"
+        f"<meta name=\"description\" content=\"{escape(page['description'])}\">"
+        f"<meta name=\"keywords\" content=\"{escape(','.join(page['keywords']))}\">"
+        "<script>var x = 1;</script></head><body>"
+        f"<nav>menu</nav><h1>{escape(page['title'])}</h1>{paragraphs}<ul>{links}</ul>"
+        "<footer>footer</footer></body></html>"
+    )
+
+
+class FixtureServer:
+    """
+    /page/<番号> で合成ページを返すHTTPサーバー。
+
+    Args:
+        n_pages: 用意するページ数
+        latency: 1レスポンスごとに待つ秒数（ネットワーク遅延の代わり）
+        port:    待ち受けポート（0 なら空いているポート）
+    """
+
+    def __init__(self, n_pages: int = 100, latency: float = 0.05, port: int = 0):
+        # 各ページから同じサーバー内の3ページへリンクを張る（巡回クロールの計測用）
+        bodies = [
+            page_html(p, [f"/page/{(i * k + 1) % n_pages}" for k in (2, 3, 7)]).encode("utf-8")
+            for i, p in enumerate(make_pages(n_pages))
+        ]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive を有効にする
+
+            def do_GET(self):
+                time.sleep(latency)
+                try:
+                    body = bodies[int(self.path.rstrip("/").rsplit("/", 1)[-1])]
+                except (ValueError, IndexError):
+                    self.send_error(404)
+                    return
+                etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.n_pages = n_pages
+
+    def urls(self) -> list:
+        return [f"{self.base_url}/page/{i}" for i in range(self.n_pages)]
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,119 @@
+# ===================================================
+# synthetic.py - ベンチマーク用の合成コーパス生成
+# ===================================================
+import random
+from typing import Iterator
+
+EN_WORDS = [
+    "profile", "career", "sales", "consulting", "strategy", "data", "cloud",
+    "python", "design", "project", "team", "product", "market", "customer",
+    "service", "platform", "digital", "transformation", "manufacturing",
+    "engineer", "analysis", "security", "network", "mobile", "web", "ai",
+    "dx", "iot", "startup", "finance", "hobby", "travel", "family", "future",
+]
+JA_WORDS = [
+    "自己紹介", "製造業", "新規事業", "営業", "コンサルティング", "家族", "旅行",
+    "デジタル変革", "データ分析", "顧客", "開発", "趣味", "経歴", "将来",
+    "チーム", "推進", "担当", "大手メーカー", "海外", "文化", "技術", "研修",
+]
+CATEGORIES = ["自己紹介", "プロダクト", "事例", "その他", "自動取得"]
+AUTHORS = ["田中太郎", "クローラー", "佐藤花子", "鈴木一郎", "高橋次郎"]
+
+# 出現頻度の低い語（ロングテール）。実コーパスの固有名詞・専門用語の代わり
+_SYLLABLES = ["ka", "ri", "to", "mo", "na", "shi", "ku", "ze", "ro", "pa", "yu", "de"]
+TAIL_WORDS = [
+    a + b + c + str(i % 10)
+    for i, (a, b, c) in enumerate(
+        (a, b, c) for a in _SYLLABLES for b in _SYLLABLES for c in _SYLLABLES
+    )
+]
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    parts = []
+    for _ in range(n_words):
+        r = rng.random()
+        if r < 0.2:
+            # 先頭ほど出やすい（Zipf 風）
+            parts.append(TAIL_WORDS[int(len(TAIL_WORDS) * r * r * 25) % len(TAIL_WORDS)])
+        elif r < 0.6:
+            parts.append(rng.choice(EN_WORDS).capitalize() if rng.random() < 0.2 else rng.choice(EN_WORDS))
+        else:
+            parts.append(rng.choice(JA_WORDS) + rng.choice(["の", "を", "と", "に", "。", ""]))
+    return " ".join(parts)
+
+
+def make_pages(n: int, seed: int = 0, body_words: int = 60) -> list:
+    """
+    data/pages.json と同じ形の合成ページを n 件生成する（seed が同じなら同じ結果）。
+    """
+    return list(iter_pages(n, seed, body_words))
+
+
+def iter_pages(n: int, seed: int = 0, body_words: int = 60) -> Iterator[dict]:
+    """make_pages と同じページを1件ずつ返す（100万件でも全件をメモリに載せずに保存できる）。"""
+    rng = random.Random(seed)
+    for i in range(n):
+        full_text = _sentence(rng, rng.randint(body_words // 2, body_words * 2))
+        year, month, day = 2024 + rng.randint(0, 1), rng.randint(1, 12), rng.randint(1, 28)
+        yield {
+            "id": i + 1,
+            "url": f"https://site{i % 997}.example.com/page/{i}",
+            "title": _sentence(rng, rng.randint(2, 5)),
+            "description": _sentence(rng, rng.randint(5, 15)),
+            "keywords": rng.sample(EN_WORDS + JA_WORDS, rng.randint(0, 5)),
+            "author": rng.choice(AUTHORS),
+            "created_at": f"{year}-{month:02d}-{day:02d}",
+            "category": rng.choice(CATEGORIES),
+            "crawled_at": f"{year}-{month:02d}-{day:02d}T10:00:00",
+            "full_text": full_text,
+            "links": [f"https://site{rng.randint(0, 996)}.example.com/" for _ in range(rng.randint(0, 5))],
+            "word_count": len(full_text.split()),
+            "crawl_status": "success",
+        }
+
+
+# 検索ログの head（少数の定番クエリが大半を占める）・torso・tail（まれな語・綴り違い）の割合
+QUERY_MIX = {"head": 0.5, "torso": 0.35, "tail": 0.15}
+HEAD_QUERIES = [
+    "dx", "python", "製造業", "自己紹介", "data", "ai", "営業", "cloud",
+    "データ分析", "digital transformation", "新規事業", "career",
+]
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    i = rng.randrange(len(word))
+    return word[:i] + word[i + 1:] if len(word) > 3 and rng.random() < 0.5 else word[:i] + "x" + word[i:]
+
+
+def make_query_log(n: int, seed: int = 0) -> list:
+    """
+    再生用の検索ログを n 件生成する（seed が同じなら同じ並び）。
+
+    head は HEAD_QUERIES を順位の逆数の重み（Zipf 風）で繰り返し、torso は定番語の組み合わせ
+    （AND・OR・フレーズ）、tail はロングテールの語・綴り違い・ヒットしない語。
+
+    Returns:
+        [{"q": クエリ, "kind": "head" / "torso" / "tail"}, ...]
+    """
+    rng = random.Random(seed)
+    words = EN_WORDS + JA_WORDS
+    weights = [1 / (rank + 1) for rank in range(len(HEAD_QUERIES))]
+    log = []
+    for _ in range(n):
+        kind = rng.choices(list(QUERY_MIX), weights=list(QUERY_MIX.values()))[0]
+        if kind == "head":
+            q = rng.choices(HEAD_QUERIES, weights=weights)[0]
+        elif kind == "torso":
+            a, b = rng.sample(words, 2)
+            q = rng.choice([a, f"{a} {b}", f"{a} OR {b}", f'"{a} {b}"'])
+        else:
+            r = rng.random()
+            if r < 0.5:
+                q = rng.choice(TAIL_WORDS)
+            elif r < 0.8:
+                q = f"{rng.choice(TAIL_WORDS)} {rng.choice(words)}"
+            else:
+                q = _typo(rng, rng.choice(EN_WORDS))
+        log.append({"q": q, "kind": kind})
+    return log
@@ -0,0 +1,386 @@
+# ===================================================
+# binary_index.py - mmap で開くバイナリ形式の転置インデックス
+# Week 4 / 性能改善
+# ===================================================
+import json
+import mmap
+import os
+import struct
+from functools import lru_cache
+from itertools import accumulate
+from pathlib import Path
+
+from corpus import column
+from inverted_index import FIELDS, InvertedIndex
+from query_parser import ATTR_FIELDS
+from term_dict import TermDictionary
+from tokenizer import is_word
+
+MAGIC = b"T0IX"
+FORMAT_VERSION = 2
+# magic, 形式の版, ページ数, 語数, メタ情報（JSON）の位置と長さ
+_HEADER = struct.Struct("<4sIIIQQ")
+
+# ファイルの構成（ヘッダの後に各区画を並べ、最後のメタ情報の "sections" に各区画の開始位置と長さを書く）
+#   term_offsets  u32 × (語数+1)   語の UTF-8 バイト列の区切り（term_blob 内の位置）
+#   term_blob     語を UTF-8 のバイト順に並べてつないだもの
+#   postings_idx  u64 × (語数+1)   各語の postings の区切り（postings 内の位置）
+#   doc_freqs     u32 × 語数       各語の出現ページ数
+#   postings      語ごとに varint 列: ページ数, (ページ番号の差分, フィールドのビット,
+#                 (出現数, 出現位置の差分...) × フィールド数) × ページ数
+#   doc_lengths   u32 × ページ数   各ページのトークン数
+#   offsets_idx / offsets   full_text の各トークンの文字位置（varint の差分列）
+#   stored_idx / stored     各ページの JSON（UTF-8）
+#   attr_<項目>   u32 × ページ数   category / author の値の番号（値の一覧はメタ情報）
+
+
+def _varints(values, out: bytearray):
+    for n in values:
+        while n >= 0x80:
+            out.append(n & 0x7F | 0x80)
+            n >>= 7
+        out.append(n)
+
+
+def _read_varints(data) -> list:
+    values = []
+    append = values.append
+    value = shift = 0
+    for b in data:
+        if b < 0x80:
+            append(value | b << shift)
+            value = shift = 0
+        else:
+            value |= (b & 0x7F) << shift
+            shift += 7
+    return values
+
+
+def _deltas(positions) -> list:
+    prev = 0
+    out = []
+    for p in positions:
+        out.append(p - prev)
+        prev = p
+    return out
+
+
+def write_index(pages, path, source_version=None):
+    """
+    ページからバイナリ形式のインデックスファイルを作る。
+
+    一時ファイルに書いてから置き換えるので、読み込み中の他のプロセスには影響しない。
+
+    Args:
+        pages:          ページリスト（list of dict / Corpus）
+        path:           出力先
+        source_version: 元データの版（開くときの照合に使う）
+    """
+    index = InvertedIndex.build(pages)
+    terms = sorted(index.postings, key=lambda t: t.encode("utf-8"))
+    n_docs = len(pages)
+    sections = {}
+    chunks = []
+    pos = _HEADER.size
+
+    def add(name: str, data):
+        nonlocal pos
+        pad = -pos % 8   # 配列を memoryview.cast で読めるように8バイト境界にそろえる
+        chunks.append(b"\0" * pad)
+        pos += pad
+        sections[name] = [pos, len(data)]
+        chunks.append(data)
+        pos += len(data)
+
+    def table(fmt: str, values) -> bytes:
+        return struct.pack(f"<{len(values)}{fmt}", *values)
+
+    blob = bytearray()
+    term_offsets = [0]
+    postings = bytearray()
+    postings_idx = [0]
+    doc_freqs = []
+    doc_lengths = [0] * n_docs
+    for term in terms:
+        blob += term.encode("utf-8")
+        term_offsets.append(len(blob))
+        docs = index.postings[term]
+        doc_freqs.append(len(docs))
+        values = [len(docs)]
+        prev = 0
+        for doc_id in sorted(docs):
+            fields = docs[doc_id]
+            values.append(doc_id - prev)
+            prev = doc_id
+            values.append(sum(1 << i for i, f in enumerate(FIELDS) if f in fields))
+            for f in FIELDS:
+                if f in fields:
+                    values.append(len(fields[f]))
+                    values.extend(_deltas(fields[f]))
+                    doc_lengths[doc_id] += len(fields[f])
+        _varints(values, postings)
+        postings_idx.append(len(postings))
+
+    offsets = bytearray()
+    offsets_idx = [0]
+    for starts in index.offsets:
+        _varints(_deltas(starts), offsets)
+        offsets_idx.append(len(offsets))
+
+    stored = bytearray()
+    stored_idx = [0]
+    for page in pages:
+        stored += json.dumps(page, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        stored_idx.append(len(stored))
+
+    add("term_offsets", table("I", term_offsets))
+    add("term_blob", bytes(blob))
+    add("postings_idx", table("Q", postings_idx))
+    add("doc_freqs", table("I", doc_freqs))
+    add("postings", bytes(postings))
+    add("doc_lengths", table("I", doc_lengths))
+    add("offsets_idx", table("Q", offsets_idx))
+    add("offsets", bytes(offsets))
+    add("stored_idx", table("Q", stored_idx))
+    add("stored", bytes(stored))
+    attr_values = {}
+    for field in ATTR_FIELDS:
+        codes = {}
+        ids = [codes.setdefault(str(v) if v is not None else "", len(codes)) for v in column(pages, field)]
+        attr_values[field] = list(codes)
+        add(f"attr_{field}", table("I", ids))
+    meta = json.dumps({
+        "source_version": source_version,
+        "sections": sections,
+        "attr_values": attr_values,
+    }, ensure_ascii=False).encode("utf-8")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, n_docs, len(terms), pos, len(meta)))
+        for chunk in chunks:
+            f.write(chunk)
+        f.write(meta)
+    os.replace(tmp, path)
+
+
+class StoredPages:
+    """バイナリインデックス内のページ（JSON）を、番号で引かれたときだけ読み込むリスト風のもの。"""
+
+    def __init__(self, index: "BinaryIndex"):
+        self._index = index
+
+    def __len__(self) -> int:
+        return self._index.n_docs
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        idx = self._index._array("stored_idx", "Q")
+        return json.loads(self._index._section_bytes("stored", idx[i], idx[i + 1]))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, key: str) -> list:
+        """全ページの1項目（category / author は JSON を読まずに番号の列から引く）。"""
+        if key in ATTR_FIELDS:
+            values = self._index.meta["attr_values"][key]
+            return [values[code] or None for code in self._index._array(f"attr_{key}", "I")]
+        return [page.get(key) for page in self]
+
+
+class _Postings:
+    """語 → postings の辞書のように使える、mmap 上の postings への窓口。"""
+
+    def __init__(self, index: "BinaryIndex"):
+        self._index = index
+
+    def get(self, term: str, default=None):
+        i = self._index.find(term)
+        return self._index.postings_at(i) if i >= 0 else default
+
+    def __contains__(self, term: str) -> bool:
+        return self._index.find(term) >= 0
+
+    def __getitem__(self, term: str) -> dict:
+        docs = self.get(term)
+        if docs is None:
+            raise KeyError(term)
+        return docs
+
+    def __len__(self) -> int:
+        return self._index.n_terms
+
+
+class _Offsets:
+    """ページ番号 → full_text の各トークンの文字位置（読まれたときに復元する）。"""
+
+    def __init__(self, index: "BinaryIndex"):
+        self._index = index
+
+    def __getitem__(self, doc_id: int) -> list:
+        idx = self._index._array("offsets_idx", "Q")
+        return list(accumulate(_read_varints(self._index._section_bytes("offsets", idx[doc_id], idx[doc_id + 1]))))
+
+
+class BinaryIndex(InvertedIndex):
+    """
+    write_index で作ったファイルを mmap で開く転置インデックス。
+
+    開くときに読むのはヘッダとメタ情報だけで、語の検索は語の表の二分探索、
+    postings・ページ本体は必要になった分だけファイルから読む。
+    そのため起動時間はコーパスの大きさにほとんど依存しない。
+    検索の仕方（クエリ構文・スコア・プレビュー）は InvertedIndex と同じ。
+
+    Args:
+        path: インデックスファイルのパス
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n_docs, self.n_terms, meta_pos, meta_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} は対応していないインデックス形式です")
+        self.meta = json.loads(self._mm[meta_pos:meta_pos + meta_len])
+        self._arrays = {}
+        super().__init__(StoredPages(self), _Postings(self), _Offsets(self))
+        self.postings_at = lru_cache(maxsize=1024)(self._decode_postings)
+
+    @classmethod
+    def open(cls, path, source_version=None):
+        """
+        インデックスファイルを開く。
+
+        Returns:
+            BinaryIndex。ファイルが無い・形式が違う・元データの版が違う場合は None
+        """
+        try:
+            index = cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        if index.meta.get("source_version") != source_version:
+            index.close()
+            return None
+        return index
+
+    def close(self):
+        self._arrays.clear()
+        self._mm.close()
+
+    # ── ファイル内の区画 ──
+    def _section_bytes(self, name: str, start: int = 0, end: int = None) -> bytes:
+        offset, length = self.meta["sections"][name]
+        end = length if end is None else end
+        return self._mm[offset + start:offset + end]
+
+    def _array(self, name: str, fmt: str) -> memoryview:
+        view = self._arrays.get(name)
+        if view is None:
+            offset, length = self.meta["sections"][name]
+            view = self._arrays[name] = memoryview(self._mm)[offset:offset + length].cast(fmt)
+        return view
+
+    def term_at(self, i: int) -> bytes:
+        offsets = self._array("term_offsets", "I")
+        return self._section_bytes("term_blob", offsets[i], offsets[i + 1])
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, term: str) -> int:
+        """語の番号（無ければ -1）。"""
+        key = term.encode("utf-8")
+        i = self._lower_bound(key)
+        return i if i < self.n_terms and self.term_at(i) == key else -1
+
+    def _decode_postings(self, i: int) -> dict:
+        idx = self._array("postings_idx", "Q")
+        values = _read_varints(self._section_bytes("postings", idx[i], idx[i + 1]))
+        docs = {}
+        pos, doc_id = 1, 0
+        for _ in range(values[0]):
+            doc_id += values[pos]
+            mask = values[pos + 1]
+            pos += 2
+            fields = docs[doc_id] = {}
+            for bit, field in enumerate(FIELDS):
+                if mask >> bit & 1:
+                    n = values[pos]
+                    fields[field] = list(accumulate(values[pos + 1:pos + 1 + n]))
+                    pos += 1 + n
+        return docs
+
+    def doc_length(self, doc_id: int) -> int:
+        return self._array("doc_lengths", "I")[doc_id]
+
+    # ── InvertedIndex の処理のうち、語彙全体をたどるものを置き換える ──
+    def _prefix_postings(self, prefix: str) -> dict:
+        key = prefix.encode("utf-8")
+        # UTF-8 に 0xFF は現れないので、prefix + 0xFF 未満が前方一致の範囲になる
+        lo, hi = self._lower_bound(key), self._lower_bound(key + b"\xff")
+        merged = {}
+        for i in range(lo, hi):
+            for doc_id, fields in self.postings_at(i).items():
+                target = merged.setdefault(doc_id, {})
+                for field, positions in fields.items():
+                    target.setdefault(field, []).extend(positions)
+        for fields in merged.values():
+            for positions in fields.values():
+                positions.sort()
+        return merged
+
+    @property
+    def term_dict(self) -> TermDictionary:
+        if self._term_dict is None:
+            freqs = self._array("doc_freqs", "I")
+            terms = (self.term_at(i).decode("utf-8") for i in range(self.n_terms))
+            self._term_dict = TermDictionary({
+                term: freqs[i] for i, term in enumerate(terms) if len(term) > 1 and is_word(term)
+            })
+        return self._term_dict
+
+    def save(self, path, source_version=None):
+        write_index(self.pages, path, source_version)
+
+
+def load_or_build(pages, index_path, source_version) -> BinaryIndex:
+    """
+    バイナリインデックスが同じ版のデータから作られていれば開き、違えば作り直してから開く。
+
+    Args:
+        pages:          ページリスト（作り直すときだけ使う）
+        index_path:     インデックスファイルのパス
+        source_version: 元データの版
+    """
+    index = BinaryIndex.open(index_path, source_version)
+    if index is None:
+        write_index(pages, index_path, source_version)
+        index = BinaryIndex(index_path)
+    return index
+
+
+#テストコード#######
+if __name__ == "__main__":
+    DATA_PATH = Path("data/pages.json")
+    pages = json.loads(DATA_PATH.read_text(encoding="utf-8"))
+    index = load_or_build(pages, Path("data/index.bin"), DATA_PATH.stat().st_mtime)
+    found = index.search_page("DX 製造業", limit=3)
+    print(f"🔎 {found['total']}件 / 語数 {index.n_terms}")
+    for r in found["results"]:
+        print("-", r["title"], r["match_count"], r["preview"][:60])
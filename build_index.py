@@ -0,0 +1,59 @@
+# ===================================================
+# build_index.py - バイナリ形式の転置インデックス（と LSA のページベクトル）を作るコマンド
+# Week 4 / 性能改善
+# ===================================================
+import argparse
+import json
+import time
+from pathlib import Path
+
+from binary_index import BinaryIndex, write_index
+from page_store import PageStore
+from semantic import SemanticIndex
+
+
+def load_source(path: Path) -> tuple:
+    """
+    pages.json / pages.db からページと版を読む。
+
+    Returns:
+        (ページリスト, 元データの版)。版は pages.db なら PageStore.version
+        （アプリが開くときの照合に使う）、pages.json なら更新時刻
+    """
+    if path.suffix == ".db":
+        store = PageStore(path)
+        return store.all(), store.version()
+    return json.loads(path.read_text(encoding="utf-8")), path.stat().st_mtime
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pages.json / pages.db からバイナリ形式の転置インデックスを作る")
+    parser.add_argument("source", nargs="?", default="data/pages.json", help="入力（.json または .db）")
+    parser.add_argument("-o", "--output", default="data/index.bin", help="出力先")
+    parser.add_argument("--lsa", help="LSA のページベクトルも作る場合の出力先（例: data/lsa.npz）")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    pages, version = load_source(Path(args.source))
+    write_index(pages, args.output, version)
+    build_s = time.perf_counter() - start
+
+    index = BinaryIndex(args.output)
+    print(f"✅ {args.output} を作成しました（{index.n_docs}件 / {index.n_terms}語 / "
+          f"{Path(args.output).stat().st_size / 1e6:.1f}MB / {build_s:.2f}s）")
+    index.close()
+
+    if args.lsa:
+        start = time.perf_counter()
+        semantic = SemanticIndex(pages)
+        semantic.save(args.lsa, version)
+        print(f"✅ {args.lsa} を作成しました（{semantic.vectors.shape[0]}件 × {semantic.vectors.shape[1]}次元 / "
+              f"{time.perf_counter() - start:.2f}s）")
+
+
+# ─── 実行例 ───
+# python build_index.py data/pages.json -o data/index.bin
+# python build_index.py data/pages.db -o data/index.bin
+# python build_index.py data/pages.db -o data/index.bin --lsa data/lsa.npz
+if __name__ == "__main__":
+    main()
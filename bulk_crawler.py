@@ -0,0 +1,212 @@
+# ===================================================
+# bulk_crawler.py - 一括クロールモジュール（並列版）
+# Week 4 / 性能改善
+# ===================================================
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from crawler import crawl_url, fetch_conditional, page_from_fetch
+
+
+def make_session(pool_size: int = 10) -> requests.Session:
+    """接続プール付きの Session を作る（同じホストへの TCP/TLS 接続を使い回す）。"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HostLimiter:
+    """
+    ホストごとの同時接続数とアクセス間隔を制限する。
+
+    Args:
+        per_host: 1ホストあたりの同時リクエスト数
+        delay:    同じホストへのリクエスト開始の最小間隔（秒）
+    """
+
+    def __init__(self, per_host: int = 2, delay: float = 0.5):
+        self.per_host = per_host
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = {}
+
+    def _slot(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.Semaphore(self.per_host)
+            return self._slots[host]
+
+    def _wait_turn(self, host: str):
+        # 次に開始してよい時刻を予約してから、その時刻まで待つ
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    def run(self, url: str, fn: Callable):
+        host = urlsplit(url).netloc.lower()
+        with self._slot(host):
+            self._wait_turn(host)
+            return fn()
+
+
+def crawl_urls(urls: list, verify_ssl: bool = True, max_workers: int = 8,
+               per_host: int = 2, delay: float = 0.5,
+               progress: Optional[Callable[[int, int], None]] = None,
+               session: Optional[requests.Session] = None,
+               parse_workers: int = 0, queue_size: int = 32) -> list:
+    """
+    複数URLを並列にクロールする。
+
+    Args:
+        urls:          クロール対象URLのリスト
+        verify_ssl:    SSL証明書を検証するか
+        max_workers:   同時に動かすスレッド数
+        per_host:      1ホストあたりの同時リクエスト数
+        delay:         同じホストへのリクエスト間隔（秒）
+        progress:      progress(完了件数, 全件数) を呼ぶコールバック（呼び出し元のスレッドで呼ぶ）
+        session:       使い回す Session（未指定なら接続プール付きで作る）
+        parse_workers: HTMLの解析に使うプロセス数（0 なら取得したスレッドでそのまま解析する）
+        queue_size:    取得済み・解析待ちのページを溜めておく上限（parse_workers 指定時）
+
+    Returns:
+        crawl_url の結果のリスト（urls と同じ順番）
+    """
+    if parse_workers:
+        return _crawl_pipelined(urls, verify_ssl, max_workers, per_host, delay, progress, session,
+                                parse_workers, queue_size)
+    return map_urls(urls, lambda url, s: crawl_url(url, verify_ssl=verify_ssl, session=s),
+                    max_workers, per_host, delay, progress, session)
+
+
+_DONE = object()
+
+
+def _crawl_pipelined(urls: list, verify_ssl: bool, max_workers: int, per_host: int, delay: float,
+                     progress: Optional[Callable[[int, int], None]], session: Optional[requests.Session],
+                     parse_workers: int, queue_size: int) -> list:
+    """
+    取得（スレッド）と解析（プロセスプール）を分けて並行に動かす。
+
+    解析は CPU を使い続けるので、GIL のあるスレッドで行うと取得側の並列数を増やしても速くならない。
+    取得したHTMLは上限つきのキューに入れ、キューがいっぱいの間は取得側が待つので、
+    解析が追いつかなくてもメモリに溜まるHTMLは queue_size 件までになる。
+    """
+    if not urls:
+        return []
+    positions = {}
+    for i, url in enumerate(urls):
+        positions.setdefault(url, []).append(i)
+    fetched_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def fetch(url: str, s: requests.Session):
+        if not stop.is_set():
+            fetched_queue.put((url, fetch_conditional(url, verify_ssl=verify_ssl, session=s)))
+
+    def fetch_all():
+        try:
+            map_urls(list(positions), fetch, max_workers, per_host, delay, session=session)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            fetched_queue.put(_DONE)
+
+    results = [None] * len(urls)
+    done = 0
+    fetcher = threading.Thread(target=fetch_all, daemon=True)
+    fetcher.start()
+    try:
+        with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+            pending = {}
+            finished = False
+            while not finished or pending:
+                # 解析待ちが多いときは、キューから取り出さずに解析が終わるのを待つ
+                if not finished and len(pending) < parse_workers * 2:
+                    item = fetched_queue.get()
+                    if item is _DONE:
+                        finished = True
+                    else:
+                        url, fetched = item
+                        pending[pool.submit(page_from_fetch, url, fetched)] = url
+                    completed = [future for future in pending if future.done()]
+                else:
+                    completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    result = future.result()
+                    for i in positions[pending.pop(future)]:
+                        results[i] = result
+                        done += 1
+                    if progress:
+                        progress(done, len(urls))
+    finally:
+        # 途中で失敗したときも、待っている取得スレッドを止める
+        stop.set()
+        while fetcher.is_alive():
+            try:
+                fetched_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    if errors:
+        raise errors[0]
+    return results
+
+
+def map_urls(urls: list, fn: Callable, max_workers: int = 8, per_host: int = 2,
+             delay: float = 0.5, progress: Optional[Callable[[int, int], None]] = None,
+             session: Optional[requests.Session] = None) -> list:
+    """
+    fn(url, session) を各URLについて並列に実行する（ホストごとの制限つき）。
+
+    Returns:
+        fn の戻り値のリスト（urls と同じ順番）
+    """
+    if not urls:
+        return []
+
+    own_session = session is None
+    if own_session:
+        session = make_session(max_workers)
+    limiter = HostLimiter(per_host, delay)
+    results = [None] * len(urls)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(limiter.run, url, lambda url=url: fn(url, session)): i
+                for i, url in enumerate(urls)
+            }
+            # Streamlit の部品はメインスレッドからしか更新できないので、完了通知はここで受ける
+            for done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if progress:
+                    progress(done, len(urls))
+    finally:
+        if own_session:
+            session.close()
+    return results
+
+
+# ─── テスト ───
+if __name__ == "__main__":
+    urls = [
+        "https://example.com",
+        "https://example.org",
+    ]
+    start = time.perf_counter()
+    for r in crawl_urls(urls, progress=lambda done, total: print(f"{done}/{total}")):
+        print(r.get("crawl_status"), r.get("url"), r.get("title"))
+    print(f"⏱️ {time.perf_counter() - start:.2f}秒")
@@ -0,0 +1,203 @@
+# ===================================================
+# corpus.py - 列指向のページ集合（省メモリ版のページリスト）
+# Week 4 / 性能改善
+# ===================================================
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable
+
+import numpy as np
+
+# 1つの文字列につないで持つ本文系の項目（検索対象のテキストと同じ並び）
+TEXT_FIELDS = ("title", "description", "full_text")
+# 値の種類が少ないので、同じ文字列を1つのオブジェクトに共有する項目
+INTERNED_FIELDS = ("author", "category", "crawl_status")
+
+_MISSING = object()
+
+
+def _compact(key: str, value):
+    if key in INTERNED_FIELDS and isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        # keywords / links などの list はタプルにし、キーワードは共有する
+        return tuple(sys.intern(v) if isinstance(v, str) and key == "keywords" else v for v in value)
+    return value
+
+
+class Corpus:
+    """
+    ページのリスト（list of dict）と同じように使える、列ごとに値を持つページ集合。
+
+    ページごとの dict を持たず、項目ごとのリスト（列）に値を並べる。
+    タイトル・説明・本文・キーワードは全件走査と同じ形で1つの文字列につなぎ、小文字化した
+    検索用テキストとして1回だけ持つ。元の大文字は「位置と文字」の組だけを覚えておき、
+    ページを取り出すときに戻す。
+
+    corpus[i] や for 文では、その場で元と同じ形の dict を組み立てて返す。
+
+    Args:
+        pages: ページ（dict）の並び
+    """
+
+    def __init__(self, pages: Iterable[dict] = ()):
+        self.search_texts = []      # "タイトル 説明 本文 キーワード" を小文字化した文字列
+        self._upper = []            # 小文字化で変わった文字の (位置の array, 元の文字) または None
+        self._originals = {}        # 小文字化で長さが変わるページ（İ など）だけ元の文字列を持つ
+        self._bounds = array("I")   # 各ページのタイトル・説明・本文の終わりの位置
+        self._present = array("B")  # 本文系の項目を持っているかのビット（欠けている項目を区別する）
+        self._columns = {}          # 項目名 → 値のリスト（無い場合は _MISSING）
+        self._order = []            # dict に戻すときの項目の並び
+        self._known = set()
+        for page in pages:
+            self.append(page)
+
+    def append(self, page: dict):
+        i = len(self.search_texts)
+        parts, present = [], 0
+        for bit, field in enumerate(TEXT_FIELDS):
+            if field in page:
+                present |= 1 << bit
+            parts.append(page.get(field) or "")
+        text = " ".join(parts + [" ".join(page.get("keywords", []))])
+        self._add_text(i, text)
+        end = -1
+        for part in parts:
+            end += len(part) + 1
+            self._bounds.append(end)
+        self._present.append(present)
+
+        columns = self._columns
+        filled = 0
+        for key, value in page.items():
+            if key in TEXT_FIELDS:
+                continue
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [_MISSING] * i
+            if key in INTERNED_FIELDS or type(value) is list:
+                value = _compact(key, value)
+            column.append(value)
+            filled += 1
+        if filled < len(columns):
+            for column in columns.values():
+                if len(column) == i:
+                    column.append(_MISSING)
+        if len(self._known) < len(page) or not self._known.issuperset(page):
+            for key in page:
+                if key not in self._known:
+                    self._known.add(key)
+                    self._order.append(key)
+
+    def _add_text(self, i: int, text: str):
+        lowered = text.lower()
+        self.search_texts.append(lowered)
+        if lowered == text:
+            self._upper.append(None)
+        elif len(lowered) != len(text):
+            self._upper.append(None)
+            self._originals[i] = text
+        else:
+            # 1文字ずつ比べる代わりに UTF-32 の配列にして、変わった位置をまとめて求める
+            before = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+            after = np.frombuffer(lowered.encode("utf-32-le"), dtype=np.uint32)
+            changed = np.flatnonzero(before != after)
+            positions = array("I", changed.astype(np.uint32).tobytes())
+            self._upper.append((positions, "".join(map(chr, before[changed].tolist()))))
+
+    def _text(self, i: int, start: int, end: int) -> str:
+        """i 番目のページの元のテキスト（大文字を戻したもの）の start〜end 文字目。"""
+        if i in self._originals:
+            return self._originals[i][start:end]
+        text = self.search_texts[i][start:end]
+        upper = self._upper[i]
+        if upper is None:
+            return text
+        positions, chars = upper
+        lo, hi = bisect_left(positions, start), bisect_left(positions, end)
+        if lo == hi:
+            return text
+        restored = list(text)
+        for pos, ch in zip(positions[lo:hi], chars[lo:hi]):
+            restored[pos - start] = ch
+        return "".join(restored)
+
+    def copy(self) -> "Corpus":
+        """
+        同じページを持つ別の Corpus を返す。
+
+        列のリストだけを複製して値（文字列など）は共有するので、全件を作り直すよりずっと軽い。
+        複製に append しても元の Corpus は変わらない（読んでいる最中の検索に影響しない）。
+        """
+        new = type(self).__new__(type(self))
+        new.search_texts = list(self.search_texts)
+        new._upper = list(self._upper)
+        new._originals = dict(self._originals)
+        new._bounds = array("I", self._bounds)
+        new._present = array("B", self._present)
+        new._columns = {key: list(values) for key, values in self._columns.items()}
+        new._order = list(self._order)
+        new._known = set(self._known)
+        return new
+
+    def __len__(self) -> int:
+        return len(self.search_texts)
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += len(self.search_texts)
+        if not 0 <= i < len(self.search_texts):
+            raise IndexError(i)
+        page = {}
+        for key in self._order:
+            value = self.get(i, key, _MISSING)
+            if value is not _MISSING:
+                page[key] = value
+        return page
+
+    def __iter__(self):
+        for i in range(len(self.search_texts)):
+            yield self[i]
+
+    def get(self, i: int, key: str, default=None):
+        """i 番目のページの1項目だけを dict を作らずに取り出す。"""
+        if key in TEXT_FIELDS:
+            bit = TEXT_FIELDS.index(key)
+            if not self._present[i] >> bit & 1:
+                return default
+            start = self._bounds[i * 3 + bit - 1] + 1 if bit else 0
+            return self._text(i, start, self._bounds[i * 3 + bit])
+        column = self._columns.get(key)
+        value = column[i] if column is not None else _MISSING
+        if value is _MISSING:
+            return default
+        return list(value) if isinstance(value, tuple) else value
+
+    def column(self, key: str) -> list:
+        """全ページの1項目をリストで返す（無いページは None）。"""
+        if key in TEXT_FIELDS:
+            return [self.get(i, key) for i in range(len(self))]
+        return [None if v is _MISSING else v for v in self._columns.get(key, [_MISSING] * len(self))]
+
+
+def column(pages, key: str) -> list:
+    """Corpus（column を持つページ集合）でも list of dict でも、全ページの1項目をリストで返す。"""
+    if hasattr(pages, "column"):
+        return pages.column(key)
+    return [p.get(key) for p in pages]
+
+
+#テストコード#######
+if __name__ == "__main__":
+    import json
+    from pathlib import Path
+
+    pages = json.loads(Path("data/pages.json").read_text(encoding="utf-8"))
+    corpus = Corpus(pages)
+    assert list(corpus) == pages
+    print(f"{len(corpus)}件", corpus[0]["title"], corpus.column("category")[:3])
+    print(corpus.get(1, "full_text")[:80])
+    grown = corpus.copy()
+    grown.append(pages[0])
+    assert len(corpus) == len(pages) and list(grown) == pages + pages[:1]
@@ -2,13 +2,48 @@
 # crawler.py - Webクローラーモジュール（Level 2）
 # Week 3 / 指令5
 # ===================================================
+import codecs
+import hashlib
+import time
 import requests
+import urllib3
 from bs4 import BeautifulSoup
 from datetime import datetime
+from html import unescape
+from html.entities import html5
+from html.parser import HTMLParser
 from typing import Optional
+from urllib.parse import urljoin
 import re
 
-def fetch_page(url: str, timeout: int = 10, verify_ssl: bool = True) -> Optional[str]:
+from requests.compat import chardet
+
+from tokenizer import count_words
+from tracing import traced
+
+HEADERS = {"User-Agent": "Tech0SearchBot/1.0 (Educational Purpose)"}
+
+# 1ページで読み込む最大バイト数（超えた分は読まずに切り捨てる）
+MAX_BYTES = 2 * 1024 * 1024
+# 解析対象にする Content-Type
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+_CHUNK = 64 * 1024
+# meta charset・バイナリかどうかを調べる先頭のバイト数
+_SNIFF_BYTES = 4096
+# 文字コードを推定するときに使う先頭のバイト数（全体を調べると大きいページで遅い）
+_DETECT_BYTES = 32 * 1024
+_BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+_HEADER_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+_BINARY_MAGIC = (b"%PDF", b"PK\x03\x04", b"\x89PNG", b"GIF8", b"\xff\xd8\xff", b"\x1f\x8b")
+
+
+def fetch_page(url: str, timeout: int = 10, verify_ssl: bool = True,
+               session: Optional[requests.Session] = None) -> Optional[str]:
 # def fetch_page(url: str, timeout: int = 10) -> Optional[str]:
     """
     指定URLのHTMLを取得する。
@@ -16,25 +51,324 @@ def fetch_page(url: str, timeout: int = 10, verify_ssl: bool = True) -> Optional
     Args:
         url:     取得対象URL
         timeout: タイムアウト秒数
+        session: 使い回す requests.Session（接続を再利用する。未指定なら毎回新規接続）
 
     Returns:
         HTML文字列。失敗時は None
     """
+    return fetch_conditional(url, timeout=timeout, verify_ssl=verify_ssl, session=session)["html"]
+
+
+@traced("fetch")
+def fetch_conditional(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                      timeout: int = 10, verify_ssl: bool = True,
+                      session: Optional[requests.Session] = None,
+                      max_bytes: int = MAX_BYTES, max_seconds: float = 30) -> dict:
+    """
+    条件付きリクエスト（If-None-Match / If-Modified-Since）でHTMLを取得する。
+
+    本文は少しずつ読み、HTMLでない（Content-Type・先頭のバイト列で判定）と分かった時点で
+    読むのをやめる。max_bytes・max_seconds を超えた分は読まずに、それまでに読んだ分を使う。
+
+    Args:
+        url:           取得対象URL
+        etag:          前回取得時の ETag
+        last_modified: 前回取得時の Last-Modified
+        max_bytes:     読み込む最大バイト数
+        max_seconds:   本文の読み込みにかける最大秒数
+
+    Returns:
+        {"status": HTTPステータス（失敗時 None。304 なら未更新）,
+         "html": HTML文字列（304・失敗時は None）, "etag": ..., "last_modified": ...,
+         "error": 失敗の理由（失敗時のみ）}
+    """
+    headers = dict(HEADERS)
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
     try:
-        headers = {"User-Agent": "Tech0SearchBot/1.0 (Educational Purpose)"}
-        resp = requests.get(url, headers=headers, timeout=timeout, verify=verify_ssl)
-        # resp = requests.get(url, headers=headers, timeout=timeout)
-        resp.raise_for_status()
-        resp.encoding = resp.apparent_encoding
-        return resp.text
-    except requests.RequestException as e:
+        get = session.get if session is not None else requests.get
+        # stream=True で本文を読む前にヘッダーを確認する（with を抜けると途中でも接続を閉じる）
+        with get(url, headers=headers, timeout=timeout, verify=verify_ssl, stream=True) as resp:
+            if resp.status_code == 304:
+                return {
+                    "status": 304,
+                    "html": None,
+                    "etag": resp.headers.get("ETag", etag),
+                    "last_modified": resp.headers.get("Last-Modified", last_modified),
+                }
+            resp.raise_for_status()
+            content_type = resp.headers.get("Content-Type", "")
+            mime = content_type.split(";")[0].strip().lower()
+            if mime and mime not in HTML_TYPES:
+                return _fetch_error(f"HTMLではないためスキップしました（{mime}）")
+            # Content-Type が無いときは先頭を見てバイナリなら残りを読まない
+            body = read_body(resp, max_bytes, max_seconds, stop_if=None if mime else looks_binary)
+            if not mime and looks_binary(body):
+                return _fetch_error("HTMLではないためスキップしました（バイナリ）")
+            return {
+                "status": resp.status_code,
+                "html": body.decode(detect_encoding(body, content_type), errors="replace"),
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+            }
+    # read_body は resp.raw を直接読むので、途中で止まった・切れた接続は requests の例外に包まれずに届く
+    except (requests.RequestException, urllib3.exceptions.HTTPError, OSError) as e:
         print(f"❌ 取得エラー: {e}")
-        return None
+        return _fetch_error(str(e))
+
+
+def _fetch_error(message: str) -> dict:
+    return {"status": None, "html": None, "etag": None, "last_modified": None, "error": message}
+
+
+def read_body(resp: requests.Response, max_bytes: int = MAX_BYTES, max_seconds: float = 30,
+              stop_if=None) -> bytes:
+    """
+    レスポンスの本文を max_bytes まで・max_seconds 秒まで読む。
+
+    stop_if を渡すと、先頭 _SNIFF_BYTES バイトが届いたところで stop_if(先頭) を調べ、
+    真ならそこで読むのをやめる（バイナリのファイルを最後まで読まないため）。
+    """
+    deadline = time.monotonic() + max_seconds
+    # read1 は届いている分だけを返すので、少しずつ送ってくるサーバーでも時間の上限で止められる
+    # （urllib3 1.x には無いので iter_content を使う）
+    read1 = getattr(resp.raw, "read1", None)
+    if read1 is not None:
+        stream = iter(lambda: read1(_CHUNK, decode_content=True), b"")
+    else:
+        stream = resp.iter_content(_CHUNK)
+    chunks, size = [], 0
+    for chunk in stream:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes or time.monotonic() > deadline:
+            break
+        if stop_if is not None and size >= _SNIFF_BYTES:
+            if stop_if(b"".join(chunks)):
+                break
+            stop_if = None
+    return b"".join(chunks)[:max_bytes]
+
+
+def looks_binary(body: bytes) -> bool:
+    """先頭のバイト列から、HTMLではないファイル（PDF・画像・圧縮ファイルなど）かを判定する。"""
+    head = body[:_SNIFF_BYTES]
+    return head.startswith(_BINARY_MAGIC) or b"\x00" in head
+
+
+def detect_encoding(body: bytes, content_type: str = "") -> str:
+    """
+    HTMLの文字コードを決める。
+
+    BOM → Content-Type の charset → meta charset → UTF-8 として読めるか →
+    先頭 _DETECT_BYTES バイトからの推定、の順に調べる（全体の推定は大きいページで遅いので最後の手段）。
+    """
+    for bom, encoding in _BOMS:
+        if body.startswith(bom):
+            return encoding
+    for match in (_HEADER_CHARSET_RE.search(content_type), _META_CHARSET_RE.search(body[:_SNIFF_BYTES])):
+        if match:
+            encoding = match.group(1)
+            encoding = encoding.decode("ascii") if isinstance(encoding, bytes) else encoding
+            try:
+                return codecs.lookup(encoding).name
+            except LookupError:
+                pass
+    try:
+        # 途中で切った本文の末尾が文字の途中でもよいように、final=False で確かめる
+        codecs.getincrementaldecoder("utf-8")().decode(body, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    guess = chardet.detect(body[:_DETECT_BYTES])["encoding"]
+    return guess or "utf-8"
+
+
+def content_hash(html: str) -> str:
+    """HTMLの内容ハッシュ（前回から変わったかの判定用）。"""
+    return hashlib.sha1(html.encode("utf-8")).hexdigest()
+
+
+# 解析しない（中身ごと取り除く）タグ
+SKIP_TAGS = frozenset(["script", "style", "nav", "footer", "header"])
+# 本文として集めるタグ
+TEXT_TAGS = frozenset(["p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "td"])
+# 終了タグを持たない要素（BeautifulSoup の html.parser と同じ一覧）
+VOID_TAGS = frozenset([
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr", "image",
+    "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid", "param", "source",
+    "spacer", "track", "wbr",
+])
+
+
+class PageParser(HTMLParser):
+    """
+    HTMLを1回走査するだけで、タイトル・meta・本文・リンクをまとめて取り出す。
+
+    BeautifulSoup（html.parser）で木を作ってから何度も探す代わりに、開いているタグの
+    スタックだけを持つ。タグの入れ子の扱い（閉じ忘れたタグは親の終了タグで閉じる・
+    対応する開始タグの無い終了タグは無視する）は BeautifulSoup と同じにしてあるので、
+    入れ子になった li / p などの本文も同じように重複して集まる。
+    """
+
+    def __init__(self):
+        # 文字参照は BeautifulSoup と同じく handle_charref / handle_entityref で自前で戻す
+        super().__init__(convert_charrefs=False)
+        self.stack = []          # 開いているタグの (タグ名, 集めている本文の番号 or None)
+        self.skip_depth = 0      # スタック中の SKIP_TAGS の数（1以上なら中身を無視する）
+        self.template_depth = 0  # template の中の文字列は get_text に含まれないので数えない
+        self.texts = []          # TEXT_TAGS の要素ごとの文字列の断片（開始タグの順）
+        self.open_texts = []     # 開いている TEXT_TAGS の要素の番号
+        self.title = None        # 最初の title の文字列の断片
+        self.h1 = None           # 最初の h1 の文字列の断片
+        self._in_title = self._in_h1 = 0
+        self.meta = {}
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag in VOID_TAGS:
+            self._end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        self._end(tag)
+
+    def _start(self, tag, attrs):
+        if self.skip_depth or tag in SKIP_TAGS:
+            self.stack.append((tag, None))
+            self.skip_depth += tag in SKIP_TAGS
+            return
+        slot = None
+        self.template_depth += tag == "template"
+        if tag in TEXT_TAGS:
+            slot = len(self.texts)
+            self.texts.append([])
+            self.open_texts.append(slot)
+        self.stack.append((tag, slot))
+        if tag == "title" and self.title is None:
+            self.title = []
+            self._in_title = len(self.stack)
+        elif tag == "h1" and self.h1 is None:
+            self.h1 = []
+            self._in_h1 = len(self.stack)
+        elif tag == "meta" or tag == "a":
+            # 同じ属性が重複したら後の値を使い、値の無い属性は空文字列にする
+            values = {k: v if v is not None else "" for k, v in attrs}
+            if tag == "a":
+                if "href" in values:
+                    self.links.append(values["href"])
+            elif values.get("name") in ("description", "keywords"):
+                self.meta.setdefault(values["name"], values.get("content"))
+
+    def handle_endtag(self, tag):
+        self._end(tag)
+
+    def _end(self, tag):
+        # 同じ名前のタグが開いていれば、その内側で閉じ忘れたタグもまとめて閉じる
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                break
+        else:
+            return
+        while len(self.stack) > i:
+            name, slot = self.stack.pop()
+            if name in SKIP_TAGS:
+                self.skip_depth -= 1
+            elif name == "template" and not self.skip_depth:
+                self.template_depth -= 1
+            if slot is not None:
+                self.open_texts.remove(slot)
+            if self._in_title > len(self.stack):
+                self._in_title = 0
+            if self._in_h1 > len(self.stack):
+                self._in_h1 = 0
 
+    def handle_data(self, data):
+        if self.skip_depth or self.template_depth:
+            return
+        texts = self.texts
+        for slot in self.open_texts:
+            texts[slot].append(data)
+        if self._in_title:
+            self.title.append(data)
+        if self._in_h1:
+            self.h1.append(data)
 
+    def handle_charref(self, name):
+        self.handle_data(unescape(f"&#{name};"))
+
+    def handle_entityref(self, name):
+        # 知らない名前は "&name" のまま残す（BeautifulSoup と同じ）
+        self.handle_data(html5.get(name + ";", "&" + name))
+
+    def unknown_decl(self, data):
+        # <![CDATA[...]]> は本文として扱う（BeautifulSoup の get_text と同じ）
+        if data.startswith("CDATA["):
+            self.handle_data(data[6:])
+
+
+# 解析をプロセスプールで行う場合（bulk_crawler の parse_workers）、その分は子プロセス側で記録される
+@traced("parse")
 def parse_html(html: str, url: str) -> dict:
     """
-    HTMLを解析してページ情報を抽出する。
+    HTMLを解析してページ情報を抽出する（PageParser で1回だけ走査する）。
+
+    Args:
+        html: HTML文字列
+        url:  元URL
+
+    Returns:
+        抽出した情報の辞書（parse_html_bs4 と同じ形式・同じ値）
+    """
+    parser = PageParser()
+    parser.feed(html)
+    parser.close()
+
+    # ── タイトル ──
+    title = "No Title"
+    if parser.title is not None:
+        title = "".join(parser.title).strip()
+    elif parser.h1 is not None:
+        title = "".join(parser.h1).strip()
+
+    # ── meta description / keywords ──
+    description = (parser.meta.get("description") or "")[:200]
+    keywords = []
+    if parser.meta.get("keywords"):
+        keywords = [kw.strip() for kw in parser.meta["keywords"].split(",")][:10]
+
+    # ── 本文テキスト ──
+    full_text = " ".join("".join(parts).strip() for parts in parser.texts)
+    full_text = re.sub(r"\s+", " ", full_text).strip()
+
+    # ── リンク ──
+    links = []
+    for href in parser.links:
+        href = urljoin(url, href.strip())
+        if href.startswith("http"):
+            links.append(href)
+            if len(links) == 20:
+                break
+
+    return {
+        "url": url,
+        "title": title,
+        "description": description,
+        "keywords": keywords,
+        "full_text": full_text,
+        "links": links,
+        "word_count": count_words(full_text),
+        "crawled_at": datetime.now().isoformat(),
+        "crawl_status": "success",
+    }
+
+
+def parse_html_bs4(html: str, url: str) -> dict:
+    """
+    HTMLを解析してページ情報を抽出する（BeautifulSoup 版。parse_html の比較用）。
 
     Args:
         html: HTML文字列
@@ -75,10 +409,11 @@ def parse_html(html: str, url: str) -> dict:
     # full_text = re.sub(r"\\s+", " ", full_text).strip()
 
     # ── リンク ──
+    # 相対リンクは元URLを基準に絶対URLへ直す
     links = [
-        a["href"]
-        for a in soup.find_all("a", href=True)
-        if a["href"].startswith("http")
+        href
+        for href in (urljoin(url, a["href"].strip()) for a in soup.find_all("a", href=True))
+        if href.startswith("http")
     ][:20]
 
     return {
@@ -88,34 +423,48 @@ def parse_html(html: str, url: str) -> dict:
         "keywords": keywords,
         "full_text": full_text,
         "links": links,
-        "word_count": len(full_text.split()),
+        "word_count": count_words(full_text),
         "crawled_at": datetime.now().isoformat(),
         "crawl_status": "success",
     }
 
 
 # def crawl_url(url: str) -> dict:
-def crawl_url(url: str, verify_ssl: bool = True) -> dict:
+def crawl_url(url: str, verify_ssl: bool = True, session: Optional[requests.Session] = None) -> dict:
     """
     URLをクロールして情報を返す（fetch → parse のワンストップ）。
 
     Args:
-        url: クロール対象URL
+        url:     クロール対象URL
+        session: 使い回す requests.Session
 
     Returns:
         ページ情報の辞書（失敗時も crawl_status で判別可能）
     """
     # html = fetch_page(url)
-    html = fetch_page(url, verify_ssl=verify_ssl)
+    fetched = fetch_conditional(url, verify_ssl=verify_ssl, session=session)
+    return page_from_fetch(url, fetched)
+
+
+def page_from_fetch(url: str, fetched: dict) -> dict:
+    """
+    fetch_conditional の結果を解析してページ情報にする（crawl_url の解析部分）。
+
+    プロセスプールからも呼べるように、モジュールの関数として分けてある。
+
+    Returns:
+        ページ情報の辞書（失敗時も crawl_status で判別可能）
+    """
+    html = fetched["html"]
     if not html:
         return {
             "url": url,
             "crawl_status": "failed",
             "crawled_at": datetime.now().isoformat(),
-            "error": "Failed to fetch page",
+            "error": fetched.get("error") or "Failed to fetch page",
         }
     try:
-        return parse_html(html, url)
+        result = parse_html(html, url)
     except Exception as e:
         return {
             "url": url,
@@ -123,7 +472,11 @@ def crawl_url(url: str, verify_ssl: bool = True) -> dict:
             "crawled_at": datetime.now().isoformat(),
             "error": str(e),
         }
-
+    # 再クロール時の条件付きリクエスト・変更判定に使う
+    result["etag"] = fetched["etag"]
+    result["last_modified"] = fetched["last_modified"]
+    result["content_hash"] = content_hash(html)
+    return result
 
 
 #以下、Jsonに追加するコード#########
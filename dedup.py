@@ -0,0 +1,206 @@
+# ===================================================
+# dedup.py - 本文がほぼ同じページの検出（MinHash + LSH）
+# Week 4 / 性能改善
+# ===================================================
+import re
+import unicodedata
+from typing import Optional
+
+import numpy as np
+
+# 何文字ずつの並び（shingle）を特徴にするか
+SHINGLE = 5
+# MinHash の値の数。one permutation hashing（ハッシュ値の上位ビットで PERMS 個の組に分け、
+# 組ごとの最小値を取る）なので、1回ハッシュするだけで PERMS 個の最小値がそろう
+PERMS = 64
+# LSH: 先頭 BANDS * ROWS 個の値を ROWS 個ずつの帯に分け、帯が1つでも一致したページだけを比べる。
+# 類似度 0.8 のページは約98%、0.7 は約89%、0.5 は約40% の確率で候補になり、無関係なページはほぼならない
+BANDS = 8
+ROWS = 4
+# 名前などを差し替えただけのテンプレート流用ページは 0.7〜0.85 程度、無関係なページは 0.1 前後になる
+THRESHOLD = 0.7
+
+_SPACES_RE = re.compile(r"\s+")
+_BASE = np.uint64(1099511628211)
+_BIN_SHIFT = np.uint64(64 - 6)
+_EMPTY = np.uint32(0xFFFFFFFF)
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    # splitmix64 の仕上げ。近い値の shingle でもビットが偏らないようにかき混ぜる
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """正規化した text の SHINGLE 文字ずつの並びの64ビットハッシュ（重複なし）。"""
+    text = _SPACES_RE.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    n = max(len(codes) - SHINGLE + 1, 1 if len(codes) else 0)
+    # 多項式ハッシュを配列演算でまとめて計算する（uint64 の桁あふれはそのまま使う）
+    with np.errstate(over="ignore"):
+        h = np.zeros(n, dtype=np.uint64)
+        for j in range(min(SHINGLE, len(codes))):
+            h = h * _BASE + codes[j:j + n]
+        return np.unique(_mix(h))
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """
+    本文の MinHash（uint32 が PERMS 個）。2つのページで同じ位置の値が一致する割合は、
+    shingle の集合の Jaccard 係数の推定値になる。
+
+    Returns:
+        MinHash。本文が空なら None
+    """
+    hashes = shingle_hashes(text or "")
+    if len(hashes) == 0:
+        return None
+    signature = np.full(PERMS, _EMPTY, dtype=np.uint32)
+    np.minimum.at(signature, (hashes >> _BIN_SHIFT).astype(np.intp), hashes.astype(np.uint32))
+    empty = signature == _EMPTY
+    if empty.any():
+        # 値の入らなかった組は右隣（循環）の組の値を借りる（densification）。
+        # 借りた距離を足して、別の組から借りた値どうしが偶然一致しないようにする
+        filled = np.flatnonzero(~empty)
+        holes = np.flatnonzero(empty)
+        source = filled[np.searchsorted(filled, holes) % len(filled)]
+        with np.errstate(over="ignore"):
+            signature[holes] = signature[source] + ((source - holes) % PERMS).astype(np.uint32) * np.uint32(0x9E3779B9)
+    return signature
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """2つの MinHash から推定した Jaccard 係数。"""
+    return float(np.count_nonzero(a == b)) / PERMS
+
+
+def page_minhash(page: dict) -> Optional[np.ndarray]:
+    return minhash(page.get("full_text") or page.get("description") or "")
+
+
+class DuplicateIndex:
+    """
+    MinHash を帯ごとのバケットに入れて、似たページを全件と比べずに探す（LSH）。
+
+    登録・検索とも、帯の数だけ辞書を引き、同じバケットに入っていたページとだけ比べる。
+
+    Args:
+        threshold: 重複とみなす類似度（Jaccard 係数の推定値）の下限
+    """
+
+    def __init__(self, threshold: float = THRESHOLD):
+        self.threshold = threshold
+        self._buckets = [{} for _ in range(BANDS)]
+        self._signatures = {}
+
+    @classmethod
+    def build(cls, pages, keys, **options) -> "DuplicateIndex":
+        index = cls(**options)
+        for key, page in zip(keys, pages):
+            index.add(key, page_minhash(page))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    @staticmethod
+    def _bands(signature: np.ndarray):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS].tobytes()
+
+    def add(self, key, signature: Optional[np.ndarray]):
+        """key のページの MinHash を登録する（同じ key があれば置き換える）。"""
+        self.remove(key)
+        if signature is None:
+            return
+        self._signatures[key] = signature
+        for band, part in self._bands(signature):
+            self._buckets[band].setdefault(part, []).append(key)
+
+    def add_page(self, key, page: dict):
+        self.add(key, page_minhash(page))
+
+    def remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, part in self._bands(signature):
+            bucket = self._buckets[band][part]
+            bucket.remove(key)
+            if not bucket:
+                del self._buckets[band][part]
+
+    def find(self, signature: Optional[np.ndarray]) -> list:
+        """
+        signature との類似度が threshold 以上のページを探す。
+
+        Returns:
+            [(key, 類似度), ...]（似ている順）
+        """
+        if signature is None:
+            return []
+        found = {}
+        for band, part in self._bands(signature):
+            for key in self._buckets[band].get(part, ()):
+                if key not in found:
+                    found[key] = similarity(signature, self._signatures[key])
+        return sorted(((k, s) for k, s in found.items() if s >= self.threshold), key=lambda x: -x[1])
+
+    def find_page(self, page: dict) -> list:
+        return self.find(page_minhash(page))
+
+
+def filter_duplicates(pages: list, index: DuplicateIndex, get) -> tuple:
+    """
+    登録しようとしているページから、登録済みのページや同じ回の先のページとほぼ同じものを除く。
+
+    Args:
+        pages: 登録しようとしているページ
+        index: 登録済みページの DuplicateIndex（変更しない）
+        get:   index のキーからページを取り出す関数（PageStore.get など）
+
+    Returns:
+        (残したページのリスト, [(除いたページ, 似ているページ, 類似度), ...])
+    """
+    kept, skipped = [], []
+    batch = DuplicateIndex(index.threshold)
+    for page in pages:
+        signature = page_minhash(page)
+        match = None
+        for key, score in index.find(signature):
+            # 似ているページがストアから消えていたら（削除直後など）、それとは重複とみなさない
+            original = get(key)
+            if original is not None:
+                match = (page, original, score)
+                break
+        if match is not None:
+            skipped.append(match)
+            continue
+        found = batch.find(signature)
+        if found:
+            key, score = found[0]
+            skipped.append((page, kept[key], score))
+            continue
+        batch.add(len(kept), signature)
+        kept.append(page)
+    return kept, skipped
+
+
+#テストコード#######
+if __name__ == "__main__":
+    import json
+    import time
+    from pathlib import Path
+
+    pages = json.loads(Path("data/pages.json").read_text(encoding="utf-8"))
+    start = time.perf_counter()
+    index = DuplicateIndex.build(pages, range(len(pages)))
+    print(f"🧬 {len(index)}件 {(time.perf_counter() - start) * 1000:.1f}ms")
+    for i, page in enumerate(pages):
+        near = [(pages[k]["title"][:20], s) for k, s in index.find_page(page) if k != i]
+        if near:
+            print(f"- {page['title'][:20]} ≒ {near}")
+    clone = dict(pages[0], url=pages[0]["url"] + "/", full_text=pages[0]["full_text"] + " 更新")
+    print("末尾だけ違うページ:", index.find_page(clone)[:1])
@@ -0,0 +1,209 @@
+# ===================================================
+# facets.py - カテゴリ・作成者・作成日などでの絞り込みと件数集計（ビットマップ）
+# Week 4 / 性能改善
+# ===================================================
+from itertools import compress
+
+import numpy as np
+
+from corpus import column
+
+# 絞り込みに使う項目と表示名（month は created_at の先頭7文字 = 年月）
+FIELDS = {
+    "category": "カテゴリ",
+    "author": "作成者",
+    "crawl_status": "取得方法",
+    "month": "作成月",
+}
+
+_ONE = np.uint64(1)
+_SIX = np.uint64(6)
+_LOW = np.uint64(63)
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    # NumPy 2.0 より前は、8ビットごとの表を引いて足す
+    _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        bytes_ = _POPCOUNT8[words.view(np.uint8)]
+        return bytes_.reshape(*words.shape, 8).sum(axis=-1, dtype=np.uint64)
+
+
+def _values(pages, field: str) -> list:
+    if field == "month":
+        return [(v or "")[:7] for v in column(pages, "created_at")]
+    return [v or "" for v in column(pages, field)]
+
+
+class FacetIndex:
+    """
+    ページ番号（pages の並び順）のビットマップで、項目の値ごとの絞り込みと件数集計を行う。
+
+    値ごとに「その値を持つページのビットが立った uint64 配列」を作っておき、
+    絞り込みはビットマップの AND / OR、件数は AND を取ってからのビット数（popcount）で数える。
+    どちらもページ数 / 64 語の配列演算なので、ページの dict を1件ずつ見ることはない。
+    作成日の範囲は、日付順に並べたページ番号から二分探索で切り出す。
+
+    Args:
+        pages: ページリスト（list of dict / Corpus）
+    """
+
+    def __init__(self, pages):
+        self.ids = np.asarray([-1 if i is None else i for i in column(pages, "id")], dtype=np.int64)
+        self.n_docs = len(self.ids)
+        self.n_words = (self.n_docs + 63) // 64
+        self._id_order = np.argsort(self.ids, kind="stable")
+        self._sorted_ids = self.ids[self._id_order]
+        self.all = self.from_positions(np.arange(self.n_docs))
+
+        self.values = {}     # 項目 → 値のリスト（ページ数の多い順）
+        self._bitmaps = {}   # 項目 → 値ごとのビットマップを並べた (値の数, 語数) の配列
+        positions = np.arange(self.n_docs, dtype=np.uint64)
+        for field in FIELDS:
+            codes = {}
+            raw = np.fromiter((codes.setdefault(v, len(codes)) for v in _values(pages, field)),
+                              np.int64, self.n_docs)
+            order = np.argsort(-np.bincount(raw, minlength=len(codes)), kind="stable")
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            matrix = np.zeros((len(codes), self.n_words), dtype=np.uint64)
+            np.bitwise_or.at(matrix, (rank[raw], (positions >> _SIX).astype(np.intp)), _ONE << (positions & _LOW))
+            names = list(codes)
+            self.values[field] = [names[i] for i in order]
+            self._bitmaps[field] = matrix
+
+        dates = np.array([(v or "")[:10] for v in column(pages, "created_at")], dtype=str)
+        self._date_order = np.argsort(dates, kind="stable")
+        self._dates = dates[self._date_order]
+        known = self._dates[self._dates != ""]
+        self.date_range = (str(known[0]), str(known[-1])) if len(known) else (None, None)
+
+    # ── ビットマップ ──
+    def from_positions(self, positions) -> np.ndarray:
+        bitmap = np.zeros(self.n_words, dtype=np.uint64)
+        positions = np.asarray(positions, dtype=np.uint64)
+        np.bitwise_or.at(bitmap, (positions >> _SIX).astype(np.intp), _ONE << (positions & _LOW))
+        return bitmap
+
+    def from_ids(self, ids) -> np.ndarray:
+        """ページ id の集合のビットマップ（このページ集合に無い id は除く）。"""
+        positions = self.positions_of(ids)
+        return self.from_positions(positions[positions >= 0])
+
+    def to_mask(self, bitmap: np.ndarray) -> np.ndarray:
+        """ビットマップをページ番号ごとの bool 配列にする。"""
+        bits = np.unpackbits(bitmap.view(np.uint8), bitorder="little")
+        return bits[:self.n_docs].astype(bool)
+
+    @staticmethod
+    def count(bitmap: np.ndarray) -> int:
+        return int(_popcount(bitmap).sum())
+
+    def positions_of(self, ids) -> np.ndarray:
+        """ページ id からページ番号を引く（見つからない id は -1）。"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not self.n_docs:
+            return np.full(len(ids), -1, dtype=np.int64)
+        at = np.minimum(np.searchsorted(self._sorted_ids, ids), self.n_docs - 1)
+        return np.where(self._sorted_ids[at] == ids, self._id_order[at], -1)
+
+    # ── 絞り込み・集計 ──
+    def select(self, filters: dict = None, date_from: str = None, date_to: str = None) -> "Filter":
+        """
+        条件に合うページの集合を作る。
+
+        Args:
+            filters:   {項目: [値, ...]}（同じ項目の値は OR、項目どうしは AND。空なら絞り込まない）
+            date_from: 作成日の下限（"YYYY-MM-DD"。None なら下限なし）
+            date_to:   作成日の上限（同上・その日を含む）
+        """
+        bitmap = self.all.copy()
+        key = []
+        for field, selected in sorted((filters or {}).items()):
+            if not selected:
+                continue
+            index = {v: i for i, v in enumerate(self.values[field])}
+            rows = [index[v] for v in selected if v in index]
+            bitmap &= np.bitwise_or.reduce(self._bitmaps[field][rows], axis=0) if rows else 0
+            key.append((field, tuple(sorted(selected))))
+        if date_from or date_to:
+            lo = np.searchsorted(self._dates, date_from) if date_from else np.searchsorted(self._dates, "", "right")
+            hi = np.searchsorted(self._dates, date_to, "right") if date_to else self.n_docs
+            bitmap &= self.from_positions(self._date_order[lo:hi])
+            key.append(("created_at", str(date_from or ""), str(date_to or "")))
+        return Filter(self, bitmap, tuple(key))
+
+    def counts(self, bitmap: np.ndarray) -> dict:
+        """
+        ビットマップのページについて、項目ごとに値ごとのページ数を数える。
+
+        Returns:
+            {項目: [(値, ページ数), ...]}（ページ数の多い順。0件の値は除く）
+        """
+        found = {}
+        for field, matrix in self._bitmaps.items():
+            n = _popcount(matrix & bitmap).sum(axis=1)
+            order = np.argsort(-n, kind="stable")
+            found[field] = [(self.values[field][i], int(n[i])) for i in order if n[i]]
+        return found
+
+
+class Filter:
+    """
+    FacetIndex.select で作った絞り込み条件。検索エンジンの search_page(where=...) に渡す。
+
+    Attributes:
+        facets: 元の FacetIndex
+        bitmap: 条件に合うページのビットマップ
+        key:    条件を表すタプル（結果キャッシュのキーに使う。絞り込みなしなら空）
+    """
+
+    def __init__(self, facets: FacetIndex, bitmap: np.ndarray, key: tuple = ()):
+        self.facets = facets
+        self.bitmap = bitmap
+        self.key = key
+        self._mask = facets.to_mask(bitmap)
+
+    def __len__(self) -> int:
+        return self.facets.count(self.bitmap)
+
+    def keep(self, positions) -> np.ndarray:
+        """ページ番号のうち条件に合うものの印。"""
+        positions = np.asarray(positions, dtype=np.int64)
+        keep = np.zeros(len(positions), dtype=bool)
+        inside = (positions >= 0) & (positions < len(self._mask))
+        keep[inside] = self._mask[positions[inside]]
+        return keep
+
+    def filter(self, hits: list, get, by_id: bool = False) -> tuple:
+        """
+        検索のヒットのうち条件に合うものだけを残す。
+
+        Args:
+            hits:  ヒットのリスト（並び順は保つ）
+            get:   ヒットからページ番号（by_id なら ページ id）を取り出す関数
+            by_id: get がページ id を返すか
+
+        Returns:
+            (残したヒットのリスト, 残したヒットのページ id の配列)
+        """
+        keys = np.fromiter(map(get, hits), np.int64, len(hits))
+        positions = self.facets.positions_of(keys) if by_id else keys
+        keep = self.keep(positions)
+        return list(compress(hits, keep)), self.facets.ids[positions[keep]]
+
+
+#テストコード#######
+if __name__ == "__main__":
+    import json
+    import time
+    from pathlib import Path
+
+    pages = json.loads(Path("data/pages.json").read_text(encoding="utf-8"))
+    start = time.perf_counter()
+    facets = FacetIndex(pages)
+    print(f"🧮 {(time.perf_counter() - start) * 1000:.2f}ms", facets.date_range)
+    where = facets.select({"category": ["自己紹介"]}, date_from="2024-01-01")
+    print(f"絞り込み: {len(where)}件", facets.counts(where.bitmap)["author"][:3])
@@ -0,0 +1,174 @@
+# ===================================================
+# frontier.py - リンクをたどる巡回クロールモジュール
+# Week 4 / 性能改善
+# ===================================================
+import heapq
+from typing import Callable, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from bulk_crawler import crawl_urls, make_session
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    重複判定用にURLを正規化する。
+
+    スキーム・ホストの小文字化、既定ポートの除去、フラグメントの除去、
+    クエリパラメータの並べ替えを行う。
+    サーバーによっては別のURLになりうるので、結果は重複判定のキーにだけ使い、取得には元のURLを使う。
+    ポート番号が不正なURLなどは、前後の空白を除いただけのものを返す。
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:   # "http://e.com:abc/"・"http://[::1/" など
+        return url
+    scheme = parts.scheme.lower()
+    # hostname は IPv6 の [] とユーザー情報を落とすので、netloc からホストの部分だけを小文字にする
+    userinfo, _, host = parts.netloc.rpartition("@")
+    host = host[:host.find("]") + 1] if host.startswith("[") else host.partition(":")[0]
+    netloc = host.lower()
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    if userinfo:
+        netloc = f"{userinfo}@{netloc}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+def site_of(url: str) -> str:
+    """同一サイト判定に使うホスト名（www. は無視する）。"""
+    try:
+        host = (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+class CrawlFrontier:
+    """
+    これからクロールするURLの優先度付きキュー。
+
+    浅い階層のURLから順に取り出す。一度キューに入れたURL・登録済みのURLは
+    正規化したURLの集合で O(1) に弾く（取り出すのは正規化する前の元のURL）。
+
+    Args:
+        seeds:      起点URLのリスト
+        max_depth:  起点から何リンク先までたどるか
+        per_domain: 1サイトあたりの最大取得ページ数
+        same_site:  起点と同じサイトのリンクだけをたどるか
+        known:      登録済みURL（正規化済み）の集合
+    """
+
+    def __init__(self, seeds: list, max_depth: int = 1, per_domain: int = 20,
+                 same_site: bool = True, known: Optional[set] = None):
+        self.max_depth = max_depth
+        self.per_domain = per_domain
+        self.same_site = same_site
+        self.seen = set(known or ())
+        self.seed_sites = {site_of(u) for u in seeds}
+        self.taken = {}
+        self._heap = []
+        self._seq = 0
+        for url in seeds:
+            self.add(url, 0)
+
+    def add(self, url: str, depth: int) -> bool:
+        """URLをキューに入れる。入れなかった場合は False。"""
+        if depth > self.max_depth or not url.startswith(("http://", "https://")):
+            return False
+        if self.same_site and site_of(url) not in self.seed_sites:
+            return False
+        try:
+            urlsplit(url).port
+        except ValueError:   # ポート番号が不正なリンクは取得できないので入れない
+            return False
+        key = normalize_url(url)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        # 正規化したURLは重複判定だけに使い、取得はページに書かれていたURLのまま行う
+        heapq.heappush(self._heap, (depth, self._seq, url.strip()))
+        self._seq += 1
+        return True
+
+    def pop(self, n: int) -> list:
+        """
+        次にクロールする (URL, 深さ) を最大 n 件取り出す。
+
+        サイトごとの上限に達したURLは捨てる。
+        """
+        batch = []
+        while self._heap and len(batch) < n:
+            depth, _, url = heapq.heappop(self._heap)
+            site = site_of(url)
+            if self.taken.get(site, 0) >= self.per_domain:
+                continue
+            self.taken[site] = self.taken.get(site, 0) + 1
+            batch.append((url, depth))
+        return batch
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+def crawl_site(seeds: list, max_depth: int = 1, max_pages: int = 50, per_domain: int = 20,
+               same_site: bool = True, known: Optional[set] = None, verify_ssl: bool = True,
+               batch_size: int = 16, progress: Optional[Callable[[int, int], None]] = None) -> list:
+    """
+    起点URLからリンクをたどってクロールする。
+
+    Args:
+        seeds:      起点URLのリスト
+        max_depth:  起点から何リンク先までたどるか
+        max_pages:  取得する最大ページ数（全体）
+        per_domain: 1サイトあたりの最大取得ページ数
+        same_site:  起点と同じサイトのリンクだけをたどるか
+        known:      登録済みURL（正規化済み）の集合。これらは取得しない
+        verify_ssl: SSL証明書を検証するか
+        batch_size: 1回にまとめて並列取得するURL数
+        progress:   progress(取得件数, max_pages) を呼ぶコールバック
+
+    Returns:
+        取得に成功したページ情報のリスト（depth 付き）
+    """
+    frontier = CrawlFrontier(seeds, max_depth, per_domain, same_site, known)
+    session = make_session(batch_size)
+    fetched = 0
+    pages = []
+    try:
+        while len(frontier) and fetched < max_pages:
+            batch = frontier.pop(min(batch_size, max_pages - fetched))
+            if not batch:
+                break
+            results = crawl_urls([url for url, _ in batch], verify_ssl=verify_ssl,
+                                 max_workers=batch_size, session=session)
+            fetched += len(batch)
+            for (url, depth), r in zip(batch, results):
+                if r.get("crawl_status") != "success":
+                    continue
+                r["depth"] = depth
+                pages.append(r)
+                for link in r.get("links", []):
+                    frontier.add(link, depth + 1)
+            if progress:
+                progress(fetched, max_pages)
+    finally:
+        session.close()
+    return pages
+
+
+# ─── テスト ───
+if __name__ == "__main__":
+    print(normalize_url("HTTPS://Example.COM:443/a?b=2&a=1#top"))
+    # ポート番号が不正なリンクがあっても止まらない
+    assert normalize_url(" http://e.com:abc/ ") == "http://e.com:abc/"
+    assert normalize_url("http://e.com:99999/") == "http://e.com:99999/"
+    frontier = CrawlFrontier(["https://example.com/?q"])
+    assert not frontier.add("https://example.com:abc/", 1)
+    assert frontier.pop(1) == [("https://example.com/?q", 0)]
+    for r in crawl_site(["https://example.com"], max_depth=1, max_pages=5, same_site=False):
+        print(r["depth"], r["url"], r["title"])
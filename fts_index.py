@@ -0,0 +1,159 @@
+# ===================================================
+# fts_index.py - SQLite FTS5 全文検索モジュール
+# Week 4 / 性能改善
+# ===================================================
+import json
+from operator import itemgetter
+
+from page_store import PageStore
+from search_fulltext import _make_preview
+
+
+def _columns(data: str) -> str:
+    # pages.data（JSON）から FTS5 の各列に入れる値を取り出すSQL式
+    return f"""
+        coalesce(json_extract({data}, '$.title'), ''),
+        coalesce(json_extract({data}, '$.description'), ''),
+        coalesce(json_extract({data}, '$.full_text'), ''),
+        coalesce((SELECT group_concat(value, ' ') FROM json_each({data}, '$.keywords')), '')"""
+
+
+# trigram トークナイザなら形態素解析なしで日本語の部分一致ができる
+_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    title, description, full_text, keywords,
+    tokenize = 'trigram'
+);
+CREATE TRIGGER IF NOT EXISTS pages_fts_insert AFTER INSERT ON pages BEGIN
+    INSERT INTO pages_fts(rowid, title, description, full_text, keywords)
+    VALUES (new.id, {_columns("new.data")});
+END;
+CREATE TRIGGER IF NOT EXISTS pages_fts_update AFTER UPDATE ON pages BEGIN
+    DELETE FROM pages_fts WHERE rowid = old.id;
+    INSERT INTO pages_fts(rowid, title, description, full_text, keywords)
+    VALUES (new.id, {_columns("new.data")});
+END;
+CREATE TRIGGER IF NOT EXISTS pages_fts_delete AFTER DELETE ON pages BEGIN
+    DELETE FROM pages_fts WHERE rowid = old.id;
+END;
+"""
+
+# bm25() に渡す列ごとの重み（title, description, full_text, keywords の順）
+WEIGHTS = (3.0, 1.5, 1.0, 2.0)
+
+# 全列をつないだテキスト中の出現回数（match_count）を数えるSQL式
+_TEXT = "lower(f.title || ' ' || f.description || ' ' || f.full_text || ' ' || f.keywords)"
+_COUNT = f"(length({_TEXT}) - length(replace({_TEXT}, :q, ''))) / length(:q)"
+
+
+class FtsIndex:
+    """
+    PageStore と同じ SQLite ファイルに FTS5 の全文検索テーブルを作る検索エンジン。
+
+    pages テーブルへの書き込みはトリガーで FTS5 側にも反映されるので、
+    インデックスの作り直しは要らない。ディスク上のインデックスを直接引くので、
+    コーパス全体をメモリに載せる必要がなく、起動もすぐ終わる。
+
+    Args:
+        store: 対象の PageStore
+    """
+
+    def __init__(self, store: PageStore):
+        self.store = store
+        conn = store._conn()
+        conn.executescript(_SCHEMA)
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'fts_synced'").fetchone():
+            return
+        # 初回だけ、トリガーを作る前に登録されていたページを取り込む
+        with store._write() as conn:
+            conn.execute(
+                "INSERT INTO pages_fts(rowid, title, description, full_text, keywords) "
+                f"SELECT id, {_columns('data')} FROM pages "
+                "WHERE id NOT IN (SELECT rowid FROM pages_fts)"
+            )
+            conn.execute("INSERT INTO meta(key, value) VALUES ('fts_synced', 1)")
+
+    def search(self, query: str, limit: int = None, offset: int = 0) -> list:
+        return self.search_page(query, limit, offset)["results"]
+
+    def search_page(self, query: str, limit: int = 10, offset: int = 0, where=None) -> dict:
+        """
+        検索結果のうち offset 件目から limit 件だけを返す。
+
+        3文字以上のクエリは FTS5 の MATCH と bm25() で関連度順に並べ、snippet() でプレビューを作る。
+        trigram では2文字以下を MATCH できないので、その場合は全件を照合してマッチ数順に並べる。
+
+        Args:
+            where: facets.Filter（指定すると条件に合うページだけにし、結果に全ヒットのページ id "ids" を付ける）
+
+        Returns:
+            {"total": ヒット総数, "results": 表示範囲のページのリスト}
+        """
+        q = " ".join(query.split()).lower()
+        if not q:
+            return {"total": 0, "results": []}
+        conn = self.store._conn()
+        params = {"q": q, "limit": -1 if limit is None else limit, "offset": offset}
+
+        if len(q) >= 3:
+            # クエリ全体を1つのフレーズとして探す（search_fulltext と同じく連続一致）
+            params["match"] = '"' + q.replace('"', '""') + '"'
+            cond = "pages_fts MATCH :match"
+            score = f"-bm25(pages_fts, {', '.join(map(str, WEIGHTS))})"
+            snippet = "snippet(pages_fts, -1, '**', '**', '...', 32)"
+            order = "score DESC"
+        else:
+            cond = f"instr({_TEXT}, :q) > 0"
+            score = _COUNT
+            snippet = "NULL"
+            order = "score DESC, f.rowid"
+
+        found = {}
+        if where is None:
+            total = conn.execute(f"SELECT COUNT(*) FROM pages_fts AS f WHERE {cond}", params).fetchone()[0]
+        else:
+            # 順位だけを SQL で求めて絞り込み、表示する範囲のページだけを読み出す
+            ranked = conn.execute(
+                f"SELECT f.rowid, {score} AS score FROM pages_fts AS f WHERE {cond} ORDER BY {order}", params
+            ).fetchall()
+            ranked, found["ids"] = where.filter(ranked, itemgetter(0), by_id=True)
+            total = len(ranked)
+            end = total if limit is None else offset + limit
+            params.update(ids=json.dumps([rowid for rowid, _ in ranked[offset:end]]), limit=-1, offset=0)
+            cond += " AND f.rowid IN (SELECT value FROM json_each(:ids))"
+
+        rows = conn.execute(
+            f"""
+            SELECT p.data, {score} AS score, {_COUNT}, {snippet}
+            FROM pages_fts AS f JOIN pages AS p ON p.id = f.rowid
+            WHERE {cond}
+            ORDER BY {order}
+            LIMIT :limit OFFSET :offset
+            """,
+            params,
+        ).fetchall()
+
+        results = []
+        for data, score, count, preview in rows:
+            r = json.loads(data)
+            r["score"] = round(score, 3)
+            r["match_count"] = count
+            r["preview"] = preview or _make_preview(r.get("full_text", r.get("description", "")), q)
+            results.append(r)
+        return {"total": total, "results": results, **found}
+
+
+#テストコード#######
+if __name__ == "__main__":
+    store = PageStore("data/pages.db")
+    index = FtsIndex(store)
+
+    query = "製造業"
+    found = index.search_page(query, limit=3)
+    print(f"🔎 Query: {query}")
+    print(f"📄 Hit件数: {found['total']}")
+    for r in found["results"]:
+        print("-" * 40)
+        print("Title:", r.get("title"))
+        print("Score:", r.get("score"), "Match:", r.get("match_count"))
+        print("Preview:", r.get("preview"))
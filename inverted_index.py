@@ -0,0 +1,519 @@
+# ===================================================
+# inverted_index.py - 転置インデックスモジュール（Level 3）
+# Week 4 / 性能改善
+# ===================================================
+import json
+from bisect import bisect_left
+from operator import itemgetter
+from pathlib import Path
+
+from corpus import column
+from query_parser import ATTR_FIELDS, parse_query, positive_terms
+from search_fulltext import _make_preview, _to_result, top_hits
+from snippet import make_snippet
+from term_dict import TermDictionary
+from tokenizer import is_word, normalize, tokenize, tokenize_query, tokenize_with_offsets
+from tracing import span
+
+INDEX_VERSION = 4
+FIELDS = ("title", "description", "full_text", "keywords")
+# プレビューの窓を選ぶときに見るマッチ箇所の数（本文が長くても作成時間が増えないように）
+SNIPPET_SPANS = 32
+
+
+def _field_text(page: dict, field: str) -> str:
+    if field == "keywords":
+        return " ".join(page.get("keywords", []))
+    return page.get(field) or ""
+
+
+def _field_texts(pages, field: str) -> list:
+    """全ページの1フィールドのテキスト（Corpus なら dict を作らずに列から取り出す）。"""
+    values = column(pages, field)
+    if field == "keywords":
+        return [" ".join(v or []) for v in values]
+    return [v or "" for v in values]
+
+
+class InvertedIndex:
+    """
+    pages.json から作る転置インデックス。
+
+    postings は「トークン → {ページ番号: {フィールド: [出現位置, ...]}}」の形で、
+    クエリに含まれるトークンを持つページだけを調べる。
+    offsets には full_text の各トークンの文字位置を持っておき、プレビューを作るときに
+    本文を検索し直さずにマッチ箇所を特定する。
+    """
+
+    def __init__(self, pages: list, postings: dict = None, offsets: list = None):
+        self.pages = pages
+        self.postings = postings if postings is not None else {}
+        self.offsets = offsets if offsets is not None else [[] for _ in pages]
+        # 検索時に必要になった分だけ作るキャッシュ
+        self._id_lists = {}   # トークン → 出現ページ番号の昇順リスト
+        self._attrs = {}      # category / author → {正規化した値: ページ番号のリスト}
+        self._term_dict = None
+
+    @classmethod
+    def build(cls, pages: list) -> "InvertedIndex":
+        """ページリストからインデックスを作る。"""
+        index = cls(pages)
+        for doc_id, page in enumerate(pages):
+            index._add(doc_id, page)
+        return index
+
+    def append(self, page: dict) -> int:
+        """
+        ページを1件追加する（pages が list のとき）。
+
+        Returns:
+            追加したページのページ番号
+        """
+        doc_id = len(self.pages)
+        self.pages.append(page)
+        self.offsets.append([])
+        self._add(doc_id, page)
+        # 検索時のキャッシュは追加したページを含まないので捨てる
+        self._id_lists.clear()
+        self._attrs.clear()
+        self._term_dict = None
+        return doc_id
+
+    def _add(self, doc_id: int, page: dict):
+        postings = self.postings
+        for field in FIELDS:
+            text = _field_text(page, field)
+            if field == "full_text":
+                terms, self.offsets[doc_id] = tokenize_with_offsets(text)
+            else:
+                terms = tokenize(text)
+            for pos, term in enumerate(terms):
+                docs = postings.get(term)
+                if docs is None:
+                    docs = postings[term] = {}
+                fields = docs.get(doc_id)
+                if fields is None:
+                    fields = docs[doc_id] = {}
+                fields.setdefault(field, []).append(pos)
+
+    def search(self, query: str, limit: int = None, offset: int = 0) -> list:
+        """
+        全文検索を実行し、マッチ数でスコアリングする。
+
+        search_fulltext と同じ形式（match_count / preview 付きのページ）を返す。
+        各語は同じフィールド内で連続して出現した回数を数え、AND / OR でマッチした語の回数を合計する。
+
+        Args:
+            query:  検索キーワード
+            limit:  取得件数（None なら全件）
+            offset: 先頭から読み飛ばす件数
+
+        Returns:
+            マッチしたページのリスト（スコア降順）
+        """
+        return self.search_page(query, limit, offset)["results"]
+
+    def search_page(self, query: str, limit: int = 10, offset: int = 0, where=None) -> dict:
+        """
+        検索結果のうち offset 件目から limit 件だけを返す。
+
+        クエリは query_parser の構文で解釈する（空白区切りは AND、OR / NOT、"フレーズ"、title: などのフィールド指定）。
+
+        Args:
+            where: facets.Filter（指定すると条件に合うページだけにし、結果に全ヒットのページ id "ids" を付ける）
+
+        Returns:
+            {"total": ヒット総数, "results": 表示範囲のページのリスト}
+        """
+        hits, leaves, expanded = self._match(query)
+        if where is not None:
+            hits, ids = where.filter(hits, itemgetter(1))
+        results = [
+            _to_result(self.pages[doc_id], count, query, self._preview(doc_id, query, leaves))
+            for count, doc_id in top_hits(hits, limit, offset)
+        ]
+        found = {"total": len(hits), "results": results}
+        if expanded:
+            found["expanded"] = expanded
+        if where is not None:
+            found["ids"] = ids
+        return found
+
+    def _match(self, query: str) -> tuple:
+        """
+        クエリにマッチしたページを探す。
+
+        辞書に無い英単語は、前方一致か綴りの近い語の OR に置き換えてから検索する。
+
+        Returns:
+            (ページ番号順の (マッチ数, ページ番号) のリスト,
+             ハイライトに使う語の (文字列, トークン, 各トークンの postings) のリスト,
+             置き換えた語の {元の語: [置き換え先, ...]})
+        """
+        node = parse_query(query)
+        if node is None:
+            return [], [], {}
+        expanded = {}
+        node = expand_terms(node, self.postings.__contains__, lambda: self.term_dict, expanded)
+        hits, leaves = self._match_node(node)
+        return hits, leaves, expanded
+
+    def _match_node(self, node: tuple) -> tuple:
+        """構文木（語の置き換え済み）にマッチしたページと、ハイライトに使う語を求める。"""
+        plan = {}
+        matched = self._eval(node, None, plan)
+        hits = [(count, doc_id) for doc_id, count in matched.items()]
+
+        leaves = []
+        for _, field, text in positive_terms(node):
+            slots = self._slots(text, plan) if field in (None, "full_text") else None
+            if slots is not None:
+                leaves.append((text, slots[0], slots[1]))
+        return hits, leaves
+
+    @property
+    def term_dict(self) -> TermDictionary:
+        """語彙辞書（前方一致・タイプミス補正用）。初めて使うときに作る。"""
+        if self._term_dict is None:
+            self._term_dict = TermDictionary.from_postings(self.postings)
+        return self._term_dict
+
+    def _eval(self, node: tuple, candidates, plan: dict) -> dict:
+        """
+        構文木 node にマッチしたページを {ページ番号: マッチ数}（ページ番号順）で返す。
+
+        Args:
+            node:       query_parser.parse_query の構文木
+            candidates: 調べるページ番号の昇順リスト（None なら全ページ）
+            plan:       1回の検索の中で語ごとの postings を使い回すための辞書
+        """
+        kind = node[0]
+        if kind == "term":
+            return self._eval_term(node[1], node[2], candidates, plan)
+
+        if kind == "or":
+            merged = {}
+            for child in node[1]:
+                for doc_id, count in self._eval(child, candidates, plan).items():
+                    merged[doc_id] = merged.get(doc_id, 0) + count
+            return dict(sorted(merged.items()))
+
+        if kind == "not":
+            excluded = self._eval(node[1], candidates, plan)
+            universe = candidates if candidates is not None else range(len(self.pages))
+            return {doc_id: 0 for doc_id in universe if doc_id not in excluded}
+
+        # AND: ヒットが少なそうな子から評価し、それまでの結果の中だけを次の子で調べる
+        positives = sorted((c for c in node[1] if c[0] != "not"), key=lambda c: self._estimate(c, plan))
+        result = None
+        for child in positives:
+            found = self._eval(child, candidates, plan)
+            result = found if result is None else {d: result[d] + c for d, c in found.items()}
+            if not result:
+                return {}
+            candidates = list(result)
+        if result is None:
+            result = dict.fromkeys(candidates if candidates is not None else range(len(self.pages)), 0)
+
+        for child in node[1]:
+            if child[0] == "not" and result:
+                excluded = self._eval(child[1], list(result), plan)
+                result = {d: c for d, c in result.items() if d not in excluded}
+        return result
+
+    def _eval_term(self, field, text: str, candidates, plan: dict) -> dict:
+        if field in ATTR_FIELDS:
+            ids = self._attr_ids(field, text)
+            if candidates is not None:
+                ids = intersect(candidates, ids)
+            return dict.fromkeys(ids, 1)
+
+        slots = self._slots(text, plan)
+        if slots is None:
+            return {}
+        _, postings, id_lists = slots
+        # 出現ページ数が少ないトークンから順に、ページ番号のリストを突き合わせる
+        ids = candidates
+        for doc_ids in sorted(id_lists, key=len):
+            ids = doc_ids if ids is None else intersect(ids, doc_ids)
+            if not ids:
+                return {}
+
+        found = {}
+        for doc_id in ids:
+            count = _phrase_count(postings, doc_id, field)
+            if count > 0:
+                found[doc_id] = count
+        return found
+
+    def _estimate(self, node: tuple, plan: dict) -> int:
+        """node にマッチするページ数の上限の見積もり（AND の評価順を決めるのに使う）。"""
+        kind = node[0]
+        if kind == "term":
+            if node[1] in ATTR_FIELDS:
+                return len(self._attr_ids(node[1], node[2]))
+            slots = self._slots(node[2], plan)
+            return min(map(len, slots[2])) if slots else 0
+        if kind == "and":
+            return min(self._estimate(c, plan) for c in node[1])
+        if kind == "or":
+            return sum(self._estimate(c, plan) for c in node[1])
+        return len(self.pages)
+
+    def _slots(self, text: str, plan: dict):
+        """
+        text の各トークン（スロット）の postings と、出現ページ番号の昇順リストを集める。
+
+        Returns:
+            (トークンのリスト, postings のリスト, ページ番号リストのリスト)。
+            インデックスに無いトークンを含む場合は None
+        """
+        if text in plan:
+            return plan[text]
+        terms, postings, id_lists = [], [], []
+        for term, prefix in tokenize_query(text):
+            if prefix:
+                docs = self._prefix_postings(term)
+                doc_ids = sorted(docs)
+            else:
+                docs = self.postings.get(term)
+                doc_ids = self._doc_ids(term, docs)
+            if not docs:
+                plan[text] = None
+                return None
+            terms.append(term)
+            postings.append(docs)
+            id_lists.append(doc_ids)
+        plan[text] = (terms, postings, id_lists) if terms else None
+        return plan[text]
+
+    def _doc_ids(self, term: str, docs: dict) -> list:
+        # postings の dict はページ番号順に作られているので、キーの並びがそのまま昇順リストになる
+        if not docs:
+            return []
+        doc_ids = self._id_lists.get(term)
+        if doc_ids is None:
+            doc_ids = self._id_lists[term] = list(docs)
+        return doc_ids
+
+    def _attr_ids(self, field: str, text: str) -> list:
+        """category / author の値に text を含むページ番号の昇順リスト。"""
+        values = self._attrs.get(field)
+        if values is None:
+            values = {}
+            for doc_id, value in enumerate(column(self.pages, field)):
+                values.setdefault(normalize(str(value or "")), []).append(doc_id)
+            self._attrs[field] = values
+        text = normalize(text)
+        matched = [ids for value, ids in values.items() if text in value]
+        if len(matched) == 1:
+            return matched[0]
+        return sorted(d for ids in matched for d in ids)
+
+    def _preview(self, doc_id: int, query: str, leaves: list) -> str:
+        """検索時に求めた出現位置から full_text のプレビューを作る。"""
+        page = self.pages[doc_id]
+        if "full_text" not in page:
+            return _make_preview(page.get("description", ""), leaves[0][0] if leaves else query)
+
+        # description だけのページは _make_preview の側で計測するので、ここでは full_text の分だけ計る
+        with span("preview"):
+            text = page["full_text"] or ""
+            offsets = self.offsets[doc_id]
+            spans = []
+            for term_id, (_, terms, slots) in enumerate(leaves):
+                last = len(slots) - 1
+                spans.extend(
+                    (offsets[p], min(len(text), offsets[p + last] + len(terms[-1])), term_id)
+                    for p in _phrase_starts(slots, doc_id, "full_text", SNIPPET_SPANS)
+                )
+            spans.sort()
+            return make_snippet(text, spans)
+
+    def _prefix_postings(self, prefix: str) -> dict:
+        """prefix で始まるトークンの postings をまとめて1つにする。"""
+        merged = {}
+        for term, docs in self.postings.items():
+            if not term.startswith(prefix):
+                continue
+            for doc_id, fields in docs.items():
+                target = merged.setdefault(doc_id, {})
+                for field, positions in fields.items():
+                    target.setdefault(field, []).extend(positions)
+        for fields in merged.values():
+            for positions in fields.values():
+                positions.sort()
+        return merged
+
+    # ── 永続化 ──
+    def save(self, path, source_version=None):
+        """
+        インデックスをJSONファイルに書き出す。
+
+        Args:
+            path:           保存先
+            source_version: 元データの版（PageStore.version など）。読み込み時の照合に使う
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": INDEX_VERSION,
+            "source_version": source_version,
+            "doc_count": len(self.pages),
+            "offsets": self.offsets,
+            "postings": {
+                term: [[doc_id, fields] for doc_id, fields in docs.items()]
+                for term, docs in self.postings.items()
+            },
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path, pages: list, source_version=None):
+        """
+        保存済みインデックスを読み込む。
+
+        Returns:
+            InvertedIndex。形式・元データの版・ページ数が合わない場合は None
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if (
+            data.get("version") != INDEX_VERSION
+            or data.get("source_version") != source_version
+            or data.get("doc_count") != len(pages)
+        ):
+            return None
+        postings = {
+            term: {doc_id: fields for doc_id, fields in docs}
+            for term, docs in data["postings"].items()
+        }
+        return cls(pages, postings, data["offsets"])
+
+
+def expand_terms(node: tuple, has_term, term_dict, expanded: dict) -> tuple:
+    """
+    構文木のうち、インデックスに無い英単語1語だけの語を候補の OR に置き換える。
+
+    Args:
+        node:      query_parser.parse_query の構文木
+        has_term:  トークンがインデックスにあるかを返す関数
+        term_dict: 語彙辞書を返す関数（置き換えが必要になったときだけ呼ぶ）
+        expanded:  置き換えた語を {元の語: [置き換え先, ...]} で書き込む辞書
+    """
+    kind = node[0]
+    if kind == "term":
+        _, field, text = node
+        tokens = tokenize_query(text) if field not in ATTR_FIELDS else []
+        if len(tokens) != 1 or has_term(tokens[0][0]) or not is_word(tokens[0][0]):
+            return node
+        alternatives = term_dict().expand(tokens[0][0])
+        if not alternatives:
+            return node
+        expanded[text] = alternatives
+        return ("or", [("term", field, t) for t in alternatives])
+    if kind == "not":
+        return node
+    return (kind, [expand_terms(child, has_term, term_dict, expanded) for child in node[1]])
+
+
+def _phrase_count(slots: list, doc_id: int, field: str = None) -> int:
+    """各スロットのトークンがフィールド内（field 指定時はその項目だけ）で連続して並んでいる回数を返す。"""
+    first = slots[0][doc_id]
+    fields = first if field is None else (field,)
+    if len(slots) == 1:
+        return sum(len(first.get(f, ())) for f in fields)
+    return sum(len(_phrase_starts(slots, doc_id, f)) for f in fields)
+
+
+def _phrase_starts(slots: list, doc_id: int, field: str, limit: int = None) -> list:
+    """
+    field 内で各スロットのトークンが連続して並んでいる箇所の、先頭トークンの位置を返す。
+
+    limit を指定すると、前から limit 箇所見つけた時点で打ち切る。
+    """
+    rest = []
+    for docs in slots:
+        fields = docs.get(doc_id)
+        positions = fields.get(field) if fields else None
+        if not positions:
+            return []
+        rest.append(positions)
+    starts = rest.pop(0)
+
+    found = []
+    for p in starts:
+        if all(_contains(positions, p + i + 1) for i, positions in enumerate(rest)):
+            found.append(p)
+            if len(found) == limit:
+                break
+    return found
+
+
+def _contains(positions: list, pos: int) -> bool:
+    # 出現位置のリストは昇順なので二分探索で調べる
+    i = bisect_left(positions, pos)
+    return i < len(positions) and positions[i] == pos
+
+
+def intersect(a: list, b: list) -> list:
+    """
+    昇順のページ番号リスト2つの共通部分を返す（ギャロッピング探索）。
+
+    短い方の各要素について、長い方を 1, 2, 4, ... と飛ばしながら探してから二分探索する。
+    かかる時間は短い方の長さ × log(長い方の長さ / 短い方の長さ) 程度で、長い方を全部は読まない。
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    found = []
+    lo, n = 0, len(b)
+    for x in a:
+        step = 1
+        while lo + step < n and b[lo + step] < x:
+            step *= 2
+        lo = bisect_left(b, x, lo + step // 2, min(lo + step + 1, n))
+        if lo == n:
+            break
+        if b[lo] == x:
+            found.append(x)
+    return found
+
+
+def load_or_build(pages: list, index_path, source_version) -> InvertedIndex:
+    """
+    保存済みインデックスが同じ版のデータから作られていれば読み込み、違えば作り直して保存する。
+
+    Args:
+        pages:          ページリスト
+        index_path:     インデックスファイルのパス
+        source_version: 元データの版（PageStore.version や pages.json の更新時刻）
+
+    Returns:
+        InvertedIndex
+    """
+    index_path = Path(index_path)
+    if index_path.exists():
+        index = InvertedIndex.load(index_path, pages, source_version)
+        if index is not None:
+            return index
+
+    index = InvertedIndex.build(pages)
+    index.save(index_path, source_version)
+    return index
+
+
+#テストコード#######
+if __name__ == "__main__":
+    DATA_PATH = Path("data/pages.json")
+    pages = json.loads(DATA_PATH.read_text(encoding="utf-8"))
+    index = load_or_build(pages, Path("data/index.json"), DATA_PATH.stat().st_mtime)
+
+    query = "DX"
+    results = index.search(query)
+    print(f"🔎 Query: {query}")
+    print(f"📄 Hit件数: {len(results)}")
+    for r in results[:3]:
+        print("-" * 40)
+        print("Title:", r.get("title"))
+        print("Match:", r.get("match_count"))
@@ -0,0 +1,111 @@
+# ===================================================
+# live_index.py - PageStore の変更を差分でページ集合・転置インデックスに反映する
+# Week 4 / 性能改善
+# ===================================================
+import threading
+
+from corpus import Corpus, column
+from dedup import DuplicateIndex, filter_duplicates
+from page_store import PageStore
+from segment_index import SegmentedIndex
+from tracing import traced
+
+
+class LiveIndex:
+    """
+    PageStore の変更ログを読み、ページ集合（Corpus）と SegmentedIndex を差分で更新する。
+
+    新しいページの登録は、そのページを Corpus の複製に追記してインデックスの memtable に加えるだけで
+    検索に反映される。既存ページの更新・削除もインデックスには差分で反映するが、
+    Corpus は追記しかできないのでページ集合だけ読み直す。
+    どちらの場合も self.pages は検索中のスレッドと共有しているので書き換えず、
+    新しい Corpus をロックの中で差し替える。
+    本文がほぼ同じページを探すための DuplicateIndex も同じように差分で更新する。
+    変更ログが途切れている場合（ログを持たない古いデータベースなど）は全体を読み直す。
+
+    Args:
+        store:   PageStore
+        options: SegmentedIndex の設定（memtable_size など）
+    """
+
+    def __init__(self, store: PageStore, **options):
+        self.store = store
+        self._options = options
+        self._lock = threading.Lock()
+        self._load()
+
+    @traced("load")
+    def _load(self):
+        # 先に revision を読むので、読み込み中に書き込まれたページは次の sync でもう一度反映される
+        self.revision = self.store.revision()
+        self.pages = Corpus(self.store.iter())
+        self._ids = set(column(self.pages, "id"))
+        self.index = SegmentedIndex.build(self.pages, column(self.pages, "id"), **self._options)
+        self.duplicates = DuplicateIndex.build(self.pages, column(self.pages, "id"))
+
+    def sync(self) -> "LiveIndex":
+        """前回から変わったページを反映する。"""
+        with self._lock:
+            revision, changes = self.store.changes_since(self.revision)
+            if revision == self.revision:
+                return self
+            if changes is None:
+                self._load()
+                return self
+            reload = False
+            pages = None   # 追記する Corpus（共有中の self.pages には追記しない）
+            for page_id, content in changes:
+                page = self.store.get(page_id)
+                if page is None:
+                    self.index.delete(page_id)
+                    self.duplicates.remove(page_id)
+                    reload |= page_id in self._ids
+                elif page_id in self._ids:
+                    if content:
+                        self.index.upsert(page_id, page)
+                        self.duplicates.add_page(page_id, page)
+                    reload = True
+                else:
+                    if pages is None:
+                        pages = self.pages.copy()
+                    pages.append(page)
+                    self._ids.add(page_id)
+                    self.index.upsert(page_id, page)
+                    self.duplicates.add_page(page_id, page)
+            if reload:
+                self.pages = Corpus(self.store.iter())
+                self._ids = set(column(self.pages, "id"))
+            elif pages is not None:
+                self.pages = pages
+            self.revision = revision
+        return self
+
+    def filter_duplicates(self, pages: list) -> tuple:
+        """
+        登録済みのページ（や同じ回の先のページ）と本文がほぼ同じページを除く。
+
+        Returns:
+            (残したページのリスト, [(除いたページ, 似ているページ, 類似度), ...])
+        """
+        with self._lock:
+            return filter_duplicates(pages, self.duplicates, self.store.get)
+
+
+#テストコード#######
+if __name__ == "__main__":
+    import tempfile
+    import time
+    from pathlib import Path
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PageStore(Path(tmp) / "pages.db")
+        store.put_many([{"url": f"https://example.com/{i}", "title": f"DX 事例 {i}", "full_text": "製造業の DX"}
+                        for i in range(1000)])
+        live = LiveIndex(store)
+        store.put({"url": "https://example.com/new", "title": "新しい DX 事例", "full_text": "IoT と DX"})
+        start = time.perf_counter()
+        live.sync()
+        print(f"🔄 sync {(time.perf_counter() - start) * 1000:.2f}ms / {len(live.pages)}件")
+        print(live.index.search_page("IoT DX")["results"][0]["title"], live.index.stats())
+        kept, skipped = live.filter_duplicates([{"url": "https://example.org/copy", "full_text": "IoT と DX"}])
+        print(f"🧬 重複 {len(skipped)}件", [(p["url"], s) for _, p, s in skipped])
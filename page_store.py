@@ -0,0 +1,232 @@
+# ===================================================
+# page_store.py - ページ保存モジュール（SQLite版）
+# Week 4 / 性能改善
+# ===================================================
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from frontier import normalize_url
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id      INTEGER PRIMARY KEY,
+    url_key TEXT,
+    data    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_url_key ON pages(url_key);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    revision INTEGER NOT NULL,
+    id       INTEGER NOT NULL,
+    content  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_revision ON changes(revision);
+INSERT OR IGNORE INTO meta(key, value) VALUES ('version', 0);
+INSERT OR IGNORE INTO meta(key, value) VALUES ('revision', 0);
+"""
+
+
+class PageStore:
+    """
+    ページを SQLite（WALモード）に1件ずつ保存する。
+
+    登録のたびに pages.json 全体を書き直す代わりに、1行の INSERT / UPDATE で済ませる。
+    書き込みはトランザクション内で行うので、複数セッションから同時に登録しても
+    お互いの更新を上書きしない。
+
+    Args:
+        path: データベースファイルのパス
+    """
+
+    def __init__(self, path="data/pages.db"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 の接続はスレッドをまたいで使えないので、スレッドごとに持つ
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, ids: list, keys: tuple = ("version", "revision")):
+        conn.executemany("UPDATE meta SET value = value + 1 WHERE key = ?", [(k,) for k in keys])
+        # どのページが変わったかを新しい revision で記録する（差分更新用）
+        content = int("version" in keys)
+        conn.executemany(
+            "INSERT INTO changes(revision, id, content) SELECT value, ?, ? FROM meta WHERE key = 'revision'",
+            [(page_id, content) for page_id in ids],
+        )
+
+    # ── 読み出し ──
+    def get(self, page_id: int) -> Optional[dict]:
+        row = self._conn().execute("SELECT data FROM pages WHERE id = ?", (page_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter(self) -> Iterator[dict]:
+        """全ページを id 順に返す。"""
+        for (data,) in self._conn().execute("SELECT data FROM pages ORDER BY id"):
+            yield json.loads(data)
+
+    def all(self) -> list:
+        return list(self.iter())
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def exists_url(self, url: str) -> bool:
+        """同じURL（正規化して比較）のページが登録済みか。"""
+        row = self._conn().execute(
+            "SELECT 1 FROM pages WHERE url_key = ? LIMIT 1", (normalize_url(url),)
+        ).fetchone()
+        return row is not None
+
+    def next_id(self) -> int:
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) + 1 FROM pages").fetchone()[0]
+
+    def version(self) -> int:
+        """検索対象の内容が変わるたびに増える番号（インデックスの作り直し判定用）。"""
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def revision(self) -> int:
+        """touch も含めて、何か書き込むたびに増える番号（ページ一覧の読み直し判定用）。"""
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def changes_since(self, revision: int) -> tuple:
+        """
+        revision より後に書き込まれたページの id を返す。
+
+        Returns:
+            (現在の revision, [(id, 検索対象の内容が変わったか), ...]（id 順）)。
+            変更の記録が途中から無い場合（変更ログを持たない古いデータベースなど）はリストの代わりに None
+        """
+        conn = self._conn()
+        # revision と変更ログを同じ時点のスナップショットから読む
+        conn.execute("BEGIN")
+        try:
+            current = self.revision()
+            logged = conn.execute(
+                "SELECT COUNT(DISTINCT revision) FROM changes WHERE revision > ?", (revision,)
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT id, MAX(content) FROM changes WHERE revision > ? GROUP BY id ORDER BY id", (revision,)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        if logged != current - revision:
+            return current, None
+        return current, [(page_id, bool(content)) for page_id, content in rows]
+
+    # ── 書き込み ──
+    def put(self, page: dict) -> int:
+        """
+        ページを保存する。id が無ければ採番して追加し、あれば上書きする。
+
+        Returns:
+            ページの id（page["id"] にも設定する）
+        """
+        with self._write() as conn:
+            self._put(conn, page)
+            self._bump(conn, [page["id"]])
+        return page["id"]
+
+    def put_many(self, pages: list):
+        """複数ページを1トランザクションで保存する。"""
+        if not pages:
+            return
+        with self._write() as conn:
+            for page in pages:
+                self._put(conn, page)
+            self._bump(conn, [p["id"] for p in pages])
+
+    def _put(self, conn: sqlite3.Connection, page: dict):
+        if page.get("id") is None:
+            page["id"] = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM pages").fetchone()[0]
+        # INSERT OR REPLACE だと UPDATE トリガー（fts_index の同期）が動かないので UPSERT にする
+        conn.execute(
+            "INSERT INTO pages(id, url_key, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET url_key = excluded.url_key, data = excluded.data",
+            (page["id"], normalize_url(page["url"]) if page.get("url") else None,
+             json.dumps(page, ensure_ascii=False)),
+        )
+
+    def touch(self, pages: list):
+        """
+        クロール日時など検索対象でない項目だけを更新する。
+
+        version を増やさないので、インデックスは作り直さない。
+        """
+        if not pages:
+            return
+        with self._write() as conn:
+            conn.executemany(
+                "UPDATE pages SET data = ? WHERE id = ?",
+                [(json.dumps(p, ensure_ascii=False), p["id"]) for p in pages],
+            )
+            self._bump(conn, [p["id"] for p in pages], ("revision",))
+
+    def delete(self, page_id: int):
+        with self._write() as conn:
+            conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+            self._bump(conn, [page_id])
+
+    # ── JSON との変換 ──
+    def export_json(self, path=None) -> str:
+        """従来の pages.json と同じ形式で書き出す（path 未指定なら文字列で返す）。"""
+        text = json.dumps(self.all(), ensure_ascii=False, indent=2)
+        if path is not None:
+            Path(path).write_text(text, encoding="utf-8")
+        return text
+
+
+def migrate_json(json_path, db_path) -> PageStore:
+    """
+    既存の pages.json を SQLite に移行する（1回だけ実行する想定）。
+
+    id の無いページには移行時に採番する。
+    """
+    pages = json.loads(Path(json_path).read_text(encoding="utf-8"))
+    store = PageStore(db_path)
+    store.put_many(pages)
+    return store
+
+
+# ─── 実行例 ───
+# python page_store.py migrate data/pages.json data/pages.db
+# python page_store.py export data/pages.db data/pages.json
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 4 and sys.argv[1] == "migrate":
+        store = migrate_json(sys.argv[2], sys.argv[3])
+        print(f"✅ {store.count()}件を移行しました")
+    elif len(sys.argv) == 4 and sys.argv[1] == "export":
+        PageStore(sys.argv[2]).export_json(sys.argv[3])
+        print(f"✅ {sys.argv[3]} に書き出しました")
+    else:
+        print("使い方: python page_store.py migrate <pages.json> <pages.db>")
+        print("        python page_store.py export <pages.db> <pages.json>")
@@ -0,0 +1,174 @@
+# ===================================================
+# query_parser.py - 検索クエリの構文解析（AND / OR / NOT・フレーズ・フィールド指定）
+# Week 4 / 性能改善
+# ===================================================
+import re
+
+# フィールド指定に使える名前 → ページの項目名
+FIELD_ALIASES = {
+    "title": "title",
+    "description": "description",
+    "desc": "description",
+    "body": "full_text",
+    "full_text": "full_text",
+    "keyword": "keywords",
+    "keywords": "keywords",
+    "category": "category",
+    "author": "author",
+}
+
+# 転置インデックスに入っておらず、ページの値そのもので絞り込む項目
+ATTR_FIELDS = ("category", "author")
+
+_LEX_RE = re.compile(r'\s*(?:(\()|(\))|(?:(\w+):)?(?:"([^"]*)"?|([^\s()"]+)))')
+
+
+def _lex(query: str) -> list:
+    """クエリを ("(" / ")" / "op" / "term", 値) の並びに分ける。"""
+    tokens = []
+    pos = 0
+    query = query.strip()
+    while pos < len(query):
+        m = _LEX_RE.match(query, pos)
+        if m is None or m.end() == pos:
+            # 対応する規則がない文字（閉じていない空の "" など）は読み飛ばす
+            pos += 1
+            continue
+        pos = m.end()
+        lparen, rparen, field, phrase, word = m.groups()
+        if lparen:
+            tokens.append(("(", None))
+        elif rparen:
+            tokens.append((")", None))
+        elif phrase is None and field is None and word in ("AND", "OR", "NOT"):
+            tokens.append(("op", word))
+        else:
+            text = phrase if phrase is not None else word
+            name = FIELD_ALIASES.get(field.lower()) if field else None
+            if field and name is None:
+                # 未知のフィールド名（URL の "https:" など）はそのまま語の一部として扱う
+                text = f"{field}:{text}"
+            if text.startswith("-") and phrase is None and field is None and len(text) > 1:
+                tokens.append(("op", "NOT"))
+                text = text[1:]
+            if text.strip():
+                tokens.append(("term", (name, text)))
+    return tokens
+
+
+class _Parser:
+    """
+    再帰下降パーサ。
+
+        or_expr  := and_expr ("OR" and_expr)*
+        and_expr := unary (["AND"] unary)*
+        unary    := ("NOT" | "-") unary | primary
+        primary  := "(" or_expr ")" | [フィールド ":"] (語 | "フレーズ")
+    """
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def or_expr(self):
+        children = [self.and_expr()]
+        while self.peek() == ("op", "OR"):
+            self.take()
+            children.append(self.and_expr())
+        return _combine("or", children)
+
+    def and_expr(self):
+        children = [self.unary()]
+        while True:
+            kind, value = self.peek()
+            if kind == "op" and value == "AND":
+                self.take()
+            elif kind not in ("term", "(") and (kind, value) != ("op", "NOT"):
+                break
+            children.append(self.unary())
+        return _combine("and", children)
+
+    def unary(self):
+        if self.peek() == ("op", "NOT"):
+            self.take()
+            child = self.unary()
+            return ("not", child) if child is not None else None
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == "(":
+            node = self.or_expr()
+            if self.peek()[0] == ")":
+                self.take()
+            return node
+        if kind == "term":
+            field, text = value
+            return ("term", field, text)
+        # 余分な ")" や末尾の演算子は無視する
+        return None
+
+
+def _combine(op: str, children: list):
+    children = [c for c in children if c is not None]
+    if not children:
+        return None
+    if len(children) == 1:
+        return children[0]
+    # 同じ演算子の入れ子は1段にまとめる（(a b) c → a b c）
+    flat = []
+    for c in children:
+        flat.extend(c[1] if c[0] == op else [c])
+    return (op, flat)
+
+
+def parse_query(query: str):
+    """
+    検索クエリを構文木にする。
+
+    空白区切りの語は AND、"..." はフレーズ（空白も含めて連続一致）、
+    OR / NOT（または語頭の -）、括弧、title: や category: のフィールド指定が使える。
+
+    Args:
+        query: 検索キーワード（例: 'DX 製造業', '"DX推進" OR IoT -採用', 'title:DX category:自己紹介'）
+
+    Returns:
+        構文木。空のクエリなら None
+            ("term", フィールド名 or None, 文字列)
+            ("and", [子, ...]) / ("or", [子, ...]) / ("not", 子)
+    """
+    tokens = _lex(query)
+    parser = _Parser(tokens)
+    node = None
+    # 対応しない ")" で止まった場合も、残りを AND でつなげて読み切る
+    while parser.pos < len(tokens):
+        node = _combine("and", [node, parser.or_expr()])
+        if parser.peek()[0] == ")":
+            parser.take()
+    return node
+
+
+def positive_terms(node) -> list:
+    """NOT の下にない ("term", ...) を左から順に集める（ハイライト対象の語）。"""
+    if node is None:
+        return []
+    if node[0] == "term":
+        return [node]
+    if node[0] == "not":
+        return []
+    return [t for child in node[1] for t in positive_terms(child)]
+
+
+#テストコード#######
+if __name__ == "__main__":
+    for q in ['DX 製造業', '"DX 推進" OR IoT -採用', 'title:DX AND (category:自己紹介 OR author:"田中 太郎")',
+              'https://example.com', 'NOT ビール', '(a OR b']:
+        print(q, "→", parse_query(q))
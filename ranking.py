@@ -0,0 +1,217 @@
+# ===================================================
+# ranking.py - BM25 ランキング検索モジュール（Level 3）
+# Week 4 / 性能改善
+# ===================================================
+import bisect
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from inverted_index import _field_texts
+from search_fulltext import _to_result
+from tokenizer import tokenize, tokenize_query
+
+# フィールドごとの重み（タイトルに出る語ほど重視する）
+DEFAULT_BOOSTS = {
+    "title": 3.0,
+    "keywords": 2.0,
+    "description": 1.5,
+    "full_text": 1.0,
+}
+
+
+def _identity(tokens: list) -> list:
+    # CountVectorizer にトークナイズ済みのリストをそのまま渡すための analyzer
+    return tokens
+
+
+class RankedIndex:
+    """
+    BM25 で関連度順に並べる検索インデックス。
+
+    読み込み時に「ページ × 語」の疎行列へ BM25 の重み（IDF・文書長の正規化込み）を
+    計算しておき、検索時はクエリ語の列だけを使った疎行列×ベクトル積1回でスコアを出す。
+    """
+
+    def __init__(self, pages: list, boosts: dict = None, k1: float = 1.2, b: float = 0.75, weigh: bool = True):
+        """
+        Args:
+            pages:  ページリスト
+            boosts: フィールドごとの重み（DEFAULT_BOOSTS を上書き）
+            k1, b:  BM25 のパラメータ
+            weigh:  False なら語頻度を数えるだけで BM25 の重みは計算しない（シャードに分けたときに、
+                    全シャードを合わせた文書頻度・平均文書長を後から set_stats で渡す）
+        """
+        self.pages = pages
+        self.boosts = {**DEFAULT_BOOSTS, **(boosts or {})}
+        self.k1 = k1
+        self.b = b
+
+        field_tokens = {
+            field: [tokenize(text) for text in _field_texts(pages, field)]
+            for field in self.boosts
+        }
+        self.sorted_terms = sorted({t for docs in field_tokens.values() for tokens in docs for t in tokens})
+        self.vocabulary = {term: i for i, term in enumerate(self.sorted_terms)}
+        self.weights = self.counts = self._tf = None
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        if not self.vocabulary:
+            return
+        self.vectorizer = CountVectorizer(analyzer=_identity, vocabulary=self.vocabulary, dtype=np.float32)
+
+        # フィールドの重みを掛けて足し合わせた語頻度（tf）と文書長
+        n_docs = len(pages)
+        tf = None
+        counts = None
+        doc_len = np.zeros(n_docs, dtype=np.float32)
+        for field, boost in self.boosts.items():
+            x = self.vectorizer.transform(field_tokens[field])
+            tf = x * boost if tf is None else tf + x * boost
+            counts = x if counts is None else counts + x
+            doc_len += boost * np.fromiter((len(t) for t in field_tokens[field]), np.float32, n_docs)
+
+        self._tf = tf.tocsc()
+        self.doc_len = doc_len
+        self.counts = counts.tocsc()
+        if weigh:
+            self.set_stats(n_docs, self.document_frequencies(), float(doc_len.sum(dtype=np.float64)))
+
+    def document_frequencies(self) -> np.ndarray:
+        """語（sorted_terms の順）ごとの出現ページ数。"""
+        return np.diff(self.counts.indptr) if self.counts is not None else np.zeros(0, dtype=np.int64)
+
+    def set_stats(self, n_docs: int, df: np.ndarray, total_len: float):
+        """
+        BM25 の重みを非ゼロ要素ごとに計算しておく（1回だけ呼べる）。
+
+        Args:
+            n_docs:    ページ数
+            df:        語（sorted_terms の順）ごとの出現ページ数
+            total_len: 文書長の合計（平均文書長 = total_len / n_docs）
+        """
+        tf, self._tf = self._tf, None
+        if tf is None:
+            return
+        k1, b = self.k1, self.b
+        # IDF（BM25 の定義。全ページに出る語でも負にならない形）
+        df = np.asarray(df, dtype=np.float32)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # 文書長の合計は 0.5 の倍数なので float64 なら足す順によらず同じ値になる（シャードでも同じスコア）
+        avgdl = total_len / n_docs if n_docs else 1.0
+        norm = k1 * (1 - b + b * self.doc_len / (avgdl or 1.0))
+        cols = np.repeat(np.arange(tf.shape[1]), np.diff(tf.indptr))
+        tf.data = self.idf[cols] * tf.data * (k1 + 1) / (tf.data + norm[tf.indices])
+        self.weights = tf
+
+    def _query_terms(self, query: str) -> list:
+        """クエリを語彙内の列番号のリストにする（末尾1文字は前方一致で展開）。"""
+        cols = []
+        for term, prefix in tokenize_query(query):
+            if prefix:
+                i = bisect.bisect_left(self.sorted_terms, term)
+                while i < len(self.sorted_terms) and self.sorted_terms[i].startswith(term):
+                    cols.append(self.vocabulary[self.sorted_terms[i]])
+                    i += 1
+            elif term in self.vocabulary:
+                cols.append(self.vocabulary[term])
+        return cols
+
+    def scores(self, query: str):
+        """
+        全ページの BM25 スコア（ヒットしないページは 0）。
+
+        Returns:
+            ページ数の長さの配列。クエリに語彙内の語が無ければ None
+        """
+        if not query.strip() or self.weights is None:
+            return None
+        cols = self._query_terms(query)
+        if not cols:
+            return None
+        return self.weights[:, cols] @ np.ones(len(cols), dtype=np.float32)
+
+    def search(self, query: str, k: int = 10) -> list:
+        """
+        BM25 スコアの上位 k 件を返す。
+
+        Args:
+            query: 検索キーワード
+            k:     取得件数
+
+        Returns:
+            score / match_count / preview 付きのページのリスト（スコア降順）
+        """
+        return self.search_page(query, k)["results"]
+
+    def search_page(self, query: str, limit: int = 10, offset: int = 0, where=None) -> dict:
+        """
+        BM25 スコア順の offset 件目から limit 件だけを返す。
+
+        Args:
+            where: facets.Filter（指定すると条件に合うページだけにし、結果に全ヒットのページ id "ids" を付ける）
+
+        Returns:
+            {"total": ヒット総数, "results": 表示範囲のページのリスト}
+        """
+        ranked = self.rank(query, None if limit is None else offset + limit,
+                           None if where is None else where.keep)
+        if ranked is None:
+            return {"total": 0, "results": []}
+        hits, top, top_scores = ranked
+        found = {} if where is None else {"ids": where.facets.ids[hits]}
+        top, top_scores = top[offset:], top_scores[offset:]
+        results = []
+        for doc_id, score, count in zip(top, top_scores, self.match_counts(query, top)):
+            r = _to_result(self.pages[doc_id], int(count), query)
+            r["score"] = round(float(score), 3)
+            results.append(r)
+        return {"total": len(hits), "results": results, **found}
+
+    def rank(self, query: str, end: int = None, keep=None):
+        """
+        ヒットしたページと、スコア上位 end 件を返す（search_page とシャードの検索で共用）。
+
+        Args:
+            query: 検索キーワード
+            end:   上位何件まで並べるか（None なら全件）
+            keep:  ページ番号の配列を受け取り、残すページの印を返す関数（絞り込み）
+
+        Returns:
+            (ヒットしたページ番号, 上位のページ番号, そのスコア)。クエリに語彙内の語が無ければ None
+        """
+        scores = self.scores(query)
+        if scores is None:
+            return None
+        hits = np.flatnonzero(scores)
+        if keep is not None:
+            hits = hits[keep(hits)]
+        total = len(hits)
+        end = total if end is None else min(end, total)
+        top = hits
+        if end < total:
+            # end 件目と同点のページも残してから並べるので、同点はページ順になる（ページ送りしても重ならない）
+            kth = -np.partition(-scores[hits], end - 1)[end - 1]
+            top = hits[scores[hits] >= kth]
+        top = top[np.argsort(-scores[top], kind="stable")][:end]
+        return hits, top, scores[top]
+
+    def match_counts(self, query: str, doc_ids) -> np.ndarray:
+        """ページごとのクエリ語の出現回数（フィールドの重みなし）。"""
+        cols = sorted(set(self._query_terms(query)))
+        return np.asarray(self.counts[:, cols][doc_ids].sum(axis=1)).ravel()
+
+
+#テストコード#######
+if __name__ == "__main__":
+    import json
+    from pathlib import Path
+
+    DATA_PATH = Path("data/pages.json")
+    pages = json.loads(DATA_PATH.read_text(encoding="utf-8"))
+    index = RankedIndex(pages)
+
+    query = "DX"
+    for r in index.search(query, k=3):
+        print("-" * 40)
+        print("Title:", r.get("title"))
+        print("Score:", r.get("score"), "Match:", r.get("match_count"))
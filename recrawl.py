@@ -0,0 +1,136 @@
+# ===================================================
+# recrawl.py - 差分再クロールモジュール
+# Week 4 / 性能改善
+# ===================================================
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+import requests
+
+from bulk_crawler import map_urls
+from corpus import column
+from crawler import content_hash, fetch_conditional, parse_html
+
+# 再クロールしても上書きしない項目（登録時に決めた情報）
+KEEP_FIELDS = ("id", "author", "category", "created_at")
+
+
+def is_stale(page: dict, days: int, now: Optional[datetime] = None) -> bool:
+    """最終クロールから days 日以上たったページか（手動登録ページは対象外）。"""
+    if page.get("crawl_status") == "manual" or not page.get("url"):
+        return False
+    crawled_at = page.get("crawled_at")
+    if not crawled_at:
+        return True
+    try:
+        crawled = datetime.fromisoformat(crawled_at)
+    except ValueError:
+        return True
+    return crawled <= (now or datetime.now()) - timedelta(days=days)
+
+
+def find_stale(pages, days: int, now: Optional[datetime] = None) -> list:
+    """
+    再クロール対象のページ番号を返す。
+
+    Corpus なら判定に使う3項目の列だけを見るので、ページごとの dict は作らない。
+    """
+    now = now or datetime.now()
+    rows = zip(column(pages, "crawl_status"), column(pages, "url"), column(pages, "crawled_at"))
+    return [
+        i for i, (status, url, crawled_at) in enumerate(rows)
+        if is_stale({"crawl_status": status, "url": url, "crawled_at": crawled_at}, days, now)
+    ]
+
+
+def refresh_page(page: dict, verify_ssl: bool = True,
+                 session: Optional[requests.Session] = None) -> tuple:
+    """
+    1ページを条件付きリクエストで取り直す。
+
+    304 か内容ハッシュが前回と同じ場合は parse_html を行わず、
+    クロール日時と ETag / Last-Modified だけを更新する。
+
+    Args:
+        page: 登録済みのページ
+        verify_ssl: SSL証明書を検証するか
+        session: 使い回す requests.Session
+
+    Returns:
+        (状態, 新しいページ)。状態は "not_modified" / "unchanged" / "updated" / "failed"
+    """
+    fetched = fetch_conditional(page["url"], etag=page.get("etag"),
+                                last_modified=page.get("last_modified"),
+                                verify_ssl=verify_ssl, session=session)
+    now = datetime.now().isoformat()
+
+    if fetched["status"] is None:
+        return "failed", page
+
+    if fetched["status"] == 304:
+        status = "not_modified"
+    else:
+        html = fetched["html"] or ""
+        digest = content_hash(html)
+        if digest == page.get("content_hash"):
+            status = "unchanged"
+        else:
+            try:
+                new_page = parse_html(html, page["url"])
+            except Exception:
+                return "failed", page
+            for field in KEEP_FIELDS:
+                if field in page:
+                    new_page[field] = page[field]
+            new_page["etag"] = fetched["etag"]
+            new_page["last_modified"] = fetched["last_modified"]
+            new_page["content_hash"] = digest
+            return "updated", new_page
+
+    refreshed = page.copy()
+    refreshed["crawled_at"] = now
+    refreshed["etag"] = fetched["etag"]
+    refreshed["last_modified"] = fetched["last_modified"]
+    return status, refreshed
+
+
+def refresh_stale(pages: list, days: int = 7, verify_ssl: bool = True,
+                  max_workers: int = 8, per_host: int = 2, delay: float = 0.5,
+                  progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """
+    最終クロールから days 日以上たったページをまとめて再クロールする。
+
+    pages はその場で書き換える（更新・確認できたページを差し替える）。
+
+    Returns:
+        {"not_modified": 件数, "unchanged": 件数, "updated": 件数, "failed": 件数,
+         "updated_ids": 内容が変わったページの id のリスト,
+         "checked_ids": 内容は変わらずクロール日時だけ更新したページの id のリスト}
+    """
+    targets = find_stale(pages, days)
+    by_url = {pages[i]["url"]: i for i in targets}
+
+    results = map_urls(list(by_url),
+                       lambda url, s: refresh_page(pages[by_url[url]], verify_ssl=verify_ssl, session=s),
+                       max_workers, per_host, delay, progress)
+
+    summary = {"not_modified": 0, "unchanged": 0, "updated": 0, "failed": 0,
+               "updated_ids": [], "checked_ids": []}
+    for i, (status, page) in zip(by_url.values(), results):
+        summary[status] += 1
+        pages[i] = page
+        if status == "updated":
+            summary["updated_ids"].append(page.get("id"))
+        elif status != "failed":
+            summary["checked_ids"].append(page.get("id"))
+    return summary
+
+
+# ─── テスト ───
+if __name__ == "__main__":
+    import json
+    from pathlib import Path
+
+    DATA_PATH = Path("data/pages.json")
+    pages = json.loads(DATA_PATH.read_text(encoding="utf-8"))
+    print(f"再クロール対象: {len(find_stale(pages, 30))}件")
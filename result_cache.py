@@ -0,0 +1,165 @@
+# ===================================================
+# result_cache.py - 検索結果のキャッシュ（LRU / TTL・データ更新で自動破棄）
+# Week 4 / 性能改善
+# ===================================================
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from tracing import span
+
+_OPERATORS = ("AND", "OR", "NOT")
+
+
+def normalize_query(query: str) -> str:
+    """
+    キャッシュのキー用にクエリを正規化する（小文字化・空白の統一。演算子の大文字は残す）。
+
+    どのエンジンでも結果が変わらない範囲に留める（NFKC は全件走査では効かないので行わない）。
+    """
+    return " ".join(w if w in _OPERATORS else w.lower() for w in query.split())
+
+
+def _sizeof(found: dict) -> int:
+    # 結果のページは元のページの浅いコピーなので、本文などの文字列は数えず dict とプレビューだけ数える
+    size = sys.getsizeof(found)
+    if "ids" in found:
+        size += found["ids"].nbytes
+    for r in found.get("results", []):
+        size += sys.getsizeof(r) + sys.getsizeof(r.get("preview", ""))
+    return size
+
+
+class ResultCache:
+    """
+    search_page の結果を (エンジン, 正規化したクエリ, 件数, 開始位置) ごとに覚えておく。
+
+    Streamlit は操作のたびにスクリプト全体を実行し直すので、同じ検索を繰り返さないようにする。
+    データの版（PageStore.version）が変わったら中身を全部捨てるので、登録・クロール後に
+    古い結果を返すことはない。
+
+    Args:
+        max_entries: 保持する件数の上限
+        max_bytes:   保持する結果のおおよそのメモリ量の上限
+        ttl:         1件を保持する秒数（None なら無期限）
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024, ttl: float = 600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = None
+        self.bytes = 0
+        self._entries = OrderedDict()   # キー → (保存時刻, サイズ, 結果)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def get(self, key: tuple, version):
+        """キャッシュ済みの結果を返す（無ければ None）。"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                self._remove(key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[2]
+
+    def put(self, key: tuple, version, found: dict):
+        size = _sizeof(found)
+        with self._lock:
+            if self.version is None:
+                self.version = version
+            # 計算中に別のセッションが新しい版を読んでいたら、古い版の結果は保存しない
+            if version != self.version or size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), size, found)
+            self.bytes += size
+            # 古く使われていないものから、件数・メモリ量の上限に収まるまで捨てる
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def search(self, engine, name: str, query: str, limit: int = 10, offset: int = 0, version=None,
+               where=None) -> dict:
+        """
+        engine.search_page の結果をキャッシュ経由で返す。
+
+        Args:
+            engine:  search_page(query, limit, offset) を持つ検索エンジン
+            name:    エンジンの名前（キーに使う）
+            query:   検索キーワード
+            limit:   取得件数
+            offset:  先頭から読み飛ばす件数
+            version: データの版（変わったらキャッシュ全体を捨てる）
+            where:   facets.Filter（絞り込みの条件。条件ごとに別のキーで覚える）
+        """
+        def compute():
+            # キャッシュに無かったときだけ、エンジンでの検索（プレビュー作成を含む）を段階 search として計る
+            with span("search"):
+                if where is None:
+                    return engine.search_page(query, limit, offset)
+                return engine.search_page(query, limit, offset, where=where)
+
+        key = (name, normalize_query(query), limit, offset) + ((where.key,) if where is not None else ())
+        return self.get_or_compute(key, version, compute)
+
+    def get_or_compute(self, key: tuple, version, compute: Callable[[], dict]) -> dict:
+        found = self.get(key, version)
+        if found is None:
+            found = compute()
+            self.put(key, version, found)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        """ヒット数・ミス数・ヒット率・保持件数などを返す。"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self.bytes
+        looked_up = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / looked_up if looked_up else 0.0
+        return stats
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                self._stats["invalidations"] += 1
+            self._entries.clear()
+            self.bytes = 0
+            self.version = version
+
+    def _remove(self, key: tuple):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+
+#テストコード#######
+if __name__ == "__main__":
+    import json
+    from pathlib import Path
+
+    from search_engine import ScanEngine
+
+    pages = json.loads(Path("data/pages.json").read_text(encoding="utf-8"))
+    engine = ScanEngine(pages)
+    cache = ResultCache(max_entries=2)
+    for q in ["DX", "dx", " DX ", "製造業", "IoT", "DX"]:
+        start = time.perf_counter()
+        found = cache.search(engine, "scan", q, version=1)
+        print(f"{q}: {found['total']}件 {(time.perf_counter() - start) * 1000:.2f}ms")
+    print(cache.stats())
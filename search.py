@@ -3,6 +3,7 @@
 # Week 2 / 指令3
 # ===================================================
 import re
+from functools import lru_cache
 
 def search_pages(query: str, pages: list) -> list:
     """
@@ -48,5 +49,10 @@ def highlight_match(text: str, query: str) -> str:
     """
     if not query:
         return text
-    pattern = re.compile(re.escape(query), re.IGNORECASE)
-    return pattern.sub(f"**{query}**", text)
\ No newline at end of file
+    # 元テキストの大文字・小文字をそのまま残す
+    return _pattern(query).sub(lambda m: f"**{m.group(0)}**", text)
+
+
+@lru_cache(maxsize=256)
+def _pattern(query: str) -> re.Pattern:
+    return re.compile(re.escape(query), re.IGNORECASE)
\ No newline at end of file
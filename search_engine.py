@@ -0,0 +1,80 @@
+# ===================================================
+# search_engine.py - 検索エンジンの切り替え
+# Week 4 / 性能改善
+# ===================================================
+import os
+
+from search_fulltext import search_page
+
+# 検索エンジンの名前と表示名
+ENGINES = {
+    "index": "転置インデックス（マッチ数順）",
+    "mmap": "転置インデックス・バイナリ版（mmap・マッチ数順）",
+    "bm25": "BM25（関連度順）",
+    "sharded": "BM25・シャード並列（複数プロセス）",
+    "fts": "SQLite FTS5（trigram・関連度順）",
+    "semantic": "LSA（意味の近さ順）",
+    "hybrid": "ハイブリッド（BM25 + LSA）",
+    "scan": "全件走査（比較用）",
+}
+
+# 環境変数 TECH0_SEARCH_ENGINE で既定のエンジンを切り替えられる
+DEFAULT_ENGINE = os.environ.get("TECH0_SEARCH_ENGINE", "index")
+
+
+class ScanEngine:
+    """インデックスを使わずに全ページを走査する（従来の search_fulltext）。"""
+
+    def __init__(self, pages: list):
+        self.pages = pages
+
+    def search(self, query: str, limit: int = None, offset: int = 0) -> list:
+        return self.search_page(query, limit, offset)["results"]
+
+    def search_page(self, query: str, limit: int = 10, offset: int = 0, where=None) -> dict:
+        return search_page(query, self.pages, limit=limit, offset=offset, where=where)
+
+
+def open_engine(name: str, pages: list, store=None, index_path=None, version=None, lsa_path=None):
+    """
+    名前を指定して検索エンジンを用意する。
+
+    どのエンジンも search_page(query, limit, offset, where=None) で同じ形式の結果を返す
+    （where は facets.Filter。カテゴリ・作成日などでの絞り込み）。
+
+    Args:
+        name:       ENGINES のキー
+        pages:      ページリスト（fts 以外で使う）
+        store:      PageStore（fts で使う）
+        index_path: 転置インデックスの保存先（index / mmap で使う。index は None なら保存しない）
+        version:    元データの版（保存済み転置インデックス・LSA の照合に使う）
+        lsa_path:   LSA のページベクトルの保存先（semantic / hybrid で使う。None なら保存しない）
+    """
+    if name == "index":
+        from inverted_index import InvertedIndex, load_or_build
+        if index_path is None:
+            return InvertedIndex.build(pages)
+        return load_or_build(pages, index_path, version)
+    if name == "mmap":
+        from binary_index import load_or_build
+        return load_or_build(pages, index_path, version)
+    if name == "bm25":
+        from ranking import RankedIndex
+        return RankedIndex(pages)
+    if name == "sharded":
+        # シャード数は環境変数 TECH0_SHARDS（未指定なら CPU 数）
+        from sharded_index import ShardedIndex
+        return ShardedIndex(pages)
+    if name == "fts":
+        from fts_index import FtsIndex
+        return FtsIndex(store)
+    if name in ("semantic", "hybrid"):
+        from semantic import HybridEngine, SemanticIndex, load_or_build
+        semantic = SemanticIndex(pages) if lsa_path is None else load_or_build(pages, lsa_path, version)
+        if name == "semantic":
+            return semantic
+        from ranking import RankedIndex
+        return HybridEngine(RankedIndex(pages), semantic)
+    if name == "scan":
+        return ScanEngine(pages)
+    raise ValueError(f"未知の検索エンジン: {name}（{', '.join(ENGINES)} から選択）")
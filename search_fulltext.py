@@ -3,66 +3,157 @@
 # Week 3 / 指令6
 # ===================================================
 
+import heapq
 import re
+from functools import lru_cache
+from operator import itemgetter
 
+from corpus import Corpus
+from snippet import make_snippet
+from tracing import traced
 
-def search_fulltext(query: str, pages: list) -> list:
+
+def search_fulltext(query: str, pages: list, index=None, limit: int = None, offset: int = 0) -> list:
     """
     全文検索（本文含む）を実行し、マッチ数でスコアリングする。
 
     Args:
-        query: 検索キーワード
-        pages: ページリスト
+        query:  検索キーワード
+        pages:  ページリスト
+        index:  InvertedIndex（指定時は全件走査せずインデックスで検索）
+        limit:  取得件数（None なら全件）
+        offset: 先頭から読み飛ばす件数
 
     Returns:
         マッチしたページのリスト（スコア降順）
     """
+    return search_page(query, pages, limit=limit, offset=offset, index=index)["results"]
+
+
+def search_page(query: str, pages: list, limit: int = 10, offset: int = 0, index=None, where=None) -> dict:
+    """
+    検索結果のうち offset 件目から limit 件だけを返す（ページング用）。
+
+    全ヒットのスコアは数えるが、ページのコピーとプレビュー作成は
+    表示する範囲の分しか行わない。
+
+    Args:
+        query:  検索キーワード
+        pages:  ページリスト
+        limit:  取得件数（None なら全件）
+        offset: 先頭から読み飛ばす件数
+        index:  search_page(query, limit, offset) を持つ検索インデックス
+        where:  facets.Filter（指定すると条件に合うページだけにし、結果に全ヒットのページ id "ids" を付ける）
+
+    Returns:
+        {"total": ヒット総数, "results": 表示範囲のページのリスト}
+    """
     if not query.strip():
-        return []
+        return {"total": 0, "results": []}
+
+    if index is not None:
+        return index.search_page(query, limit, offset) if where is None else \
+            index.search_page(query, limit, offset, where=where)
 
-    results = []
+    hits = []
     # クエリ正規化：空白を1つに、大小無視
     q = re.sub(r"\s+", " ", query.strip().lower())
     # q = query.lower()   #元コード
 
-    for page in pages:
-        text = " ".join([
+    for doc_id, text in enumerate(_search_texts(pages)):
+        count = text.count(q)
+        if count > 0:
+            hits.append((count, doc_id))
+
+    found = {}
+    if where is not None:
+        hits, found["ids"] = where.filter(hits, itemgetter(1))
+    results = [_to_result(pages[doc_id], count, query) for count, doc_id in top_hits(hits, limit, offset)]
+    return {"total": len(hits), "results": results, **found}
+
+
+def _search_texts(pages):
+    """各ページの検索対象テキスト（小文字化済み）。Corpus なら作成済みのものをそのまま使う。"""
+    if isinstance(pages, Corpus):
+        return pages.search_texts
+    return (
+        " ".join([
             page.get("title", ""),
             page.get("description", ""),
             page.get("full_text", ""),
             " ".join(page.get("keywords", [])),
         ]).lower()
+        for page in pages
+    )
 
-        count = text.count(q)
-        if count > 0:
-            r = page.copy()
-            r["match_count"] = count
-            r["preview"] = _make_preview(page.get("full_text", page.get("description", "")), query)
-            results.append(r)
 
-    results.sort(key=lambda x: x["match_count"], reverse=True)
-    return results
+def top_hits(hits: list, limit: int = None, offset: int = 0) -> list:
+    """
+    (スコア, ページ番号) のリストからスコア上位の offset〜offset+limit 件目を取り出す。
 
+    limit 指定時は offset+limit 件の有界ヒープで選ぶので、全件ソートしない。
+    同点のときは hits の並び順を保つ。
+    """
+    if limit is None:
+        return sorted(hits, key=itemgetter(0), reverse=True)[offset:]
+    return heapq.nlargest(offset + limit, hits, key=itemgetter(0))[offset:]
 
+
+def _to_result(page: dict, count: int, query: str, preview: str = None) -> dict:
+    """ページをコピーしてマッチ数とプレビューを付ける（preview 未指定なら本文から作る）。"""
+    r = page.copy()
+    r["match_count"] = count
+    if preview is None:
+        preview = _make_preview(page.get("full_text", page.get("description", "")), query)
+    r["preview"] = preview
+    return r
+
+
+def search_ranked(query: str, pages: list, k: int = 10, index=None) -> list:
+    """
+    BM25 の関連度順で上位 k 件を返す。
+
+    Args:
+        query: 検索キーワード
+        pages: ページリスト
+        k:     取得件数
+        index: RankedIndex（未指定時はその場で作る）
+
+    Returns:
+        score 付きのページのリスト（スコア降順）
+    """
+    if not query.strip():
+        return []
+
+    if index is None:
+        from ranking import RankedIndex
+        index = RankedIndex(pages)
+    return index.search(query, k)
+
+
+@lru_cache(maxsize=256)
+def _query_pattern(query: str) -> re.Pattern:
+    return re.compile(re.escape(query), re.IGNORECASE)
+
+
+@traced("preview")
 def _make_preview(text: str, query: str, ctx: int = 80) -> str:
-    """マッチ箇所周辺のプレビューを生成する。"""
+    """
+    マッチ箇所周辺のプレビューを生成する。
+
+    本文全体を小文字化せず、最初のマッチを探したあとはプレビューの範囲だけを調べる。
+    """
     if not text or not query:
         return ""
 
-    pos = text.lower().find(query.lower())
-    if pos == -1:
+    pattern = _query_pattern(query)
+    m = pattern.search(text)
+    if m is None:
         return (text[:200] + "...") if len(text) > 200 else text
 
-    start = max(0, pos - ctx)
-    end = min(len(text), pos + len(query) + ctx)
-
-    preview = ""
-    if start > 0:
-        preview += "..."
-    preview += text[start:end]
-    if end < len(text):
-        preview += "..."
-    return preview
+    width = 2 * ctx + len(query)
+    spans = [(s.start(), s.end(), 0) for s in pattern.finditer(text, m.start(), m.start() + width)]
+    return make_snippet(text, spans, width)
 
 
 #テストコード#######
@@ -0,0 +1,342 @@
+# ===================================================
+# search_service.py - 検索機能を HTTP / JSON で提供するサービス（Streamlit なし）
+# Week 4 / 性能改善
+# ===================================================
+import argparse
+import gc
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from bulk_crawler import crawl_urls
+from facets import FIELDS, FacetIndex
+from frontier import normalize_url
+from live_index import LiveIndex
+from page_store import PageStore, migrate_json
+from result_cache import ResultCache
+from search_engine import DEFAULT_ENGINE, ENGINES, open_engine
+from semantic import HybridEngine
+from term_dict import suggest_queries
+import tracing
+
+MAX_LIMIT = 100
+# 検索結果の JSON から外す項目（本文は大きいので /pages/{id} で取る）
+OMIT_FIELDS = ("full_text", "links")
+
+
+class SearchService:
+    """
+    ページ集合・インデックス・結果キャッシュを1つのプロセスに常駐させ、検索・登録を受け付ける。
+
+    app.py と同じ部品（LiveIndex・open_engine・ResultCache・FacetIndex）を使うので、
+    同じ pages.db に対して同じ結果を返す。どのメソッドも複数スレッドから同時に呼んでよい。
+
+    Args:
+        store:        PageStore
+        index_path:   バイナリ転置インデックスの保存先（mmap エンジンで使う）
+        lsa_path:     LSA のページベクトルの保存先（semantic / hybrid エンジンで使う）
+        cache:        ResultCache（None なら既定の設定で作る）
+    """
+
+    def __init__(self, store: PageStore, index_path=None, lsa_path=None, cache: ResultCache = None):
+        self.store = store
+        self.index_path = index_path
+        self.lsa_path = lsa_path
+        self.cache = cache if cache is not None else ResultCache()
+        self.live = LiveIndex(store)
+        self._engines = {}      # 名前 → (版, エンジン)
+        self._facets = None     # (revision, FacetIndex)
+        self._lock = threading.Lock()
+        _freeze()
+
+    def _engine(self, name: str, version: int):
+        if name == "index":
+            return self.live.index
+        if name == "hybrid":
+            return HybridEngine(self._engine("bm25", version), self._engine("semantic", version))
+        if name not in ENGINES:
+            raise ValueError(f"未知の検索エンジン: {name}（{', '.join(ENGINES)} から選択）")
+        # fts は SQLite 側で同期されるので版に関係なく使い回す
+        version = 0 if name == "fts" else version
+        with self._lock:
+            cached = self._engines.get(name)
+            if cached is None or cached[0] != version:
+                engine = open_engine(name, self.live.pages, store=self.store, index_path=self.index_path,
+                                     version=version, lsa_path=self.lsa_path)
+                self._engines[name] = (version, engine)
+                if cached is not None:
+                    _close(cached[1])
+                cached = self._engines[name]
+        return cached[1]
+
+    def _facet_index(self) -> FacetIndex:
+        with self._lock:
+            if self._facets is None or self._facets[0] != self.live.revision:
+                self._facets = (self.live.revision, FacetIndex(self.live.pages))
+            return self._facets[1]
+
+    def search(self, query: str, engine: str = DEFAULT_ENGINE, limit: int = 10, offset: int = 0,
+               filters: dict = None, date_from: str = None, date_to: str = None, facets: bool = False) -> dict:
+        """
+        検索して JSON にできる dict を返す。
+
+        Args:
+            query:     検索キーワード
+            engine:    ENGINES のキー
+            limit:     取得件数（MAX_LIMIT まで）
+            offset:    先頭から読み飛ばす件数
+            filters:   {項目: [値, ...]}（facets.FIELDS の項目で絞り込む）
+            date_from: 作成日の下限（"YYYY-MM-DD"）
+            date_to:   作成日の上限（同上）
+            facets:    ヒットの項目ごとの件数も返すか
+
+        Returns:
+            {"total", "results", "expanded"（あれば）, "facets"（facets=True のとき）}
+        """
+        if not 0 < limit <= MAX_LIMIT or offset < 0:
+            raise ValueError(f"limit は 1〜{MAX_LIMIT}、offset は 0 以上を指定してください")
+        with tracing.trace("query", query=query, engine=engine):
+            version = self.store.version()
+            self.live.sync()
+            searcher = self._engine(engine, version)
+            where = None
+            if filters or date_from or date_to or facets:
+                facet_index = self._facet_index()
+                where = facet_index.select(filters, date_from, date_to)
+            found = self.cache.search(searcher, engine, query, limit, offset, version, where=where)
+            body = {
+                "total": found["total"],
+                "results": [{k: v for k, v in r.items() if k not in OMIT_FIELDS} for r in found["results"]],
+            }
+            if found.get("expanded"):
+                body["expanded"] = found["expanded"]
+            if facets:
+                body["facets"] = facet_index.counts(facet_index.from_ids(found.get("ids", [])))
+            return body
+
+    def suggest(self, query: str) -> dict:
+        self.live.sync()
+        return {"suggestions": suggest_queries(query, self.live.index.term_dict) if query else []}
+
+    def page(self, page_id: int):
+        return self.store.get(page_id)
+
+    def health(self) -> dict:
+        self.live.sync()
+        return {"status": "ok", "pages": len(self.live.pages), "version": self.store.version(),
+                "cache": self.cache.stats()}
+
+    def crawl(self, urls: list, verify_ssl: bool = True) -> dict:
+        """
+        URLをクロールして登録する（登録済みのURL・本文がほぼ同じページは登録しない）。
+
+        Returns:
+            {"registered": [...], "known": [...], "duplicates": [...], "failed": [...]}
+        """
+        # 重複の判定は正規化したURLで行い、取得・登録は渡されたURLのまま行う
+        given = {}
+        for url in urls:
+            given.setdefault(normalize_url(url), url.strip())
+        todo, known = [], []
+        for url in given.values():
+            (known if self.store.exists_url(url) else todo).append(url)
+        pages, failed = [], []
+        for r in crawl_urls(todo, verify_ssl=verify_ssl):
+            if r.get("crawl_status") == "success":
+                r["author"] = "クローラー"
+                r["category"] = "自動取得"
+                r["created_at"] = r["crawled_at"][:10]
+                pages.append(r)
+            else:
+                failed.append({"url": r["url"], "error": r.get("error", "Unknown")})
+        self.live.sync()
+        pages, near = self.live.filter_duplicates(pages)
+        self.store.put_many(pages)
+        return {
+            "registered": [{"id": p["id"], "url": p["url"], "title": p["title"]} for p in pages],
+            "known": known,
+            "duplicates": [{"url": p["url"], "similar_to": original.get("id"), "similarity": score}
+                           for p, original, score in near],
+            "failed": failed,
+        }
+
+
+def _freeze():
+    # 起動時に読み込んだページやインデックスは常駐し続けるので、世代別 GC の調査対象から外す。
+    # 外さないと、数百リクエストごとの第2世代の GC が全オブジェクトをなめて 1〜2 秒止まる。
+    # 外したオブジェクトは循環参照があると二度と回収されないので、作り直すエンジンには使わない
+    gc.collect()
+    gc.freeze()
+
+
+def _close(engine):
+    # 古い版のエンジンが持つ mmap・シャードのプロセスを手放す
+    close = getattr(engine, "close", None)
+    if close is None:
+        return
+    try:
+        close()
+    except BufferError:   # 検索中のスレッドがまだ mmap を読んでいる（参照が無くなれば閉じられる）
+        pass
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    """
+    GET  /search?q=...&engine=&limit=&offset=&category=&author=&crawl_status=&month=&date_from=&date_to=&facets=1
+    GET  /suggest?q=...
+    GET  /pages/{id}
+    GET  /health
+    GET  /metrics      段階ごとの処理時間（Prometheus のテキスト形式。--trace で計測したとき）
+    GET  /debug/slow   段階ごとの集計と、遅いクエリの内訳（JSON）
+    POST /crawl  {"urls": [...], "verify_ssl": true}
+    """
+
+    protocol_version = "HTTP/1.1"   # keep-alive で接続を使い回す
+    server_version = "Tech0Search/0.2"
+    timeout = 30                    # 何も送ってこない接続はこの秒数で閉じる
+    # ヘッダと本文を別々に送るので、Nagle を切らないと遅延 ACK を待って 40ms ほど止まる
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        with self.server.slots:
+            self._get()
+
+    def do_POST(self):
+        with self.server.slots:
+            self._post()
+
+    def _get(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        service = self.server.service
+        try:
+            if url.path == "/search":
+                query = _one(params, "q")
+                if not query:
+                    raise ValueError("q を指定してください")
+                self._send(200, service.search(
+                    query,
+                    engine=_one(params, "engine", DEFAULT_ENGINE),
+                    limit=int(_one(params, "limit", 10)),
+                    offset=int(_one(params, "offset", 0)),
+                    filters={field: params[field] for field in FIELDS if field in params},
+                    date_from=_one(params, "date_from"),
+                    date_to=_one(params, "date_to"),
+                    facets=_one(params, "facets") in ("1", "true"),
+                ))
+            elif url.path == "/suggest":
+                self._send(200, service.suggest(_one(params, "q", "")))
+            elif url.path.startswith("/pages/"):
+                page = service.page(int(url.path[len("/pages/"):]))
+                if page:
+                    self._send(200, page)
+                else:
+                    self._send(404, {"error": "ページが見つかりません"})
+            elif url.path == "/health":
+                self._send(200, service.health())
+            elif url.path == "/metrics":
+                self._send_bytes(200, tracing.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+            elif url.path == "/debug/slow":
+                self._send(200, {"enabled": tracing.is_enabled(), "slow_ms": tracing.SLOW_MS,
+                                 "stages": tracing.stats(), "slow": tracing.slow_queries()})
+            else:
+                self._send(404, {"error": f"未知のパス: {url.path}"})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _post(self):
+        try:
+            if urlsplit(self.path).path != "/crawl":
+                self._send(404, {"error": f"未知のパス: {self.path}"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            urls = body.get("urls")
+            if not isinstance(urls, list) or not urls:
+                raise ValueError("urls にURLのリストを指定してください")
+            self._send(200, self.server.service.crawl(urls, verify_ssl=bool(body.get("verify_ssl", True))))
+        except ValueError as e:   # json.JSONDecodeError も ValueError
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _send(self, status: int, body: dict):
+        self._send_bytes(status, json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def _send_bytes(self, status: int, data: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def _one(params: dict, key: str, default=None):
+    values = params.get(key)
+    return values[0] if values else default
+
+
+class SearchServer(ThreadingHTTPServer):
+    """
+    接続ごとのスレッドで受け付け、同時に処理するリクエストを workers 件までに抑える HTTPServer。
+
+    keep-alive の接続は次のリクエストを待つ間もスレッドを持ち続けるので、処理数だけを
+    セマフォで絞る（待っているだけの接続が処理の枠を埋めて、他の接続が止まることはない）。
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address: tuple, service: SearchService, workers: int = 8, verbose: bool = False):
+        super().__init__(address, SearchHandler)
+        self.service = service
+        self.verbose = verbose
+        self.slots = threading.BoundedSemaphore(workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="検索機能を HTTP / JSON で提供する")
+    parser.add_argument("--db", default="data/pages.db", help="PageStore のパス（無ければ data/pages.json から移行）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=8, help="同時に処理するリクエスト数")
+    parser.add_argument("--cache-entries", type=int, default=256, help="結果キャッシュの件数（0 で無効）")
+    parser.add_argument("--verbose", action="store_true", help="アクセスログを出す")
+    parser.add_argument("--trace", action="store_true", help="処理段階ごとの時間を計測する（/metrics・/debug/slow）")
+    parser.add_argument("--slow-ms", type=float, default=tracing.SLOW_MS, help="遅いクエリとして記録する時間 (ms)")
+    args = parser.parse_args(argv)
+    tracing.enable(args.trace or tracing.is_enabled())
+    tracing.set_slow_ms(args.slow_ms)
+
+    db = Path(args.db)
+    json_path = Path("data/pages.json")
+    store = migrate_json(json_path, db) if not db.exists() and json_path.exists() else PageStore(db)
+    service = SearchService(store, index_path=db.with_name("index.bin"), lsa_path=db.with_name("lsa.npz"),
+                            cache=ResultCache(max_entries=args.cache_entries))
+    server = SearchServer((args.host, args.port), service, workers=args.workers, verbose=args.verbose)
+    print(f"🚀 http://{args.host}:{server.server_port} （{len(service.live.pages)}件）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# ─── 実行例 ───
+# python search_service.py --db data/pages.db --port 8000
+# curl -G http://127.0.0.1:8000/search -d q=DX -d limit=3 --data-urlencode 'category=自己紹介' -d facets=1
+# curl 'http://127.0.0.1:8000/suggest?q=pyth'
+# curl 'http://127.0.0.1:8000/pages/1'
+# curl 'http://127.0.0.1:8000/metrics'        （--trace で起動したとき）
+# curl -X POST http://127.0.0.1:8000/crawl -d '{"urls": ["https://example.com"]}'
+if __name__ == "__main__":
+    main()
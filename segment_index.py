@@ -0,0 +1,307 @@
+# ===================================================
+# segment_index.py - ページの追加・更新・削除を差分で反映する転置インデックス（LSM 風）
+# Week 4 / 性能改善
+# ===================================================
+import threading
+from itertools import islice
+from operator import itemgetter
+
+from corpus import Corpus, column
+from inverted_index import InvertedIndex, expand_terms
+from query_parser import parse_query
+from search_fulltext import _to_result, top_hits
+from term_dict import TermDictionary
+
+
+class _Head:
+    """ページ集合の先頭 n 件だけを見せる（後から追記されたページを元のセグメントに含めない）。"""
+
+    def __init__(self, pages, n: int):
+        self._pages = pages
+        self._n = n
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: int) -> dict:
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        return self._pages[i]
+
+    def __iter__(self):
+        return islice(iter(self._pages), self._n)
+
+    def column(self, key: str) -> list:
+        return column(self._pages, key)[:self._n]
+
+
+class Segment:
+    """
+    1つのセグメント（転置インデックス + 各ページのキー + 削除済みの印）。
+
+    書き込み中のセグメント（memtable）だけがページを追加でき、frozen になった後は
+    deleted に印を付ける以外は変更しない。
+    """
+
+    def __init__(self, index: InvertedIndex, keys: list, frozen: bool = False):
+        self.index = index
+        self.keys = keys          # ページ番号 → キー
+        self.deleted = set()      # 削除・更新で無効になったページ番号
+        self.frozen = frozen
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def live(self) -> int:
+        return len(self.keys) - len(self.deleted)
+
+    def add(self, key, page: dict) -> int:
+        self.keys.append(key)
+        return self.index.append(page)
+
+
+class SegmentedIndex:
+    """
+    ページの追加・更新・削除を、全体を作り直さずに反映できる転置インデックス。
+
+    LSM ツリーと同じく、新しいページは小さな書き込み用セグメント（memtable）に追加し、
+    更新・削除は古いセグメント側のページに削除の印を付けるだけにする。
+    memtable が memtable_size 件になったら frozen にして新しい memtable を始め、
+    セグメントが max_segments 個を超えたら別スレッドで小さいものから1つにまとめる
+    （小さいセグメントの合計が大きいセグメントの merge_ratio 倍を超えたら全体をまとめる）。
+    そのため1件の登録にかかる時間はそのページの大きさに比例し、コーパス全体の大きさにはよらない。
+
+    検索はセグメントごとに InvertedIndex で行って結果をキー順にまとめるので、
+    結果（件数・順位・プレビュー）は全ページで1つの InvertedIndex を作った場合と同じになる。
+
+    Args:
+        memtable_size: 書き込み用セグメントの件数の上限
+        max_segments:  まとめずに持つ frozen セグメントの数の上限
+        merge_ratio:   全体をまとめる基準（小さいセグメント・削除済みの件数の割合）
+        background:    まとめる処理を別スレッドで行うか（False ならその場で行う）
+    """
+
+    def __init__(self, memtable_size: int = 1000, max_segments: int = 8, merge_ratio: float = 0.25,
+                 background: bool = True):
+        self.memtable_size = memtable_size
+        self.max_segments = max_segments
+        self.merge_ratio = merge_ratio
+        self.background = background
+        self.merges = 0
+        self._segments = []     # 古い順。最後の1つは frozen でなければ memtable
+        self._where = {}        # キー → (セグメント, ページ番号)
+        self._lock = threading.RLock()
+        self._merging = None
+        self._term_dict = None
+
+    @classmethod
+    def build(cls, pages, keys=None, **options) -> "SegmentedIndex":
+        """
+        ページ集合から最初のセグメントを作る。
+
+        pages はコピーせずに参照する（後から末尾に追記されても、作成時の件数分だけを使う）。
+
+        Args:
+            pages: ページリスト（list of dict / Corpus）
+            keys:  各ページのキー（ページ id など。None なら並び順の番号）
+        """
+        index = cls(**options)
+        n = len(pages)
+        keys = list(range(n)) if keys is None else list(keys)
+        segment = Segment(InvertedIndex.build(_Head(pages, n)), keys, frozen=True)
+        index._segments.append(segment)
+        index._where = {key: (segment, doc_id) for doc_id, key in enumerate(keys)}
+        return index
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key) -> bool:
+        return key in self._where
+
+    # ── 追加・更新・削除 ──
+    def upsert(self, key, page: dict):
+        """ページを追加する（同じキーのページがあれば置き換える）。"""
+        with self._lock:
+            self._delete(key)
+            memtable = self._memtable()
+            self._where[key] = (memtable, memtable.add(key, page))
+            self._term_dict = None
+            if len(memtable) >= self.memtable_size:
+                memtable.frozen = True
+                self._maybe_merge()
+
+    def delete(self, key) -> bool:
+        """ページを削除する（無かった場合は False）。"""
+        with self._lock:
+            return self._delete(key)
+
+    def _delete(self, key) -> bool:
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        segment, doc_id = where
+        segment.deleted.add(doc_id)
+        return True
+
+    def _memtable(self) -> Segment:
+        if not self._segments or self._segments[-1].frozen:
+            self._segments.append(Segment(InvertedIndex([]), []))
+        return self._segments[-1]
+
+    # ── 検索 ──
+    def search(self, query: str, limit: int = None, offset: int = 0) -> list:
+        return self.search_page(query, limit, offset)["results"]
+
+    def search_page(self, query: str, limit: int = 10, offset: int = 0, where=None) -> dict:
+        """InvertedIndex.search_page と同じ形式で、全セグメントの結果をまとめて返す（キーはページ id）。"""
+        node = parse_query(query)
+        if node is None:
+            return {"total": 0, "results": []}
+        with self._lock:
+            expanded = {}
+            node = expand_terms(node, self._has_term, lambda: self.term_dict, expanded)
+            hits = []
+            for segment in self._segments:
+                if not segment.live:
+                    continue
+                found, leaves = segment.index._match_node(node)
+                keys, deleted = segment.keys, segment.deleted
+                hits.extend(
+                    (count, keys[doc_id], segment, doc_id, leaves)
+                    for count, doc_id in found if doc_id not in deleted
+                )
+            # 同点のときの並びを1つのインデックスの場合（キー順）にそろえる
+            hits.sort(key=itemgetter(1))
+            if where is not None:
+                hits, ids = where.filter(hits, itemgetter(1), by_id=True)
+            results = [
+                _to_result(segment.index.pages[doc_id], count, query,
+                           segment.index._preview(doc_id, query, leaves))
+                for count, _, segment, doc_id, leaves in top_hits(hits, limit, offset)
+            ]
+        found = {"total": len(hits), "results": results}
+        if expanded:
+            found["expanded"] = expanded
+        if where is not None:
+            found["ids"] = ids
+        return found
+
+    def _has_term(self, term: str) -> bool:
+        return any(term in segment.index.postings for segment in self._segments)
+
+    @property
+    def term_dict(self) -> TermDictionary:
+        """全セグメントの語彙をまとめた語彙辞書（出現ページ数は削除済みのページも含む概数）。"""
+        with self._lock:
+            if self._term_dict is None:
+                segments = [s for s in self._segments if len(s)]
+                if len(segments) == 1:
+                    self._term_dict = segments[0].index.term_dict
+                else:
+                    freqs = {}
+                    for segment in segments:
+                        terms = segment.index.term_dict
+                        for term, freq in zip(terms.terms, terms.freqs.tolist()):
+                            freqs[term] = freqs.get(term, 0) + freq
+                    self._term_dict = TermDictionary(freqs)
+            return self._term_dict
+
+    # ── セグメントをまとめる ──
+    def merge(self):
+        """memtable も含めて全セグメントを1つにまとめる（終わるまで待つ）。"""
+        self.wait()
+        with self._lock:
+            if self._segments:
+                self._segments[-1].frozen = True
+            targets = list(self._segments)
+        if len(targets) > 1 or (targets and targets[0].deleted):
+            self._merge(targets)
+
+    def wait(self):
+        """別スレッドでまとめている途中なら、終わるまで待つ。"""
+        thread = self._merging
+        if thread is not None:
+            thread.join()
+
+    def _maybe_merge(self):
+        if self._merging is not None and self._merging.is_alive():
+            return
+        targets = self._merge_targets()
+        if not targets:
+            return
+        if self.background:
+            self._merging = threading.Thread(target=self._merge, args=(targets,), daemon=True)
+            self._merging.start()
+        else:
+            self._merge(targets)
+
+    def _merge_targets(self) -> list:
+        frozen = [s for s in self._segments if s.frozen]
+        if len(frozen) <= self.max_segments:
+            return []
+        largest = max(frozen, key=len)
+        small = [s for s in frozen if s is not largest]
+        if (sum(s.live for s in small) > largest.live * self.merge_ratio
+                or len(largest.deleted) > len(largest) * self.merge_ratio):
+            return frozen
+        return small
+
+    def _merge(self, targets: list):
+        # frozen のセグメントはページが増えないので、削除の印だけ写してからロックの外で作る
+        with self._lock:
+            snapshot = [(segment, set(segment.deleted)) for segment in targets]
+        entries = sorted(
+            ((key, segment, doc_id)
+             for segment, deleted in snapshot
+             for doc_id, key in enumerate(segment.keys) if doc_id not in deleted),
+            key=itemgetter(0),
+        )
+        pages = Corpus(segment.index.pages[doc_id] for _, segment, doc_id in entries)
+        merged = Segment(InvertedIndex.build(pages), [key for key, _, _ in entries], frozen=True)
+
+        with self._lock:
+            # まとめている間に更新・削除されたページは、新しいセグメントでも削除済みにする
+            for doc_id, (key, segment, old_id) in enumerate(entries):
+                where = self._where.get(key)
+                if where is not None and where[0] is segment and where[1] == old_id:
+                    self._where[key] = (merged, doc_id)
+                else:
+                    merged.deleted.add(doc_id)
+            position = min(self._segments.index(s) for s in targets)
+            remaining = [s for s in self._segments if all(s is not t for t in targets)]
+            remaining.insert(position, merged)
+            self._segments = remaining
+            self._term_dict = None
+            self.merges += 1
+
+    def stats(self) -> dict:
+        """セグメント数・件数などを返す。"""
+        with self._lock:
+            memtable = self._segments[-1] if self._segments and not self._segments[-1].frozen else None
+            return {
+                "segments": len(self._segments),
+                "docs": len(self._where),
+                "deleted": sum(len(s.deleted) for s in self._segments),
+                "memtable": len(memtable) if memtable is not None else 0,
+                "merges": self.merges,
+            }
+
+
+#テストコード#######
+if __name__ == "__main__":
+    import json
+    import time
+    from pathlib import Path
+
+    pages = json.loads(Path("data/pages.json").read_text(encoding="utf-8"))
+    index = SegmentedIndex.build(pages[:-2], [p["id"] for p in pages[:-2]], memtable_size=1)
+    for page in pages[-2:]:
+        start = time.perf_counter()
+        index.upsert(page["id"], page)
+        print(f"➕ {page['title'][:20]} {(time.perf_counter() - start) * 1000:.2f}ms")
+    index.delete(pages[0]["id"])
+    index.wait()
+    found = index.search_page("DX", limit=3)
+    print(f"🔎 {found['total']}件", [r["title"] for r in found["results"]], index.stats())
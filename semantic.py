@@ -0,0 +1,292 @@
+# ===================================================
+# semantic.py - LSA（TF-IDF + 特異値分解）による意味の近さでの検索
+# Week 4 / 性能改善
+# ===================================================
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import CountVectorizer
+
+from inverted_index import _field_texts
+from ranking import DEFAULT_BOOSTS, RankedIndex
+from search_fulltext import _to_result
+from tokenizer import tokenize
+
+# ページベクトルの次元数（語彙・ページ数が少なければそれに合わせて小さくする）
+DIMS = 128
+# これ以上のページ数なら近似検索（IVF: ページを k-means のクラスタに分け、近いクラスタだけを調べる）を使う
+ANN_MIN_DOCS = 200000
+# クエリとのコサイン類似度がこれ未満のページはヒットにしない
+MIN_SIMILARITY = 0.3
+# ハイブリッド検索で BM25（最大値で割って 0〜1 にしたもの）に掛ける重み。残りが LSA の類似度の重み
+HYBRID_ALPHA = 0.5
+
+
+def _identity(tokens: list) -> list:
+    return tokens
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return np.divide(x, norms, out=np.zeros_like(x), where=norms > 0)
+
+
+class SemanticIndex:
+    """
+    LSA のページベクトルで、キーワードが一致しなくても意味の近いページを探す。
+
+    TF-IDF 行列（タイトル・キーワードを重視）を TruncatedSVD で DIMS 次元に落とし、
+    正規化したページベクトルを1つの連続した float32 の行列に持つ。
+    検索はクエリを同じ空間に写して行列×ベクトル積1回でコサイン類似度を出す。
+    ページ数が ANN_MIN_DOCS 以上なら、ページベクトルをクラスタごとに並べ替えておき、
+    クエリに近い n_probe 個のクラスタの行だけを計算する（近似。取りこぼしはあり得る）。
+
+    Args:
+        pages:   ページリスト
+        dims:    ページベクトルの次元数
+        n_lists: クラスタ数（None ならページ数が ANN_MIN_DOCS 以上のとき √ページ数、未満なら使わない）
+        n_probe: 検索時に調べるクラスタ数
+    """
+
+    def __init__(self, pages, dims: int = DIMS, n_lists: int = None, n_probe: int = 32,
+                 min_similarity: float = MIN_SIMILARITY, _arrays: dict = None):
+        self.pages = pages
+        self.n_probe = n_probe
+        self.min_similarity = min_similarity
+        arrays = _arrays if _arrays is not None else self._fit(pages, dims, n_lists)
+        self.terms = [str(t) for t in arrays["terms"]]
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        self.idf = arrays["idf"]
+        self.components = arrays["components"]   # 次元数 × 語数
+        self.vectors = arrays["vectors"]         # ページ数 × 次元数（クラスタ順に並べたもの）
+        self.doc_ids = arrays["doc_ids"]         # vectors の行 → ページ番号
+        self.centroids = arrays["centroids"]     # クラスタ数 × 次元数（近似検索を使わないなら空）
+        self.bounds = arrays["bounds"]           # クラスタ i の行は bounds[i]〜bounds[i+1]
+
+    # ── 作成 ──
+    @staticmethod
+    def _tfidf(counts, idf: np.ndarray):
+        # 語頻度は対数で抑え（sublinear tf）、IDF を掛けて行ごとに長さ1にする
+        counts = sparse.csr_matrix(counts, dtype=np.float32)
+        counts.data = (1 + np.log(counts.data)) * idf[counts.indices]
+        norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1)).ravel())
+        return sparse.diags(np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)) @ counts
+
+    @classmethod
+    def _fit(cls, pages, dims: int, n_lists: int) -> dict:
+        n_docs = len(pages)
+        field_tokens = {
+            field: [tokenize(text) for text in _field_texts(pages, field)]
+            for field in DEFAULT_BOOSTS
+        }
+        terms = sorted({t for docs in field_tokens.values() for tokens in docs for t in tokens})
+        counts = sparse.csr_matrix((n_docs, len(terms)), dtype=np.float32)
+        if terms:
+            vectorizer = CountVectorizer(analyzer=_identity, vocabulary={t: i for i, t in enumerate(terms)},
+                                         dtype=np.float32)
+            for field, boost in DEFAULT_BOOSTS.items():
+                counts = counts + vectorizer.transform(field_tokens[field]) * boost
+        df = np.diff(sparse.csc_matrix(counts).indptr).astype(np.float32)
+        idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+        tfidf = cls._tfidf(counts, idf)
+
+        k = min(dims, len(terms) - 1, n_docs - 1)
+        if k < 1:
+            components = np.zeros((0, len(terms)), dtype=np.float32)
+            vectors = np.zeros((n_docs, 0), dtype=np.float32)
+        else:
+            svd = TruncatedSVD(n_components=k, random_state=0)
+            vectors = _normalize(svd.fit_transform(tfidf).astype(np.float32))
+            components = svd.components_.astype(np.float32)
+
+        if n_lists is None:
+            n_lists = int(np.sqrt(n_docs)) if n_docs >= ANN_MIN_DOCS else 0
+        doc_ids = np.arange(n_docs, dtype=np.int64)
+        centroids = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        bounds = np.zeros(1, dtype=np.int64)
+        if n_lists > 1 and k >= 1:
+            kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=0, n_init=3,
+                                     batch_size=max(1024, n_lists * 4)).fit(vectors)
+            labels = kmeans.labels_
+            doc_ids = np.argsort(labels, kind="stable")
+            vectors = vectors[doc_ids]
+            centroids = _normalize(kmeans.cluster_centers_.astype(np.float32))
+            bounds = np.searchsorted(labels[doc_ids], np.arange(n_lists + 1))
+        return {
+            "terms": terms, "idf": idf, "components": components,
+            "vectors": np.ascontiguousarray(vectors), "doc_ids": doc_ids,
+            "centroids": centroids, "bounds": bounds,
+        }
+
+    # ── 保存・読み込み ──
+    def save(self, path, source_version):
+        """ページベクトルと変換に使う配列を .npz に書き出す（書き終えてから差し替える）。"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, terms=np.array(self.terms, dtype=str), idf=self.idf, components=self.components,
+                     vectors=self.vectors, doc_ids=self.doc_ids, centroids=self.centroids,
+                     bounds=self.bounds, version=np.array(str(source_version)))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path, pages, source_version, **options):
+        """保存済みのものが同じ版・同じページ数のデータから作られていれば読み込む（違えば None）。"""
+        with np.load(path) as data:
+            if str(data["version"]) != str(source_version) or len(data["doc_ids"]) != len(pages):
+                return None
+            arrays = {key: data[key] for key in data.files if key != "version"}
+        return cls(pages, _arrays=arrays, **options)
+
+    # ── 検索 ──
+    def embed(self, query: str) -> np.ndarray:
+        """クエリのベクトル（語彙に無い語だけなら長さ0のベクトル）。"""
+        counts = {}
+        for term in tokenize(query):
+            col = self.vocabulary.get(term)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        if not counts or not len(self.components):
+            return np.zeros(self.vectors.shape[1], dtype=np.float32)
+        # ページ側と同じ TF-IDF の重みを付けて、使う語の列だけで射影する
+        cols = np.fromiter(counts, np.int64, len(counts))
+        weights = (1 + np.log(np.fromiter(counts.values(), np.float32, len(counts)))) * self.idf[cols]
+        return _normalize(self.components[:, cols] @ weights)
+
+    def similarities(self, query: str) -> tuple:
+        """
+        クエリとのコサイン類似度が min_similarity 以上のページを求める。
+
+        Returns:
+            (ページ番号の配列, 類似度の配列)
+        """
+        q = self.embed(query)
+        if not q.any():
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if len(self.centroids):
+            lists = np.argsort(-(self.centroids @ q))[:self.n_probe]
+            rows = np.concatenate([np.arange(self.bounds[i], self.bounds[i + 1]) for i in lists])
+            # クラスタごとに連続した行なので、スライスごとに積を取る
+            scores = np.concatenate([self.vectors[self.bounds[i]:self.bounds[i + 1]] @ q for i in lists])
+        else:
+            rows = None
+            scores = self.vectors @ q
+        keep = np.flatnonzero(scores >= self.min_similarity)
+        rows = keep if rows is None else rows[keep]
+        return self.doc_ids[rows], scores[keep]
+
+    def search(self, query: str, limit: int = None, offset: int = 0) -> list:
+        return self.search_page(query, limit, offset)["results"]
+
+    def search_page(self, query: str, limit: int = 10, offset: int = 0, where=None) -> dict:
+        """
+        意味の近い順の offset 件目から limit 件だけを返す（score はコサイン類似度）。
+
+        Args:
+            where: facets.Filter（指定すると条件に合うページだけにし、結果に全ヒットのページ id "ids" を付ける）
+
+        Returns:
+            {"total": ヒット総数, "results": 表示範囲のページのリスト}
+        """
+        doc_ids, scores = self.similarities(query) if query.strip() else ([], [])
+        return _page_results(self.pages, doc_ids, scores, query, limit, offset, where)
+
+
+class HybridEngine:
+    """
+    BM25（キーワード）と LSA（意味の近さ）のスコアを足し合わせて並べる。
+
+    BM25 のスコアは最大値で割って 0〜1 にそろえ、alpha : 1 - alpha の重みで LSA の類似度と足す。
+    どちらかでヒットしたページが結果になる。
+
+    Args:
+        keyword:  RankedIndex
+        semantic: SemanticIndex（keyword と同じページリストから作ったもの）
+        alpha:    BM25 の重み
+    """
+
+    def __init__(self, keyword: RankedIndex, semantic: SemanticIndex, alpha: float = HYBRID_ALPHA):
+        self.keyword = keyword
+        self.semantic = semantic
+        self.alpha = alpha
+        self.pages = keyword.pages
+
+    def search(self, query: str, limit: int = None, offset: int = 0) -> list:
+        return self.search_page(query, limit, offset)["results"]
+
+    def search_page(self, query: str, limit: int = 10, offset: int = 0, where=None) -> dict:
+        if not query.strip():
+            return {"total": 0, "results": []}
+        scores = np.zeros(len(self.pages), dtype=np.float32)
+        keyword = self.keyword.scores(query)
+        if keyword is not None and keyword.max() > 0:
+            scores += self.alpha * keyword / keyword.max()
+        doc_ids, similarities = self.semantic.similarities(query)
+        scores[doc_ids] += (1 - self.alpha) * similarities
+        hits = np.flatnonzero(scores)
+        return _page_results(self.pages, hits, scores[hits], query, limit, offset, where)
+
+
+def _page_results(pages, doc_ids, scores, query: str, limit: int, offset: int, where=None) -> dict:
+    # スコアの高い順に offset〜offset+limit 件目だけを並べ替えて結果にする
+    doc_ids, scores = np.asarray(doc_ids, dtype=np.int64), np.asarray(scores)
+    found = {}
+    if where is not None:
+        keep = where.keep(doc_ids)
+        doc_ids, scores = doc_ids[keep], scores[keep]
+        found["ids"] = where.facets.ids[doc_ids]
+    total = len(doc_ids)
+    end = total if limit is None else min(offset + limit, total)
+    if offset >= end:
+        return {"total": total, "results": [], **found}
+    order = np.arange(total)
+    if end < total:
+        # end 件目と同点のページも残してから並べ、同点はページ順にする
+        order = np.flatnonzero(scores >= -np.partition(-scores, end - 1)[end - 1])
+    order = order[np.lexsort((doc_ids[order], -scores[order]))][offset:end]
+    results = []
+    for i in order:
+        r = _to_result(pages[int(doc_ids[i])], 0, query)
+        r["score"] = round(float(scores[i]), 3)
+        results.append(r)
+    return {"total": total, "results": results, **found}
+
+
+def load_or_build(pages, path, source_version, **options) -> SemanticIndex:
+    """
+    保存済みの LSA が同じ版のデータから作られていれば読み込み、違えば作り直して保存する。
+
+    Args:
+        pages:          ページリスト
+        path:           保存先（.npz）
+        source_version: 元データの版
+    """
+    path = Path(path)
+    if path.exists():
+        index = SemanticIndex.load(path, pages, source_version, **options)
+        if index is not None:
+            return index
+    index = SemanticIndex(pages, **options)
+    index.save(path, source_version)
+    return index
+
+
+#テストコード#######
+if __name__ == "__main__":
+    import json
+    import time
+
+    pages = json.loads(Path("data/pages.json").read_text(encoding="utf-8"))
+    start = time.perf_counter()
+    index = SemanticIndex(pages)
+    print(f"🧭 {index.vectors.shape} {(time.perf_counter() - start) * 1000:.0f}ms")
+    for query in ["デジタル変革", "ものづくり 改善", "Python"]:
+        found = index.search_page(query, limit=3)
+        print(f"🔎 {query}: {found['total']}件", [(r["title"][:15], r["score"]) for r in found["results"]])
+    hybrid = HybridEngine(RankedIndex(pages), index)
+    found = hybrid.search_page("DX", limit=3)
+    print(f"🔀 DX: {found['total']}件", [(r["title"][:15], r["score"]) for r in found["results"]])
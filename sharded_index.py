@@ -0,0 +1,203 @@
+# ===================================================
+# sharded_index.py - ページを複数のシャードに分け、別プロセスで並列に BM25 検索する
+# Week 4 / 性能改善
+# ===================================================
+import heapq
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from itertools import islice
+
+import numpy as np
+
+from corpus import column
+from ranking import RankedIndex
+from search_fulltext import _to_result
+
+# シャード数の既定値（環境変数 TECH0_SHARDS。未指定なら CPU 数）
+DEFAULT_SHARDS = int(os.environ.get("TECH0_SHARDS", 0)) or os.cpu_count() or 1
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_SHIFT = np.uint64(32)
+_ONE = np.uint64(1)
+_SIX = np.uint64(6)
+_LOW = np.uint64(63)
+
+
+def shard_of(ids, n_shards: int) -> np.ndarray:
+    """ページ id からシャード番号を決める（連番の id でも偏らないよう掛け算でかき混ぜる）。"""
+    ids = np.asarray([-1 if i is None else i for i in ids], dtype=np.int64).astype(np.uint64)
+    return ((ids * _GOLDEN) >> _SHIFT) % np.uint64(n_shards)
+
+
+def _serve(conn, pages: list, positions: np.ndarray, options: dict):
+    """
+    シャード1つ分のプロセスの本体。
+
+    1. 語頻度を数え、文書頻度・文書長の合計を親に送る
+    2. 親が全シャードを合わせた統計を返してきたら、それで BM25 の重みを計算する
+       （シャードごとの統計で重みを付けると、同じページでも単一のインデックスとスコアが変わる）
+    3. (クエリ, 上位件数, 絞り込みのビットマップ) を受け取るたびに、シャード内の上位を返す
+    """
+    index = RankedIndex(pages, weigh=False, **options)
+    conn.send((len(pages), dict(zip(index.sorted_terms, index.document_frequencies().tolist())),
+               float(index.doc_len.sum(dtype=np.float64))))
+    n_docs, df, total_len = conn.recv()
+    index.set_stats(n_docs, [df[t] for t in index.sorted_terms], total_len)
+    conn.send(True)
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:   # 親のプロセスが close せずに終了した
+            return
+        if message is None:
+            return
+        try:
+            conn.send(_search_shard(index, positions, *message))
+        except Exception as e:   # 親の検索で例外として投げ直す
+            conn.send(e)
+
+
+def _search_shard(index: RankedIndex, positions: np.ndarray, query: str, end: int, bitmap: np.ndarray):
+    keep = None
+    if bitmap is not None:
+        # 親のページ番号（positions）のビットが立っているページだけを残す
+        def keep(doc_ids):
+            pos = positions[doc_ids].astype(np.uint64)
+            return (bitmap[(pos >> _SIX).astype(np.intp)] >> (pos & _LOW)) & _ONE == _ONE
+    ranked = index.rank(query, end, keep)
+    if ranked is None:
+        return None
+    hits, top, scores = ranked
+    return (len(hits), positions[top], scores, index.match_counts(query, top),
+            positions[hits] if bitmap is not None else None)
+
+
+class ShardedIndex:
+    """
+    ページを id のハッシュで n_shards 個に分け、シャードごとのプロセスで BM25 のスコアを計算する。
+
+    検索はすべてのシャードに同時に送り、各シャードが返した上位 offset + limit 件を
+    ヒープでマージする（heapq.merge）。BM25 の重みは全シャードを合わせた文書頻度・平均文書長で
+    付けるので、RankedIndex と同じスコア・同じ順位になる。プレビューなどの結果は、
+    マージで残ったページの分だけ親プロセスで作る。
+
+    Args:
+        pages:    ページリスト（list of dict / Corpus）
+        n_shards: シャード（プロセス）の数
+        **options: RankedIndex に渡す boosts / k1 / b
+    """
+
+    def __init__(self, pages, n_shards: int = DEFAULT_SHARDS, **options):
+        self.pages = pages
+        self.n_shards = max(1, n_shards)
+        shards = shard_of(column(pages, "id"), self.n_shards)
+        # Streamlit や search_service.py はスレッドを使っているので fork はしない（ロックを持ったまま複製されうる）
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self._conns, self._procs = [], []
+        # パイプは1本ずつしか使えないので、同時に来た検索は順番に送る
+        self._lock = threading.Lock()
+        for s in range(self.n_shards):
+            positions = np.flatnonzero(shards == s)
+            parent, child = context.Pipe()
+            proc = context.Process(target=_serve, args=(child, [pages[i] for i in positions], positions, options),
+                                   daemon=True, name=f"shard-{s}")
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+
+        # 全シャードの統計を合わせて配り、重みを計算させる
+        n_docs, df, total_len = 0, Counter(), 0.0
+        for conn in self._conns:
+            n, shard_df, shard_len = conn.recv()
+            n_docs += n
+            df.update(shard_df)
+            total_len += shard_len
+        for conn in self._conns:
+            conn.send((n_docs, df, total_len))
+        for conn in self._conns:
+            conn.recv()
+
+    def search(self, query: str, k: int = 10) -> list:
+        return self.search_page(query, k)["results"]
+
+    def search_page(self, query: str, limit: int = 10, offset: int = 0, where=None) -> dict:
+        """
+        BM25 スコア順の offset 件目から limit 件だけを返す（RankedIndex.search_page と同じ結果）。
+
+        Args:
+            where: facets.Filter（指定すると条件に合うページだけにし、結果に全ヒットのページ id "ids" を付ける）
+
+        Returns:
+            {"total": ヒット総数, "results": 表示範囲のページのリスト}
+        """
+        if not query.strip():
+            return {"total": 0, "results": []}
+        end = None if limit is None else offset + limit
+        with self._lock:
+            if not self._conns:
+                raise RuntimeError("ShardedIndex は close 済みです")
+            for conn in self._conns:
+                conn.send((query, end, None if where is None else where.bitmap))
+            parts = [conn.recv() for conn in self._conns]
+        for part in parts:
+            if isinstance(part, Exception):
+                raise part
+        parts = [part for part in parts if part is not None]
+        if not parts:
+            return {"total": 0, "results": []}
+
+        # 各シャードの上位はスコア降順・同点はページ順に並んでいるので、そのままマージできる
+        ranked = heapq.merge(*(zip((-scores).tolist(), positions.tolist(), counts.tolist())
+                               for _, positions, scores, counts, _ in parts))
+        results = []
+        for neg_score, pos, count in islice(ranked, offset, end):
+            r = _to_result(self.pages[pos], int(count), query)
+            r["score"] = round(float(-neg_score), 3)
+            results.append(r)
+        found = {"total": sum(part[0] for part in parts), "results": results}
+        if where is not None:
+            found["ids"] = where.facets.ids[np.sort(np.concatenate([part[4] for part in parts]))]
+        return found
+
+    def close(self):
+        """シャードのプロセスを止める（実行中の検索があれば終わるのを待つ）。"""
+        with self._lock:
+            for conn in self._conns:
+                try:
+                    conn.send(None)
+                    conn.close()
+                except OSError:
+                    pass
+            for proc in self._procs:
+                proc.join(timeout=5)
+            self._conns, self._procs = [], []
+
+    def __del__(self):
+        # 新しい版に作り直されて参照されなくなったら、プロセスも止める
+        if getattr(self, "_conns", None):
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+#テストコード#######
+if __name__ == "__main__":
+    import json
+    import time
+    from pathlib import Path
+
+    pages = json.loads(Path("data/pages.json").read_text(encoding="utf-8"))
+    start = time.perf_counter()
+    with ShardedIndex(pages, n_shards=2) as index:
+        print(f"🧩 {index.n_shards}シャード: {time.perf_counter() - start:.2f}s")
+        for r in index.search("DX", k=3):
+            print(r["score"], r["title"])
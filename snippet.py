@@ -0,0 +1,97 @@
+# ===================================================
+# snippet.py - 検索結果のプレビュー（スニペット）生成
+# Week 4 / 性能改善
+# ===================================================
+
+
+def best_window(spans: list, width: int) -> tuple:
+    """
+    幅 width の窓のうち、異なるクエリ語を最も多く含む位置を探す（同数ならマッチ数が多い方）。
+
+    Args:
+        spans: (開始, 終了, 語の番号) のリスト（開始位置の昇順）
+        width: 窓の幅（文字数）
+
+    Returns:
+        (窓に入る最初の span の番号, 最後の span の番号 + 1)
+    """
+    best = (0, 1)
+    best_key = (0, 0)
+    counts = {}
+    left = 0
+    for right, (start, end, term) in enumerate(spans):
+        counts[term] = counts.get(term, 0) + 1
+        # 窓からはみ出した span を左から外す
+        while end - spans[left][0] > width:
+            t = spans[left][2]
+            counts[t] -= 1
+            if not counts[t]:
+                del counts[t]
+            left += 1
+        key = (len(counts), right - left + 1)
+        if key > best_key:
+            best_key, best = key, (left, right + 1)
+    return best
+
+
+def merge_spans(spans: list) -> list:
+    """重なっている・隣接しているハイライト範囲を1つにまとめる。"""
+    merged = []
+    for start, end, _ in spans:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def make_snippet(text: str, spans: list, width: int = 160, mark: str = "**") -> str:
+    """
+    マッチ位置（検索時に計算済みのもの）からプレビューを作る。
+
+    本文を検索し直さないので、かかる時間はスニペットの長さとマッチ数だけで決まる。
+
+    Args:
+        text:  本文
+        spans: (開始, 終了, 語の番号) のリスト（開始位置の昇順）
+        width: プレビューの長さ（文字数）
+        mark:  ハイライトの記号（Markdown の太字）
+
+    Returns:
+        ハイライト付きのプレビュー文字列
+    """
+    if not text:
+        return ""
+    if not spans:
+        return (text[:width] + "...") if len(text) > width else text
+
+    lo, hi = best_window(spans, width)
+    chosen = spans[lo:hi]
+    first, last = chosen[0][0], max(end for _, end, _ in chosen)
+
+    # マッチ範囲が窓の中央に来るように前後の文脈を付ける
+    margin = max(0, width - (last - first)) // 2
+    start = max(0, first - margin)
+    end = min(len(text), max(last, start + width))
+
+    parts = ["..."] if start > 0 else []
+    pos = start
+    for s, e in merge_spans(chosen):
+        s, e = max(s, start), min(e, end)
+        if s >= e:
+            continue
+        parts.append(text[pos:s])
+        parts.append(f"{mark}{text[s:e]}{mark}")
+        pos = e
+    parts.append(text[pos:end])
+    if end < len(text):
+        parts.append("...")
+    return "".join(parts)
+
+
+#テストコード#######
+if __name__ == "__main__":
+    text = "大手メーカー勤務、DX推進担当として新規事業開発に従事。DXとIoTで製造業を変える。"
+    spans = [(9, 11, 0), (28, 30, 0), (31, 34, 1), (35, 38, 2)]
+    print(make_snippet(text, spans, width=20))
@@ -0,0 +1,231 @@
+# ===================================================
+# term_dict.py - 語彙辞書（前方一致・タイプミス補正・入力候補）
+# Week 4 / 性能改善
+# ===================================================
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+from tokenizer import is_word, normalize
+
+# 前方一致の上端（これより大きい文字は無いので prefix + _MAX_CHAR 未満が前方一致の範囲になる）
+_MAX_CHAR = chr(0x10FFFF)
+# 補正候補として Levenshtein 距離を計算する語数の上限（共通 trigram が多い順に選ぶ）
+_MAX_CANDIDATES = 100
+_EMPTY = np.zeros(0, dtype=np.int32)
+_LAST_WORD_RE = re.compile(r'[^\s:"()]+$')
+
+
+def max_distance(term: str) -> int:
+    """語の長さに応じた許容編集距離（短い語ほど厳しくする）。"""
+    n = len(term)
+    if n < 4:
+        return 0
+    return 1 if n < 7 else 2
+
+
+def _grams(term: str) -> list:
+    # 前後に2文字ずつ印を付けると、1回の編集で変わる trigram は最大3個になる
+    padded = f"$${term}$$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def levenshtein(a: str, b: str, limit: int) -> int:
+    """
+    編集距離を求める。limit を超えると分かった時点で打ち切り、limit + 1 を返す。
+
+    距離が limit 以内なら対角線から limit より離れたマスは通らないので、その帯だけを計算する。
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, start=1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [over] * (len(b) + 1)
+        if i <= limit:
+            cur[0] = i
+        best = cur[0]
+        for j in range(lo, hi + 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]))
+            cur[j] = d
+            if d < best:
+                best = d
+        if best > limit:
+            return over
+        prev = cur
+    return min(prev[-1], over)
+
+
+class TermDictionary:
+    """
+    語彙（語 → 出現ページ数）を、前方一致と近い綴りで引ける形にしたもの。
+
+    前方一致はソート済み配列の二分探索、タイプミス補正は trigram の共通数で候補を絞ってから
+    編集距離を計算する。どちらも語彙全体は走査しない。
+
+    Args:
+        freqs: {語: 出現ページ数}
+    """
+
+    def __init__(self, freqs: dict):
+        items = sorted(freqs.items())
+        self.terms = [t for t, _ in items]
+        self.freqs = np.fromiter((f for _, f in items), dtype=np.int64, count=len(items))
+        self.lengths = np.fromiter(map(len, self.terms), dtype=np.int32, count=len(items))
+        self._grams = None
+        self._by_length = None       # 長さ順の番号 → 語の番号
+        self._length_starts = None   # 長さ → 長さ順の番号の開始位置
+
+    @classmethod
+    def from_postings(cls, postings: dict) -> "TermDictionary":
+        """転置インデックスの postings から、英数字の語だけを集めて作る（日本語の bigram は除く）。"""
+        return cls({term: len(docs) for term, docs in postings.items() if len(term) > 1 and is_word(term)})
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: str) -> bool:
+        i = bisect_left(self.terms, term)
+        return i < len(self.terms) and self.terms[i] == term
+
+    def complete(self, prefix: str, limit: int = 10) -> list:
+        """
+        prefix で始まる語を出現ページ数の多い順に返す。
+
+        Returns:
+            語のリスト
+        """
+        if not prefix:
+            return []
+        lo = bisect_left(self.terms, prefix)
+        hi = bisect_left(self.terms, prefix + _MAX_CHAR, lo)
+        return [self.terms[lo + i] for i in _top(self.freqs[lo:hi], limit)]
+
+    def correct(self, term: str, limit: int = 10, max_dist: int = None) -> list:
+        """
+        編集距離 max_dist 以内の語を、距離が近い順（同じなら出現ページ数の多い順）に返す。
+
+        Returns:
+            [(語, 距離), ...]
+        """
+        if max_dist is None:
+            max_dist = max_distance(term)
+        if max_dist == 0 or not self.terms:
+            return []
+        grams = self._gram_index()
+        # 長さが max_dist より違う語は候補にならないので、長さ順の番号の範囲で postings を切り出す
+        last = len(self._length_starts) - 1
+        lo = self._length_starts[min(max(0, len(term) - max_dist), last)]
+        hi = self._length_starts[min(len(term) + max_dist + 1, last)]
+        if lo == hi:   # 語彙の最長の語より max_dist 以上長い語など
+            return []
+        query_grams = set(_grams(term))
+        lists = []
+        for g in query_grams:
+            positions = grams.get(g, _EMPTY)
+            lists.append(positions[np.searchsorted(positions, lo):np.searchsorted(positions, hi)])
+        lists.sort(key=len)
+
+        # 編集1回で消える trigram は最大3個なので、共通の trigram が need 個未満の語は候補にしない。
+        # need 個共通するなら、出現の少ない方から (len - need + 1) 個のどれかは必ず含む
+        need = max(1, len(query_grams) - 3 * max_dist)
+        positions = np.unique(np.concatenate(lists[:len(lists) - need + 1]))
+        shared = sum(_member(positions, with_gram) for with_gram in lists)
+        keep = shared >= need
+        positions, shared = positions[keep], shared[keep]
+        if len(positions) > _MAX_CANDIDATES:
+            positions = positions[np.argpartition(-shared, _MAX_CANDIDATES)[:_MAX_CANDIDATES]]
+        ids = self._by_length[positions]
+
+        found = []
+        for i in ids.tolist():
+            candidate = self.terms[i]
+            if candidate == term:
+                continue
+            dist = levenshtein(term, candidate, max_dist)
+            if dist <= max_dist:
+                found.append((dist, -int(self.freqs[i]), candidate))
+        found.sort()
+        return [(t, d) for d, _, t in found[:limit]]
+
+    def expand(self, term: str, limit: int = 5) -> list:
+        """
+        辞書に無い語を、前方一致の語か、無ければ綴りの近い語に置き換える候補を返す。
+
+        Returns:
+            語のリスト（term が辞書にある場合は空）
+        """
+        if term in self:
+            return []
+        return self.complete(term, limit) or [t for t, _ in self.correct(term, limit)]
+
+    def _gram_index(self) -> dict:
+        # trigram → その trigram を含む語の「長さ順の番号」の昇順配列。最初の補正時に1回だけ作る
+        if self._grams is None:
+            self._by_length = np.argsort(self.lengths, kind="stable")
+            self._length_starts = np.searchsorted(self.lengths[self._by_length],
+                                                  np.arange(int(self.lengths.max()) + 2))
+            index = {}
+            for pos, i in enumerate(self._by_length.tolist()):
+                for g in set(_grams(self.terms[i])):
+                    positions = index.get(g)
+                    if positions is None:
+                        index[g] = [pos]
+                    else:
+                        positions.append(pos)
+            self._grams = {g: np.array(positions, dtype=np.int32) for g, positions in index.items()}
+        return self._grams
+
+
+def _member(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    """values の各要素が昇順配列 sorted_values に含まれるか（0 / 1 の配列）。"""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=np.int32)
+    pos = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return (sorted_values[pos] == values).astype(np.int32)
+
+
+def _top(freqs: np.ndarray, limit: int) -> list:
+    """freqs の大きい順に上位 limit 件の添字を返す（同数なら添字の小さい順 = 辞書順）。"""
+    if len(freqs) > limit:
+        part = np.argpartition(-freqs, limit - 1)[:limit]
+    else:
+        part = np.arange(len(freqs))
+    return sorted(part.tolist(), key=lambda i: (-freqs[i], i))
+
+
+def suggest_queries(query: str, terms: TermDictionary, limit: int = 5) -> list:
+    """
+    入力途中のクエリの最後の語を補完・補正した候補を返す（検索窓の入力候補用）。
+
+    Args:
+        query: 入力中のクエリ
+        terms: 語彙辞書
+        limit: 候補数の上限
+
+    Returns:
+        最後の語を置き換えたクエリ文字列のリスト
+    """
+    m = _LAST_WORD_RE.search(query)
+    if m is None:
+        return []
+    word = normalize(m.group(0))
+    if not is_word(word):
+        return []
+    head = query[:m.start()]
+    found = [t for t in terms.complete(word, limit + 1) if t != word][:limit]
+    if len(found) < limit:
+        found += [t for t, _ in terms.correct(word, limit) if t not in found][:limit - len(found)]
+    return [head + t for t in found]
+
+
+#テストコード#######
+if __name__ == "__main__":
+    terms = TermDictionary({"manufacturing": 30, "manufacturer": 12, "iot": 25, "internet": 8, "dx": 40})
+    print(terms.complete("manufactur"))
+    print(terms.correct("iott"), terms.correct("manufacturng"))
+    # 語彙のどの語よりもずっと長い語でも落ちない
+    assert terms.correct("internationalization") == []
+    print(suggest_queries("DX manu", terms), suggest_queries("title:IoTT", terms))
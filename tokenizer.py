@@ -0,0 +1,174 @@
+# ===================================================
+# tokenizer.py - 日英混在テキストのトークナイザ
+# Week 4 / 性能改善
+# ===================================================
+import re
+import unicodedata
+from operator import add
+
+# 文字種クラス
+#   L: 英数字などのスペース区切りの文字 → 単語単位
+#   C: 漢字・ひらがな・カタカナ・ハングル → 文字bigram
+#   それ以外（空白・記号）→ 区切り
+_CJK_RANGES = [
+    (0x3005, 0x3007),   # 々〆〇
+    (0x3040, 0x309F),   # ひらがな
+    (0x30A0, 0x30FF),   # カタカナ（ー を含む）
+    (0x3400, 0x4DBF),   # CJK統合漢字拡張A
+    (0x4E00, 0x9FFF),   # CJK統合漢字
+    (0xAC00, 0xD7AF),   # ハングル
+    (0xF900, 0xFAFF),   # CJK互換漢字
+]
+
+
+def _build_class_table() -> str:
+    """BMPの全文字について文字種クラスを1文字で引ける表（str.translate 用）を作る。"""
+    table = []
+    for cp in range(0x10000):
+        cat = unicodedata.category(chr(cp))
+        if cat[0] in "LNM":
+            table.append("L")
+        else:
+            table.append(" ")
+    for lo, hi in _CJK_RANGES:
+        for cp in range(lo, hi + 1):
+            table[cp] = "C"
+    return "".join(table)
+
+
+# 起動時に1回だけ作る。str.translate は添字で引けるので str をそのまま表に使える
+_CLASS_TABLE = _build_class_table()
+_RUN_RE = re.compile(r"L+|C+")
+# 半角カナの濁点・半濁点（結合文字ではないが、NFKC で前の文字と合成される）
+_VOICING_MARKS = "\uff9e\uff9f"
+
+
+def normalize(text: str) -> str:
+    """NFKC正規化（全角英数→半角、半角カナ→全角）して小文字化する。"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _runs(text: str):
+    """正規化済みテキストを (クラス, 文字列) の連続区間に分ける。"""
+    classes = text.translate(_CLASS_TABLE)
+    for m in _RUN_RE.finditer(classes):
+        yield classes[m.start()], text[m.start():m.end()]
+
+
+def tokenize(text: str) -> list:
+    """
+    テキストをインデックス用トークン列に分割する。
+
+    英数字は単語単位。日本語などは各文字の位置に「その文字から始まるbigram」を置き、
+    区間の最後の文字だけは1文字トークンにする（どの位置にも1トークンが対応する）。
+
+    Args:
+        text: 元テキスト
+
+    Returns:
+        トークンのリスト（リスト内の位置がそのまま出現位置）
+    """
+    text = normalize(text)
+    classes = text.translate(_CLASS_TABLE)
+    tokens = []
+    append, extend = tokens.append, tokens.extend
+    for m in _RUN_RE.finditer(classes):
+        start, end = m.span()
+        run = text[start:end]
+        if classes[start] == "L":
+            append(run)
+        else:
+            extend(map(add, run, run[1:]))
+            append(run[-1])
+    return tokens
+
+
+def tokenize_with_offsets(text: str) -> tuple:
+    """
+    tokenize と同じトークン列と、各トークンの元テキスト上の開始位置を返す（プレビュー用）。
+
+    Returns:
+        (トークンのリスト, 開始位置のリスト)
+    """
+    norm = normalize(text)
+    char_pos = None
+    if len(norm) != len(text):
+        # NFKC で長さが変わる文字（㈱ など）を含む場合は1文字ずつ正規化して位置の対応を保つ。
+        # 後ろの濁点・結合文字（ﾃﾞ の ﾞ など）は前の文字とまとめて正規化しないと、合成されずに残る
+        pieces, starts = [], []
+        for i, ch in enumerate(text):
+            if pieces and (ch in _VOICING_MARKS or unicodedata.combining(ch)):
+                pieces[-1] += ch
+            else:
+                pieces.append(ch)
+                starts.append(i)
+        pieces = [normalize(piece) for piece in pieces]
+        norm = "".join(pieces)
+        char_pos = [start for start, piece in zip(starts, pieces) for _ in piece]
+
+    classes = norm.translate(_CLASS_TABLE)
+    tokens, starts = [], []
+    for m in _RUN_RE.finditer(classes):
+        start, end = m.span()
+        run = norm[start:end]
+        if classes[start] == "L":
+            tokens.append(run)
+            starts.append(start)
+        else:
+            tokens.extend(map(add, run, run[1:]))
+            tokens.append(run[-1])
+            starts.extend(range(start, end))
+
+    if char_pos is not None:
+        starts = [char_pos[i] for i in starts]
+    return tokens, starts
+
+
+def tokenize_query(query: str) -> list:
+    """
+    クエリを (トークン, 前方一致フラグ) のリストに分割する。
+
+    tokenize と同じ位置に並ぶように分割するが、クエリ末尾の日本語区間は
+    文書側で続きの文字があり得るため、末尾1文字のトークンを付けない。
+    末尾区間が1文字だけの場合は「その文字で始まるトークン」への前方一致にする。
+
+    Args:
+        query: 検索キーワード
+
+    Returns:
+        [(トークン, 前方一致か), ...]
+    """
+    runs = list(_runs(normalize(query)))
+    terms = []
+    for i, (cls, run) in enumerate(runs):
+        if cls == "L":
+            terms.append((run, False))
+            continue
+        terms.extend((run[j:j + 2], False) for j in range(len(run) - 1))
+        if i < len(runs) - 1:
+            terms.append((run[-1], False))
+        elif len(run) == 1:
+            terms.append((run, True))
+    return terms
+
+
+def is_word(term: str) -> bool:
+    """英数字など、単語単位でトークンになる文字だけでできているか（正規化済みの語を渡す）。"""
+    return bool(term) and not term.translate(_CLASS_TABLE).strip("L")
+
+
+def count_words(text: str) -> int:
+    """語数を数える（英数字は1単語、日本語は1文字を1語として数える）。"""
+    return len(tokenize(text))
+
+
+#テストコード#######
+if __name__ == "__main__":
+    sample = "ＤＸ推進担当として、IoTｼｽﾃﾑを開発。Discovering the world"
+    print(tokenize(sample))
+    print(tokenize_query("DX推進"))
+    print(tokenize_with_offsets("㈱テック DX推進"))
+    # 半角カナの濁点も tokenize と同じように前の文字と合成する
+    for text in ("ﾃﾞｼﾞﾀﾙ変革", "㈱ﾃﾞｰﾀﾍﾟｰｼﾞ", "Cafe\u0301 ﾊﾟﾝ"):
+        assert tokenize_with_offsets(text)[0] == tokenize(text), text
+    print(count_words(sample))
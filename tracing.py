@@ -0,0 +1,231 @@
+# ===================================================
+# tracing.py - 処理段階ごとの時間計測（span・段階別ヒストグラム・遅いクエリの記録）
+# Week 4 / 性能改善
+# ===================================================
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+
+# 既定で計測するか（環境変数 TECH0_TRACE=1 で有効。実行中は enable() で切り替える）
+_enabled = os.environ.get("TECH0_TRACE", "") not in ("", "0")
+# ヒストグラムのバケットの上限（ms）。Prometheus 形式では秒に直して出す
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# この時間（ms）以上かかったクエリを記録する
+SLOW_MS = 100.0
+MAX_SLOW = 50
+
+_NOOP = nullcontext()
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class Histogram:
+    """1つの段階の所要時間の分布（BUCKETS_MS ごとの件数・合計・最大）。"""
+
+    __slots__ = ("counts", "total_ms", "max_ms", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)   # 最後は BUCKETS_MS を超えた分
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.count = 0
+
+    def add(self, ms: float):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """q 分位点の推定値（該当するバケットの中で線形に補う）。"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo = BUCKETS_MS[i - 1] if i else 0.0
+                hi = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+                return min(lo + (hi - lo) * (rank - seen) / n, self.max_ms)
+            seen += n
+        return self.max_ms
+
+
+_histograms = {}             # 段階名 → Histogram
+_slow = deque(maxlen=MAX_SLOW)
+_slow_total = 0
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_slow_ms(ms: float):
+    global SLOW_MS
+    SLOW_MS = ms
+
+
+def reset():
+    global _slow_total
+    with _lock:
+        _histograms.clear()
+        _slow.clear()
+        _slow_total = 0
+
+
+def _record(name: str, ms: float):
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.add(ms)
+    current = getattr(_local, "trace", None)
+    if current is not None:
+        current.stages[name] = current.stages.get(name, 0.0) + ms
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, (time.perf_counter() - self.start) * 1000)
+
+
+def span(name: str):
+    """
+    with span("preview"): ... の範囲の時間を段階 name として記録する。
+
+    計測が無効なら何もしない共有の文脈を返すだけなので、ホットパスに置いたままでよい。
+    """
+    return _Span(name) if _enabled else _NOOP
+
+
+def traced(name: str):
+    """関数全体を span(name) で囲むデコレータ。"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class _Trace:
+    __slots__ = ("name", "labels", "stages", "start", "outer")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.stages = {}
+
+    def __enter__(self):
+        self.outer = getattr(_local, "trace", None)
+        _local.trace = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _slow_total
+        total_ms = (time.perf_counter() - self.start) * 1000
+        _local.trace = self.outer
+        _record(self.name, total_ms)
+        if total_ms >= SLOW_MS:
+            with _lock:
+                _slow.append({
+                    "at": datetime.now().isoformat(timespec="seconds"), "name": self.name, **self.labels,
+                    "total_ms": total_ms, "stages": dict(self.stages),
+                })
+                _slow_total += 1
+
+
+def trace(name: str, **labels):
+    """
+    1件の処理（検索1回など）の全体を計り、その間に同じスレッドで通った span の時間を段階ごとに集める。
+    全体が SLOW_MS 以上なら、labels と段階ごとの内訳を遅いクエリとして記録する。
+
+    Args:
+        name:   全体の段階名（ヒストグラムにも記録する）
+        labels: 記録に残す項目（query・engine など）
+    """
+    return _Trace(name, labels) if _enabled else _NOOP
+
+
+def stats() -> dict:
+    """段階ごとの {"count", "mean_ms", "p50_ms", "p99_ms", "max_ms"}。"""
+    with _lock:
+        return {
+            name: {"count": h.count, "mean_ms": h.total_ms / h.count, "p50_ms": h.quantile(0.5),
+                   "p99_ms": h.quantile(0.99), "max_ms": h.max_ms}
+            for name, h in sorted(_histograms.items())
+        }
+
+
+def slow_queries() -> list:
+    """記録した遅いクエリ（新しい順。最大 MAX_SLOW 件）。"""
+    with _lock:
+        return list(reversed(_slow))
+
+
+def prometheus_text(prefix: str = "tech0") -> str:
+    """段階別のヒストグラムを Prometheus のテキスト形式で返す。"""
+    metric = f"{prefix}_stage_duration_seconds"
+    lines = [f"# HELP {metric} Time spent per processing stage.", f"# TYPE {metric} histogram"]
+    with _lock:
+        for name, h in sorted(_histograms.items()):
+            cumulative = 0
+            for le, n in zip(BUCKETS_MS, h.counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{stage="{name}",le="{le / 1000:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {h.total_ms / 1000:.6f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {h.count}')
+        lines += [f"# HELP {prefix}_slow_queries_total Queries slower than the slow threshold.",
+                  f"# TYPE {prefix}_slow_queries_total counter",
+                  f"{prefix}_slow_queries_total {_slow_total}"]
+    return "\n".join(lines) + "\n"
+
+
+#テストコード#######
+if __name__ == "__main__":
+    enable()
+    set_slow_ms(1)
+
+    @traced("preview")
+    def preview():
+        time.sleep(0.002)
+
+    for _ in range(3):
+        with trace("query", query="DX", engine="index"):
+            with span("search"):
+                time.sleep(0.001)
+            preview()
+    print(stats())
+    print(slow_queries()[0])
+    print(prometheus_text())
+
+    enable(False)
+    start = time.perf_counter()
+    for _ in range(1000000):
+        with span("noop"):
+            pass
+    print(f"無効時の span: {(time.perf_counter() - start) * 1000:.1f}ns / 回")